@@ -1,10 +1,17 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.security import create_access_token, get_current_user
+from app.core.security import (
+    create_access_token,
+    get_current_user,
+    get_password_hash_async,
+    verify_and_update_password_async,
+)
 from app.db.session import get_db
 from app.db import crud
 from app.schemas.user import User, UserCreate, Token
@@ -13,23 +20,31 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=User)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    # DB calls run on the request thread pool, bcrypt on the password pool
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
-    return crud.create_user(db=db, user=user)
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    user = await run_in_threadpool(crud.get_user_by_email, db, email=form_data.username)
+    verified = False
+    if user:
+        verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+        if verified and new_hash:
+            # Transparently upgrade hashes created with an older work factor
+            await run_in_threadpool(crud.update_password_hash, db, user, new_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -42,12 +57,30 @@ def login(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+# Short-TTL cache of authenticated users, keyed by user id. Holds detached
+# User schema snapshots so a cache hit needs no database round-trip.
+_user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(user_id: int):
+    """Drop a user from this worker's cache after their record changes."""
+    _user_cache.pop(int(user_id))
+
+
 # Custom dependency to get actual user from database
 def get_db_user(
     user_id: str = Depends(get_current_user),
     db: Session = Depends(get_db)
-):
-    user = crud.get_user(db, user_id=int(user_id))
+) -> User:
+    user_id = int(user_id)
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    user = crud.get_user(db, user_id=user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+    
+    snapshot = User.model_validate(user)
+    _user_cache.set(user_id, snapshot)
+    return snapshot
\ No newline at end of file
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, HTTPException, status, Header, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import os
 
 from app.api.auth import get_db_user
+from app.api.query_flow import RequestTrace, answer_query, persist_assistant_message, resolve_retriever_type
 from app.db.session import get_db
-from app.db import crud, models
+from app.db import crud
+from app.schemas.user import User
 from app.schemas.query import (
     Conversation, 
     ConversationCreate, 
+    ConversationSummary, 
     QueryRequest, 
     QueryResult, 
     MessageCreate, 
@@ -30,15 +32,38 @@ def get_rag_pipeline():
     return rag_pipeline
 
 
-@router.get("/conversations", response_model=List[Conversation])
+def _decode_cursor_param(cursor: Optional[str]):
+    """Decode a pagination cursor query parameter, rejecting malformed values."""
+    if cursor is None:
+        return None
+    try:
+        return crud.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+@router.get("/conversations", response_model=List[ConversationSummary])
 def get_all_conversations(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
-    """Get all conversations for the current user."""
-    conversations = crud.get_conversations(db, user_id=current_user.id, skip=skip, limit=limit)
+    """
+    Get all conversations for the current user.
+    
+    Returns summaries (title, timestamps, message count and last-message
+    snippet); use /conversations/{id} for the full message list. Pass the
+    `X-Next-Cursor` response header back as `cursor` to fetch the next page
+    with keyset pagination.
+    """
+    after = _decode_cursor_param(cursor)
+    conversations = crud.get_conversation_summaries(db, user_id=current_user.id, skip=skip, limit=limit, after=after)
+    if conversations and len(conversations) == limit:
+        last = conversations[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last["updated_at"], last["id"])
     return conversations
 
 
@@ -46,7 +71,7 @@ def get_all_conversations(
 def create_new_conversation(
     conversation: ConversationCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
     """Create a new conversation."""
     return crud.create_conversation(db, user_id=current_user.id, title=conversation.title)
@@ -56,10 +81,10 @@ def create_new_conversation(
 def get_conversation_with_messages(
     conversation_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
     """Get a conversation with all its messages."""
-    conversation = crud.get_conversation(db, conversation_id=conversation_id)
+    conversation = crud.get_conversation(db, conversation_id=conversation_id, with_messages=True)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     if conversation.user_id != current_user.id:
@@ -70,65 +95,31 @@ def get_conversation_with_messages(
 @router.post("/query", response_model=QueryResult)
 async def process_query(
     query_request: QueryRequest,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user),
-    x_retriever_type: Optional[str] = Header(None, alias="retriever-type")
+    current_user: User = Depends(get_db_user),
+    x_retriever_type: Optional[str] = Header(None, alias="retriever-type"),
+    x_request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout")
 ):
     """Process a query and return the answer with sources."""
-    # Get the retriever type from header or environment
-    retriever_type = x_retriever_type or os.getenv("RETRIEVER_TYPE", "hybrid")
-    
-    # Validate retriever type
-    if retriever_type not in ["hybrid", "vector_cypher", "vector"]:
-        retriever_type = "hybrid"  # Default to hybrid if invalid
-    
-    # Get or create a conversation
-    conversation_id = query_request.conversation_id
-    if not conversation_id:
-        # Create a new conversation with the query as title
-        conversation = crud.create_conversation(
-            db, 
-            user_id=current_user.id, 
-            title=query_request.query[:50] + "..." if len(query_request.query) > 50 else query_request.query
-        )
-        conversation_id = conversation.id
-    else:
-        # Check if conversation exists and belongs to user
-        conversation = crud.get_conversation(db, conversation_id=conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        if conversation.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
-    
-    # Store the user query
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="user",
-        content=query_request.query
-    )
-    
-    # Get conversation history
-    messages = crud.get_messages(db, conversation_id=conversation_id)
+    trace = RequestTrace("queries/query")
+    retriever_type = resolve_retriever_type(x_retriever_type)
     
-    # Process query with RAG pipeline, passing the retriever type
-    pipeline = get_rag_pipeline()
-    result = pipeline.search(
-        query_request.query, 
-        messages,
-        retriever_type=retriever_type
+    # Conversation bookkeeping and the RAG pipeline run concurrently
+    result, conversation_id = await answer_query(
+        get_rag_pipeline(), db, current_user.id, query_request,
+        retriever_type=retriever_type, use_rag_format=False, trace=trace,
+        request=request, requested_timeout=x_request_timeout
     )
     
-    # Store the assistant response with sources
+    # Store the assistant response with sources after the response is sent
     sources_data = [{"source_path": source.source_path, "source_name": source.source_name} for source in result["sources"]]
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="assistant",
-        content=result["answer"],
-        sources=sources_data
-    )
+    background_tasks.add_task(persist_assistant_message, conversation_id, result["answer"], sources_data)
     
+    response.headers["Server-Timing"] = trace.server_timing()
+    trace.log()
     return QueryResult(
         answer=result["answer"],
         sources=result["sources"],
@@ -139,10 +130,20 @@ async def process_query(
 @router.get("/conversations/{conversation_id}/messages", response_model=List[MessageWithSources])
 def get_messages_for_conversation(
     conversation_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
-    """Get all messages for a conversation."""
+    """
+    Get all messages for a conversation.
+    
+    With `limit`, results are paged; pass the `X-Next-Cursor` response
+    header back as `cursor` to fetch the next page.
+    """
+    after = _decode_cursor_param(cursor)
+    
     # Check if conversation exists and belongs to user
     conversation = crud.get_conversation(db, conversation_id=conversation_id)
     if not conversation:
@@ -151,70 +152,39 @@ def get_messages_for_conversation(
         raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
     
     # Get messages
-    messages = crud.get_messages(db, conversation_id=conversation_id)
+    messages = crud.get_messages(db, conversation_id=conversation_id, limit=limit, after=after)
+    if limit and messages and len(messages) == limit:
+        last = messages[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last.created_at, last.id)
     return messages
 
 
 @router.post("/rag-assistant", response_model=RagResponse)
 async def rag_assistant_query(
     query_request: QueryRequest,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user),
-    x_retriever_type: Optional[str] = Header(None, alias="retriever-type")
+    current_user: User = Depends(get_db_user),
+    x_retriever_type: Optional[str] = Header(None, alias="retriever-type"),
+    x_request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout")
 ):
     """Process a query and return a response in the RAG Assistant format."""
-    # Get the retriever type from header or environment
-    retriever_type = x_retriever_type or os.getenv("RETRIEVER_TYPE", "hybrid")
-    
-    # Validate retriever type
-    if retriever_type not in ["hybrid", "vector_cypher", "vector"]:
-        retriever_type = "hybrid"  # Default to hybrid if invalid
-    
-    # Get or create a conversation
-    conversation_id = query_request.conversation_id
-    if not conversation_id:
-        # Create a new conversation with the query as title
-        conversation = crud.create_conversation(
-            db, 
-            user_id=current_user.id, 
-            title=query_request.query[:50] + "..." if len(query_request.query) > 50 else query_request.query
-        )
-        conversation_id = conversation.id
-    else:
-        # Check if conversation exists and belongs to user
-        conversation = crud.get_conversation(db, conversation_id=conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        if conversation.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
+    trace = RequestTrace("queries/rag-assistant")
+    retriever_type = resolve_retriever_type(x_retriever_type)
     
-    # Store the user query
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="user",
-        content=query_request.query
+    # Conversation bookkeeping and the RAG pipeline run concurrently
+    result, conversation_id = await answer_query(
+        get_rag_pipeline(), db, current_user.id, query_request,
+        retriever_type=retriever_type, use_rag_format=True, trace=trace,
+        request=request, requested_timeout=x_request_timeout
     )
     
-    # Get conversation history
-    messages = crud.get_messages(db, conversation_id=conversation_id)
-    
-    # Process query with RAG pipeline, passing the retriever type and use_rag_format=True
-    pipeline = get_rag_pipeline()
-    result = pipeline.search(
-        query_request.query, 
-        messages,
-        retriever_type=retriever_type,
-        use_rag_format=True
-    )
-    
-    # Store the assistant response
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="assistant",
-        content=result.answer
-        # Note: We don't store sources in the database for RAG assistant format
-    )
+    # Store the assistant response after the response is sent
+    # Note: We don't store sources in the database for RAG assistant format
+    background_tasks.add_task(persist_assistant_message, conversation_id, result.answer)
     
-    return result
\ No newline at end of file
+    response.headers["Server-Timing"] = trace.server_timing()
+    trace.log()
+    return result
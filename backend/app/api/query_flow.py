@@ -0,0 +1,254 @@
+"""
+Shared request flow for the RAG query endpoints.
+
+Conversation bookkeeping (ownership check, creating the conversation,
+storing the user message) has no data dependency on retrieval, so it runs
+concurrently with `pipeline.search` (embedding, retrieval, generation) on
+the worker pool; the request waits only for the slower of the two. The
+assistant message is written after the response is sent.
+
+All query endpoints share one admission controller, so in-flight RAG work
+is bounded per worker process and excess load is shed with a 503.
+
+Each request runs under a deadline (per endpoint, overridable with the
+X-Request-Timeout header) that bounds the admission wait, Neo4j
+transaction timeouts and OpenAI request timeouts. The deadline is
+cancelled when the client disconnects, so remaining stages are skipped.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.admission import AdmissionController
+from app.core.config import settings
+from app.core.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.db import crud
+from app.db.session import SessionLocal
+from app.schemas.query import QueryRequest
+
+RETRIEVER_TYPES = ["hybrid", "vector_cypher", "vector", "fusion"]
+
+query_admission = AdmissionController(
+    "rag-query",
+    limit=settings.ADMISSION_LIMIT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    adaptive=settings.ADMISSION_ADAPTIVE,
+    min_limit=settings.ADMISSION_MIN_LIMIT,
+    max_limit=settings.ADMISSION_MAX_LIMIT,
+    latency_target=settings.ADMISSION_LATENCY_TARGET_SECONDS
+)
+
+
+def resolve_retriever_type(header_value: Optional[str]) -> str:
+    """Retriever type from the request header or environment, defaulting to hybrid."""
+    retriever_type = header_value or os.getenv("RETRIEVER_TYPE", "hybrid")
+    if retriever_type not in RETRIEVER_TYPES:
+        retriever_type = "hybrid"  # Default to hybrid if invalid
+    return retriever_type
+
+
+def _parse_deadline_overrides(value: str) -> Dict[str, float]:
+    overrides = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            endpoint, seconds = pair.split("=", 1)
+            overrides[endpoint.strip()] = float(seconds)
+    return overrides
+
+
+_deadline_overrides = _parse_deadline_overrides(settings.REQUEST_DEADLINE_OVERRIDES)
+
+
+def request_deadline_seconds(endpoint: str, requested: Optional[float] = None) -> float:
+    """Deadline for an endpoint, or the client-requested one capped at REQUEST_DEADLINE_MAX_SECONDS."""
+    if requested is not None and requested > 0:
+        return min(requested, settings.REQUEST_DEADLINE_MAX_SECONDS)
+    return _deadline_overrides.get(endpoint, settings.REQUEST_DEADLINE_SECONDS)
+
+
+async def _cancel_on_disconnect(request: Request, deadline: Deadline, interval: float = 0.5):
+    """Cancel the deadline as soon as the HTTP client goes away."""
+    while not deadline.cancelled:
+        if await request.is_disconnected():
+            print(f"Client disconnected, cancelling request: {request.url.path}")
+            deadline.cancel("client disconnected")
+            return
+        await asyncio.sleep(interval)
+
+
+class RequestTrace:
+    """
+    Start/end offsets of the stages of one request.
+
+    Stages that overlap show overlapping offsets in the log line and in the
+    `Server-Timing` response header.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def _offset_ms(self, t: float) -> float:
+        return (t - self.start) * 1000
+
+    def add_span(self, stage: str, t0: float, t1: float):
+        """Record a stage from perf_counter() start/end times."""
+        self.spans.append((stage, self._offset_ms(t0), self._offset_ms(t1)))
+
+    async def run_in_threadpool(self, stage: str, fn, *args, **kwargs) -> Any:
+        """Run a blocking stage on the worker pool and record its span."""
+        t0 = time.perf_counter()
+        try:
+            return await run_in_threadpool(fn, *args, **kwargs)
+        finally:
+            self.add_span(stage, t0, time.perf_counter())
+
+    def _ordered_spans(self) -> List[Tuple[str, float, float]]:
+        return sorted(self.spans, key=lambda span: span[1])
+
+    def server_timing(self) -> str:
+        total = self._offset_ms(time.perf_counter())
+        entries = [f'{stage};desc="+{start:.1f}ms";dur={end - start:.1f}' for stage, start, end in self._ordered_spans()]
+        return ", ".join(entries + [f"total;dur={total:.1f}"])
+
+    def log(self):
+        total = self._offset_ms(time.perf_counter())
+        spans = " | ".join(f"{stage} {start:.0f}-{end:.0f} ms" for stage, start, end in self._ordered_spans())
+        print(f"⏱️ {self.name}: {spans} | total {total:.0f} ms")
+
+
+def prepare_conversation(db: Session, user_id: int, query_request: QueryRequest) -> int:
+    """Create or authorize the conversation and store the user message; returns its id."""
+    conversation_id = query_request.conversation_id
+    if not conversation_id:
+        # Create a new conversation with the query as title
+        conversation = crud.create_conversation(
+            db,
+            user_id=user_id,
+            title=query_request.query[:50] + "..." if len(query_request.query) > 50 else query_request.query
+        )
+        conversation_id = conversation.id
+    else:
+        # Check if conversation exists and belongs to user
+        conversation = crud.get_conversation(db, conversation_id=conversation_id)
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        if conversation.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
+
+    # Store the user query
+    crud.create_message(
+        db,
+        conversation_id=conversation_id,
+        role="user",
+        content=query_request.query
+    )
+    return conversation_id
+
+
+async def answer_query(
+    pipeline,
+    db: Session,
+    user_id: int,
+    query_request: QueryRequest,
+    retriever_type: str,
+    use_rag_format: bool,
+    trace: RequestTrace,
+    request: Optional[Request] = None,
+    requested_timeout: Optional[float] = None
+) -> Tuple[Any, int]:
+    """
+    Run conversation bookkeeping and the RAG pipeline concurrently, once
+    admitted by the query admission controller, under a request deadline.
+
+    The pipeline answers from retrieved context only and ignores history,
+    so no history read is needed before searching.
+
+    Args:
+        trace: Request trace; its name selects the endpoint's deadline
+        request: HTTP request, watched for client disconnects
+        requested_timeout: Client-requested deadline in seconds (header)
+
+    Returns:
+        (pipeline result, conversation id)
+
+    Raises:
+        HTTPException: 503 with Retry-After when the request is shed
+        DeadlineExceeded: when the deadline passes before the answer is ready
+    """
+    deadline = Deadline(
+        request_deadline_seconds(trace.name, requested_timeout),
+        client_requested=requested_timeout is not None and requested_timeout > 0
+    )
+    with deadline_scope(deadline):
+        watcher = asyncio.ensure_future(_cancel_on_disconnect(request, deadline)) if request is not None else None
+        try:
+            t0 = time.perf_counter()
+            async with query_admission.admit(timeout=min(query_admission.queue_timeout, deadline.remaining())):
+                trace.add_span("admission", t0, time.perf_counter())
+                return await _answer_query(
+                    pipeline, db, user_id, query_request, retriever_type, use_rag_format, trace, deadline
+                )
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+
+def _discard_outcome(task: asyncio.Future):
+    # The worker thread can't be interrupted; retrieve its outcome so an
+    # abandoned failure isn't reported as never retrieved
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+async def _answer_query(pipeline, db, user_id, query_request, retriever_type, use_rag_format, trace, deadline):
+    search_task = asyncio.ensure_future(trace.run_in_threadpool(
+        "search",
+        pipeline.search,
+        query_request.query,
+        None,
+        retriever_type=retriever_type,
+        use_rag_format=use_rag_format
+    ))
+    try:
+        conversation_id = await trace.run_in_threadpool("conversation", prepare_conversation, db, user_id, query_request)
+    except BaseException:
+        # Not found / not authorized: the answer is discarded
+        deadline.cancel("request rejected")
+        _discard_outcome(search_task)
+        raise
+    try:
+        result = await asyncio.wait_for(asyncio.shield(search_task), timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        # Respond now; the pipeline stops at its next deadline check
+        deadline.cancel("deadline exceeded")
+        _discard_outcome(search_task)
+        raise DeadlineExceeded("response")
+    return result, conversation_id
+
+
+def persist_assistant_message(conversation_id: int, content: str, sources: Optional[List[dict]] = None):
+    """
+    Store the assistant reply (run as a background task after the response).
+
+    The request's session is closed by then, so this uses its own session.
+    """
+    db = SessionLocal()
+    try:
+        crud.create_message(
+            db,
+            conversation_id=conversation_id,
+            role="assistant",
+            content=content,
+            sources=sources
+        )
+    except Exception as e:
+        print(f"Error storing assistant message for conversation {conversation_id}: {e}")
+    finally:
+        db.close()
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Header, Response
 from sqlalchemy.orm import Session
 from typing import Optional
-import os
 
 from app.api.auth import get_db_user
+from app.api.query_flow import RequestTrace, answer_query, persist_assistant_message, resolve_retriever_type
 from app.db.session import get_db
-from app.db import crud, models
+from app.schemas.user import User
 from app.schemas.query import QueryRequest, RagResponse
 from app.rag.retrievers import RagPipeline
 
@@ -25,9 +25,13 @@ def get_rag_pipeline():
 @router.post("/query", response_model=RagResponse)
 async def neo4j_rag_query(
     query_request: QueryRequest,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user),
-    x_retriever_type: Optional[str] = Header(None, alias="retriever-type")
+    current_user: User = Depends(get_db_user),
+    x_retriever_type: Optional[str] = Header(None, alias="retriever-type"),
+    x_request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout")
 ):
     """
     Process a query and return a response in the specified RAG format.
@@ -41,57 +45,19 @@ async def neo4j_rag_query(
     Returns:
         RagResponse: Answer and sources in the standardized RAG format
     """
-    # Get the retriever type from header or environment
-    retriever_type = x_retriever_type or os.getenv("RETRIEVER_TYPE", "hybrid")
-    
-    # Validate retriever type
-    if retriever_type not in ["hybrid", "vector_cypher", "vector"]:
-        retriever_type = "hybrid"  # Default to hybrid if invalid
-    
-    # Get or create a conversation
-    conversation_id = query_request.conversation_id
-    if not conversation_id:
-        # Create a new conversation with the query as title
-        conversation = crud.create_conversation(
-            db, 
-            user_id=current_user.id, 
-            title=query_request.query[:50] + "..." if len(query_request.query) > 50 else query_request.query
-        )
-        conversation_id = conversation.id
-    else:
-        # Check if conversation exists and belongs to user
-        conversation = crud.get_conversation(db, conversation_id=conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        if conversation.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
-    
-    # Store the user query
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="user",
-        content=query_request.query
+    trace = RequestTrace("rag/query")
+    retriever_type = resolve_retriever_type(x_retriever_type)
+    
+    # Conversation bookkeeping and the RAG pipeline run concurrently
+    result, conversation_id = await answer_query(
+        get_rag_pipeline(), db, current_user.id, query_request,
+        retriever_type=retriever_type, use_rag_format=True, trace=trace,
+        request=request, requested_timeout=x_request_timeout
     )
     
-    # Get conversation history
-    messages = crud.get_messages(db, conversation_id=conversation_id)
-    
-    # Process query with RAG pipeline, passing the retriever type and use_rag_format=True
-    pipeline = get_rag_pipeline()
-    result = pipeline.search(
-        query_request.query, 
-        messages,
-        retriever_type=retriever_type,
-        use_rag_format=True
-    )
-    
-    # Store the assistant response
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="assistant",
-        content=result.answer
-    )
+    # Store the assistant response after the response is sent
+    background_tasks.add_task(persist_assistant_message, conversation_id, result.answer)
     
+    response.headers["Server-Timing"] = trace.server_timing()
+    trace.log()
     return result
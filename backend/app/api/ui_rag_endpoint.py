@@ -1,17 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Response
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Header
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
-import os
-import json
+from typing import Optional
 
 from app.api.auth import get_db_user
+from app.api.query_flow import RequestTrace, answer_query, persist_assistant_message, resolve_retriever_type
+from app.core.responses import FastJSONResponse
 from app.db.session import get_db
-from app.db import crud, models
+from app.schemas.user import User
 from app.schemas.query import QueryRequest
 from app.schemas.ui_formats import UIRagResponse
 from app.rag.retrievers import RagPipeline
-from app.rag.ui_formatter import format_for_ui, enhance_with_metadata
+from app.rag.ui_formatter import build_ui_payload
 
 router = APIRouter()
 
@@ -26,13 +25,15 @@ def get_rag_pipeline():
     return rag_pipeline
 
 
-@router.post("/query", response_model=Dict[str, Any])
+@router.post("/query", response_model=UIRagResponse, response_class=FastJSONResponse)
 async def ui_rag_query(
     query_request: QueryRequest,
-    response: Response,
+    request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user),
-    x_retriever_type: Optional[str] = Header(None, alias="retriever-type")
+    current_user: User = Depends(get_db_user),
+    x_retriever_type: Optional[str] = Header(None, alias="retriever-type"),
+    x_request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout")
 ):
     """
     Process a query and return a response formatted for UI display.
@@ -45,73 +46,27 @@ async def ui_rag_query(
     Returns:
         JSON response with answer and UI-formatted sources panel
     """
-    # Get the retriever type from header or environment
-    retriever_type = x_retriever_type or os.getenv("RETRIEVER_TYPE", "hybrid")
+    trace = RequestTrace("ui-rag/query")
+    retriever_type = resolve_retriever_type(x_retriever_type)
     
-    # Validate retriever type
-    if retriever_type not in ["hybrid", "vector_cypher", "vector"]:
-        retriever_type = "hybrid"  # Default to hybrid if invalid
-    
-    # Get or create a conversation
-    conversation_id = query_request.conversation_id
-    if not conversation_id:
-        # Create a new conversation with the query as title
-        conversation = crud.create_conversation(
-            db, 
-            user_id=current_user.id, 
-            title=query_request.query[:50] + "..." if len(query_request.query) > 50 else query_request.query
-        )
-        conversation_id = conversation.id
-    else:
-        # Check if conversation exists and belongs to user
-        conversation = crud.get_conversation(db, conversation_id=conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        if conversation.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
-    
-    # Store the user query
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="user",
-        content=query_request.query
-    )
-    
-    # Get conversation history
-    messages = crud.get_messages(db, conversation_id=conversation_id)
-    
-    # Process query with RAG pipeline
-    pipeline = get_rag_pipeline()
-    result = pipeline.search(
-        query_request.query, 
-        messages,
-        retriever_type=retriever_type,
-        use_rag_format=True
+    # Conversation bookkeeping and the RAG pipeline run concurrently
+    result, conversation_id = await answer_query(
+        get_rag_pipeline(), db, current_user.id, query_request,
+        retriever_type=retriever_type, use_rag_format=True, trace=trace,
+        request=request, requested_timeout=x_request_timeout
     )
     
-    # Convert Pydantic model to dict
-    result_dict = result.dict()
+    # Build the UI payload as plain data in one pass
+    payload = build_ui_payload(result, query_request.query)
     
-    # Format for UI display
-    ui_response = format_for_ui(result_dict)
+    # Store the assistant response after the response is sent
+    background_tasks.add_task(persist_assistant_message, conversation_id, payload["answer"])
     
-    # Enhance with additional metadata based on query
-    enhanced_sources = enhance_with_metadata(ui_response.SOURCES_PANEL.items, query_request.query)
-    ui_response.SOURCES_PANEL.items = enhanced_sources
-    
-    # Store the assistant response
-    crud.create_message(
-        db,
-        conversation_id=conversation_id,
-        role="assistant",
-        content=ui_response.answer
+    # Returning the response directly skips response_model re-validation;
+    # the payload is serialized once
+    trace.log()
+    return FastJSONResponse(
+        content=payload,
+        headers={"Server-Timing": trace.server_timing()},
+        background=background_tasks
     )
-    
-    # Convert to dict for JSONResponse
-    response_dict = ui_response.dict()
-    
-    # Set content type to ensure proper JSON formatting
-    response.headers["Content-Type"] = "application/json"
-    
-    return response_dict
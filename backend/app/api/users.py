@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from app.api.auth import get_db_user
+from app.api.auth import get_db_user, invalidate_cached_user
 from app.db.session import get_db
-from app.db import crud, models
+from app.db import crud
 from app.schemas.user import User
 
 router = APIRouter()
@@ -11,7 +11,7 @@ router = APIRouter()
 
 @router.get("/me", response_model=User)
 def read_current_user(
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
     """Get current user information."""
     return current_user
@@ -21,7 +21,7 @@ def read_current_user(
 def update_current_user(
     user_update: User,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_db_user)
+    current_user: User = Depends(get_db_user)
 ):
     """Update current user information."""
     # Check if email already exists
@@ -30,12 +30,18 @@ def update_current_user(
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
     
+    # current_user is a cached snapshot; load the row to update it
+    db_user = crud.get_user(db, user_id=current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
     # Update user
-    current_user.email = user_update.email
-    current_user.full_name = user_update.full_name
+    db_user.email = user_update.email
+    db_user.full_name = user_update.full_name
     
-    db.add(current_user)
+    db.add(db_user)
     db.commit()
-    db.refresh(current_user)
+    db.refresh(db_user)
+    invalidate_cached_user(db_user.id)
     
-    return current_user
\ No newline at end of file
+    return db_user
\ No newline at end of file
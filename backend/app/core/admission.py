@@ -0,0 +1,189 @@
+import asyncio
+import collections
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core.circuit_breaker import DependencyUnavailableError
+from app.core.deadline import DeadlineExceeded, current_deadline
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO wait queue for async endpoints.
+
+    Requests beyond the limit wait in the queue until a slot frees up or
+    their queue deadline passes; when the queue is full or the deadline
+    passes they are shed immediately with 503 + Retry-After instead of
+    piling up in the server.
+
+    With `adaptive`, the limit follows AIMD on observed latency: it is cut
+    by `decrease_factor` (at most once per second) when a request is slower
+    than `latency_target` or fails with an overload error (not a dependency
+    outage, client disconnect or client-requested deadline), and grows by
+    about one slot per limit's worth of fast completions while saturated.
+
+    Not thread-safe: use from a single event loop (one per worker process).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        latency_target: float = 10.0,
+        decrease_factor: float = 0.9
+    ):
+        self.name = name
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(max_limit or limit, limit)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(limit)
+        self._in_flight = 0
+        self._waiters: "collections.deque[asyncio.Future]" = collections.deque()
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+        self.admitted = 0
+        self.queued_total = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.queue_wait_total = 0.0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def _retry_after(self) -> int:
+        # Roughly the time for the current backlog to drain
+        latency = self._latency_ewma or 1.0
+        backlog = (len(self._waiters) + self._in_flight) / self.limit
+        return max(1, int(round(latency * max(1.0, backlog))))
+
+    def _reject(self, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=f"Server is at capacity ({reason}). Please retry shortly.",
+            headers={"Retry-After": str(self._retry_after())}
+        )
+
+    def _grant(self):
+        """Hand free slots to waiters in arrival order."""
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._grant()
+
+    async def _acquire(self, timeout: Optional[float]):
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            raise self._reject("queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if timeout is None else timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up: hand the slot back
+                self._release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed_timeout += 1
+                raise self._reject("queue timeout")
+            raise
+        finally:
+            self.queue_wait_total += time.monotonic() - start
+
+    def _on_complete(self, latency: float, overloaded: Optional[bool]):
+        if overloaded is None:
+            # Ended by the client, not by this server: no load signal
+            return
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if overloaded or latency > self.latency_target:
+            if now - self._last_decrease >= 1.0:
+                self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+                self._last_decrease = now
+        elif self._in_flight + 1 >= self.limit:
+            # Only grow while the current limit is actually in use
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    @asynccontextmanager
+    async def admit(self, timeout: Optional[float] = None):
+        """
+        Hold a slot for the duration of the block.
+
+        Args:
+            timeout: Maximum queue wait in seconds (defaults to queue_timeout)
+
+        Raises:
+            HTTPException: 503 with Retry-After when the request is shed
+        """
+        await self._acquire(timeout)
+        self.admitted += 1
+        start = time.monotonic()
+        overloaded = False
+        try:
+            yield
+        except HTTPException as e:
+            overloaded = e.status_code in (503, 504)
+            raise
+        except DependencyUnavailableError:
+            # A dependency outage, not load on this server
+            raise
+        except DeadlineExceeded as e:
+            # A client that went away or asked for a shorter deadline than
+            # the server's says nothing about load
+            deadline = current_deadline()
+            client_ended = e.reason == "client disconnected" or (
+                deadline is not None and (deadline.cancel_reason == "client disconnected" or deadline.client_requested)
+            )
+            overloaded = None if client_ended else True
+            raise
+        except Exception:
+            overloaded = True
+            raise
+        finally:
+            self._release()
+            self._on_complete(time.monotonic() - start, overloaded)
+            self._grant()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return limit, queue and shed counters for metrics endpoints."""
+        return {
+            "limit": self.limit,
+            "adaptive": self.adaptive,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_queue_wait_ms": round(self.queue_wait_total / self.queued_total * 1000, 1) if self.queued_total else 0.0,
+            "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+        }
@@ -0,0 +1,227 @@
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Human-readable names used in fast-fail responses
+DEPENDENCIES = {
+    "neo4j": "The knowledge graph database",
+    "embedding": "The OpenAI embedding service",
+    "chat": "The OpenAI chat service",
+}
+
+
+class DependencyUnavailableError(Exception):
+    """A dependency is down: its circuit breaker is open or the call failed to connect."""
+
+    def __init__(self, name: str, retry_after: Optional[float] = None):
+        self.name = name
+        self.dependency = DEPENDENCIES.get(name, name)
+        self.retry_after = retry_after
+        super().__init__(f"{self.dependency} is unavailable")
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one downstream dependency.
+
+    Outcomes are counted in one-second buckets over a sliding window. Once
+    the window holds at least `minimum_calls` calls and the failure rate
+    reaches `failure_rate_threshold`, the breaker opens: calls fail
+    immediately with DependencyUnavailableError for `open_seconds`. It then
+    turns half-open and lets `half_open_max_calls` trial calls through; a
+    successful trial closes it, a failed one opens it again.
+
+    Only errors the caller classifies as failures count (e.g. connection
+    errors, not bad requests or the request's own deadline). Thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 5,
+        window_seconds: float = 30.0,
+        open_seconds: float = 15.0,
+        half_open_max_calls: int = 1,
+        enabled: bool = True
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._buckets: "collections.deque[list]" = collections.deque()  # [second, calls, failures]
+        self.opened = 0
+        self.rejected = 0
+
+    def _prune(self, now: float):
+        horizon = int(now - self.window_seconds)
+        while self._buckets and self._buckets[0][0] <= horizon:
+            self._buckets.popleft()
+
+    def _window(self, now: float):
+        self._prune(now)
+        calls = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return calls, failures
+
+    def _count(self, now: float, failed: bool):
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][1] += 1
+        if failed:
+            self._buckets[-1][2] += 1
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._trials = 0
+        self.opened += 1
+        print(f"Circuit breaker '{self.name}' opened for {self.open_seconds:g}s")
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _reject(self, now: float) -> DependencyUnavailableError:
+        self.rejected += 1
+        return DependencyUnavailableError(self.name, retry_after=max(1.0, self._opened_at + self.open_seconds - now))
+
+    def check(self):
+        """Fail fast if a call would be rejected right now, without taking a trial slot."""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == OPEN or (state == HALF_OPEN and self._trials >= self.half_open_max_calls):
+                raise self._reject(now)
+
+    def _allow(self) -> bool:
+        """Admit one call; returns True when it is a half-open trial."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+            raise self._reject(now)
+
+    def _record(self, trial: bool, failed: Optional[bool]):
+        """Record an outcome (failed=None: neither success nor failure)."""
+        with self._lock:
+            now = time.monotonic()
+            if trial:
+                self._trials -= 1
+                if failed:
+                    self._open(now)
+                elif failed is not None:
+                    print(f"Circuit breaker '{self.name}' closed")
+                    self._state = CLOSED
+                    self._buckets.clear()
+                return
+            if failed is None or self._state != CLOSED:
+                # Late results of calls admitted before the breaker opened
+                return
+            self._count(now, failed)
+            calls, failures = self._window(now)
+            if calls >= self.minimum_calls and failures / calls >= self.failure_rate_threshold:
+                self._open(now)
+
+    @contextmanager
+    def guard(self, is_failure: Optional[Callable[[BaseException], bool]] = None):
+        """
+        Run the block as one call through the breaker.
+
+        Args:
+            is_failure: Classifies exceptions raised by the block; others
+                are re-raised without counting (default: all count)
+
+        Raises:
+            DependencyUnavailableError: when the breaker is open
+        """
+        if not self.enabled:
+            yield
+            return
+        trial = self._allow()
+        try:
+            yield
+        except BaseException as e:
+            self._record(trial, True if is_failure is None or is_failure(e) else None)
+            raise
+        self._record(trial, False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return state and window counters for metrics endpoints."""
+        with self._lock:
+            now = time.monotonic()
+            calls, failures = self._window(now)
+            return {
+                "state": self._current_state(now) if self.enabled else "disabled",
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, dependency: Optional[str] = None) -> CircuitBreaker:
+    """
+    Return the process-wide breaker for "neo4j", "embedding" or "chat".
+
+    Other dependencies (e.g. fallback LLM endpoints) are registered on
+    first use with their human-readable `dependency` name.
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                if dependency is not None:
+                    DEPENDENCIES.setdefault(name, dependency)
+                if name not in DEPENDENCIES:
+                    raise ValueError(f"Invalid circuit breaker: {name}")
+                breaker = CircuitBreaker(
+                    name,
+                    failure_rate_threshold=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+                    minimum_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+                    window_seconds=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+                    open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+                    half_open_max_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+                    enabled=settings.CIRCUIT_BREAKERS_ENABLED
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def get_circuit_breaker_metrics() -> Dict[str, Any]:
+    """Return the state of every dependency's breaker."""
+    return {name: get_circuit_breaker(name).stats() for name in list(DEPENDENCIES)}
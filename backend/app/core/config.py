@@ -15,10 +15,120 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.environ.get("SECRET_KEY", "supersecretkey")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     
+    # Password hashing. bcrypt runs on a dedicated bounded worker pool; hashes
+    # with a different work factor are upgraded transparently on login.
+    BCRYPT_ROUNDS: int = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64"))
+    
+    # Authenticated-user cache (per worker process)
+    USER_CACHE_TTL_SECONDS: int = int(os.environ.get("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_MAX_SIZE: int = int(os.environ.get("USER_CACHE_MAX_SIZE", "10000"))
+    
     # Neo4j settings
     NEO4J_URI: str = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
     NEO4J_USERNAME: str = os.environ.get("NEO4J_USERNAME", "neo4j")
     NEO4J_PASSWORD: str = os.environ.get("NEO4J_PASSWORD", "password")
+    NEO4J_MAX_CONNECTION_POOL_SIZE: int = int(os.environ.get("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT: float = float(os.environ.get("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30"))
+    
+    # Client-side hybrid ("fusion") retrieval: vector and fulltext queries run
+    # concurrently and are fused in Python before graph expansion
+    FUSION_METHOD: str = os.environ.get("FUSION_METHOD", "rrf")  # "rrf" or "weighted"
+    FUSION_RRF_K: int = int(os.environ.get("FUSION_RRF_K", "60"))
+    FUSION_VECTOR_WEIGHT: float = float(os.environ.get("FUSION_VECTOR_WEIGHT", "1.0"))
+    FUSION_FULLTEXT_WEIGHT: float = float(os.environ.get("FUSION_FULLTEXT_WEIGHT", "1.0"))
+    FUSION_CANDIDATES: int = int(os.environ.get("FUSION_CANDIDATES", "20"))  # per-leg candidates
+    # Lexical leg: "neo4j" (text_embeddings2 fulltext index) or "bm25" (in-process index)
+    FUSION_LEXICAL_BACKEND: str = os.environ.get("FUSION_LEXICAL_BACKEND", "neo4j")
+    
+    # In-process BM25 index over Chunk texts, loaded from BM25_INDEX_PATH at
+    # startup when FUSION_LEXICAL_BACKEND=bm25, or built from the graph there
+    # with BM25_BUILD_ON_STARTUP
+    BM25_INDEX_PATH: str = os.environ.get("BM25_INDEX_PATH", "")
+    BM25_BUILD_ON_STARTUP: bool = os.environ.get("BM25_BUILD_ON_STARTUP", "false").lower() == "true"
+    BM25_K1: float = float(os.environ.get("BM25_K1", "1.2"))
+    BM25_B: float = float(os.environ.get("BM25_B", "0.75"))
+    
+    # Admission control for the RAG query endpoints (per worker process)
+    ADMISSION_LIMIT: int = int(os.environ.get("ADMISSION_LIMIT", "32"))  # initial max in-flight queries
+    ADMISSION_MAX_QUEUE: int = int(os.environ.get("ADMISSION_MAX_QUEUE", "64"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+    ADMISSION_ADAPTIVE: bool = os.environ.get("ADMISSION_ADAPTIVE", "true").lower() == "true"
+    ADMISSION_MIN_LIMIT: int = int(os.environ.get("ADMISSION_MIN_LIMIT", "4"))
+    ADMISSION_MAX_LIMIT: int = int(os.environ.get("ADMISSION_MAX_LIMIT", "128"))
+    ADMISSION_LATENCY_TARGET_SECONDS: float = float(os.environ.get("ADMISSION_LATENCY_TARGET_SECONDS", "15"))
+    
+    # End-to-end request deadlines for the RAG query endpoints. Overrides
+    # are "endpoint=seconds" pairs, e.g. "ui-rag/query=45,rag/query=90";
+    # clients may ask for less (or up to the max) with X-Request-Timeout.
+    REQUEST_DEADLINE_SECONDS: float = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "60"))
+    REQUEST_DEADLINE_OVERRIDES: str = os.environ.get("REQUEST_DEADLINE_OVERRIDES", "")
+    REQUEST_DEADLINE_MAX_SECONDS: float = float(os.environ.get("REQUEST_DEADLINE_MAX_SECONDS", "120"))
+    
+    # Circuit breakers for Neo4j, OpenAI embeddings and OpenAI chat: open
+    # when the failure rate over the window reaches the threshold (with at
+    # least MIN_CALLS calls), fail fast while open, then let trial calls through
+    CIRCUIT_BREAKERS_ENABLED: bool = os.environ.get("CIRCUIT_BREAKERS_ENABLED", "true").lower() == "true"
+    CIRCUIT_BREAKER_FAILURE_RATE: float = float(os.environ.get("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+    CIRCUIT_BREAKER_MIN_CALLS: int = int(os.environ.get("CIRCUIT_BREAKER_MIN_CALLS", "5"))
+    CIRCUIT_BREAKER_WINDOW_SECONDS: float = float(os.environ.get("CIRCUIT_BREAKER_WINDOW_SECONDS", "30"))
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = float(os.environ.get("CIRCUIT_BREAKER_OPEN_SECONDS", "15"))
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = int(os.environ.get("CIRCUIT_BREAKER_HALF_OPEN_CALLS", "1"))
+    
+    # Caches derived from the graph are dropped when the graph version
+    # (GraphVersion node + Chunk count) changes; checked at most this often
+    GRAPH_VERSION_CHECK_SECONDS: float = float(os.environ.get("GRAPH_VERSION_CHECK_SECONDS", "30"))
+    
+    # Vector search result cache: query embeddings within VECTOR_CACHE_MIN_COSINE
+    # of a cached query's embedding (found via LSH buckets) reuse its top-k.
+    # Off by default: near-identical wordings can differ in one critical term
+    # (child/adult, dose/contraindication), so validate the threshold on real
+    # query pairs for the embedding model before enabling it
+    VECTOR_CACHE_ENABLED: bool = os.environ.get("VECTOR_CACHE_ENABLED", "false").lower() == "true"
+    VECTOR_CACHE_MAX_ENTRIES: int = int(os.environ.get("VECTOR_CACHE_MAX_ENTRIES", "2048"))
+    VECTOR_CACHE_TTL_SECONDS: float = float(os.environ.get("VECTOR_CACHE_TTL_SECONDS", "3600"))
+    VECTOR_CACHE_MIN_COSINE: float = float(os.environ.get("VECTOR_CACHE_MIN_COSINE", "0.95"))
+    VECTOR_CACHE_LSH_BITS: int = int(os.environ.get("VECTOR_CACHE_LSH_BITS", "12"))
+    
+    # Graph expansion of the fusion retriever's fused top-k chunks: "cypher"
+    # walks the graph inside the retrieval query, "cached" serves per-chunk
+    # neighborhoods from memory and fetches only missing chunk ids,
+    # "precomputed" reads the summaries written by
+    # `python -m app.rag.neighborhood_summaries`, "snapshot" walks the
+    # memory-mapped CSR export of `python -m app.rag.graph_snapshot`
+    GRAPH_EXPANSION_MODE: str = os.environ.get("GRAPH_EXPANSION_MODE", "cached")
+    NEIGHBORHOOD_CACHE_MAX_ENTRIES: int = int(os.environ.get("NEIGHBORHOOD_CACHE_MAX_ENTRIES", "20000"))
+    NEIGHBORHOOD_CACHE_MAX_MB: float = float(os.environ.get("NEIGHBORHOOD_CACHE_MAX_MB", "64"))
+    GRAPH_SNAPSHOT_PATH: str = os.environ.get("GRAPH_SNAPSHOT_PATH", "")
+    GRAPH_SNAPSHOT_MAX_FANOUT: int = int(os.environ.get("GRAPH_SNAPSHOT_MAX_FANOUT", "0"))  # 0 = no cap
+    
+    # Query-time entity linking: entity names and aliases found in the query
+    # seed retrieval with the chunks they come from, fused with the vector
+    # hits. Queries made up only of linked entities (content-word coverage
+    # >= ENTITY_LINK_SKIP_VECTOR_COVERAGE) get fewer vector candidates, and
+    # skip the vector search when they name at least
+    # ENTITY_LINK_SKIP_MIN_ENTITIES entities that top-k chunks mention together
+    ENTITY_LINKING_ENABLED: bool = os.environ.get("ENTITY_LINKING_ENABLED", "true").lower() == "true"
+    ENTITY_LINK_MIN_CHARS: int = int(os.environ.get("ENTITY_LINK_MIN_CHARS", "3"))
+    ENTITY_LINK_MAX_CHUNKS_PER_ENTITY: int = int(os.environ.get("ENTITY_LINK_MAX_CHUNKS_PER_ENTITY", "200"))  # 0 = no cap
+    ENTITY_LINK_WEIGHT: float = float(os.environ.get("ENTITY_LINK_WEIGHT", "1.0"))
+    ENTITY_LINK_SKIP_VECTOR_COVERAGE: float = float(os.environ.get("ENTITY_LINK_SKIP_VECTOR_COVERAGE", "1.0"))
+    ENTITY_LINK_SKIP_MIN_ENTITIES: int = int(os.environ.get("ENTITY_LINK_SKIP_MIN_ENTITIES", "2"))
+    
+    # Compound questions ("compare dupilumab and budesonide efficacy") are
+    # split into sub-queries: "rules" (several questions, or coordinated
+    # entity mentions) or "model" (LLM_FAST_MODEL, rules as fallback). The
+    # question and its sub-queries are embedded in one request and retrieved
+    # concurrently, QUERY_DECOMPOSITION_TOP_K chunks per sub-query, and the
+    # merged hits answered with one generation. "off" disables it.
+    QUERY_DECOMPOSITION: str = os.environ.get("QUERY_DECOMPOSITION", "off")
+    QUERY_DECOMPOSITION_MAX_SUBQUERIES: int = int(os.environ.get("QUERY_DECOMPOSITION_MAX_SUBQUERIES", "4"))
+    QUERY_DECOMPOSITION_TOP_K: int = int(os.environ.get("QUERY_DECOMPOSITION_TOP_K", "3"))
+    
+    # Coalesce concurrent identical queries (same normalized text and
+    # retriever type) into a single retrieval + generation
+    RAG_COALESCE_QUERIES: bool = os.environ.get("RAG_COALESCE_QUERIES", "true").lower() == "true"
     
     # PostgreSQL settings
     POSTGRES_SERVER: str = os.environ.get("POSTGRES_SERVER", "localhost")
@@ -26,10 +136,78 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = os.environ.get("POSTGRES_PASSWORD", "postgres")
     POSTGRES_DB: str = os.environ.get("POSTGRES_DB", "app")
     
+    # Worker / thread-pool layout. Sync endpoints and DB work run on the
+    # AnyIO worker thread pool, so the DB pool is sized to match it.
+    WORKER_THREADS: int = int(os.environ.get("WORKER_THREADS", "40"))
+    
+    # SQLAlchemy engine / connection pool settings
+    DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", "0"))  # 0 = match WORKER_THREADS
+    DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: int = int(os.environ.get("DB_POOL_TIMEOUT", "30"))  # seconds
+    DB_POOL_RECYCLE: int = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # seconds
+    DB_POOL_PRE_PING: bool = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "15000"))
+    DB_CREATE_TABLES_ON_STARTUP: bool = os.environ.get("DB_CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
+    
     # OpenAI settings
     OPENAI_API_KEY: str = os.environ.get("OPENAI_API_KEY", "")
     LLM_MODEL: str = os.environ.get("LLM_MODEL", "gpt-4o")
     
+    # OpenAI call scheduling (per worker process). Per-minute limits should
+    # match the account's rate limits divided by the number of workers;
+    # 0 disables a limit.
+    OPENAI_CHAT_RPM: int = int(os.environ.get("OPENAI_CHAT_RPM", "500"))
+    OPENAI_CHAT_TPM: int = int(os.environ.get("OPENAI_CHAT_TPM", "30000"))
+    OPENAI_CHAT_MAX_CONCURRENCY: int = int(os.environ.get("OPENAI_CHAT_MAX_CONCURRENCY", "16"))
+    OPENAI_EMBEDDING_RPM: int = int(os.environ.get("OPENAI_EMBEDDING_RPM", "3000"))
+    OPENAI_EMBEDDING_TPM: int = int(os.environ.get("OPENAI_EMBEDDING_TPM", "1000000"))
+    OPENAI_EMBEDDING_MAX_CONCURRENCY: int = int(os.environ.get("OPENAI_EMBEDDING_MAX_CONCURRENCY", "32"))
+    OPENAI_COMPLETION_TOKEN_ESTIMATE: int = int(os.environ.get("OPENAI_COMPLETION_TOKEN_ESTIMATE", "512"))
+    OPENAI_MAX_RETRIES: int = int(os.environ.get("OPENAI_MAX_RETRIES", "4"))
+    OPENAI_BACKOFF_BASE_SECONDS: float = float(os.environ.get("OPENAI_BACKOFF_BASE_SECONDS", "0.5"))
+    OPENAI_BACKOFF_MAX_SECONDS: float = float(os.environ.get("OPENAI_BACKOFF_MAX_SECONDS", "20"))
+    OPENAI_QUEUE_TIMEOUT_SECONDS: float = float(os.environ.get("OPENAI_QUEUE_TIMEOUT_SECONDS", "60"))
+    OPENAI_TIMEOUT_SECONDS: float = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "60"))  # per API request
+    # A timeout counts against the OpenAI breaker only when the call was given
+    # at least this long (or OPENAI_TIMEOUT_SECONDS, if lower); shorter ones
+    # were cut by a tight request deadline
+    OPENAI_OUTAGE_MIN_TIMEOUT_SECONDS: float = float(os.environ.get("OPENAI_OUTAGE_MIN_TIMEOUT_SECONDS", "10"))
+    
+    # LLM gateway. Fallback endpoints are tried in order when the primary
+    # (OPENAI_API_KEY / LLM_MODEL) fails; JSON list of objects with "name",
+    # "model" and optionally "base_url", "api_key_env", "azure_endpoint",
+    # "api_version", e.g.
+    # [{"name": "azure", "model": "gpt-4o", "azure_endpoint": "https://x.openai.azure.com",
+    #   "api_version": "2024-06-01", "api_key_env": "AZURE_OPENAI_API_KEY"},
+    #  {"name": "mini", "model": "gpt-4o-mini"}]
+    LLM_FALLBACK_ENDPOINTS: str = os.environ.get("LLM_FALLBACK_ENDPOINTS", "")
+    LLM_BASE_URL: str = os.environ.get("LLM_BASE_URL", "")  # primary endpoint override (e.g. a local server)
+    LLM_GATEWAY_MAX_WORKERS: int = int(os.environ.get("LLM_GATEWAY_MAX_WORKERS", "64"))
+    # Hedging: when the primary hasn't answered after its recent p95 latency,
+    # send one duplicate request and take whichever finishes first. The
+    # budget caps hedges at a fraction of requests.
+    LLM_HEDGING: bool = os.environ.get("LLM_HEDGING", "true").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+    LLM_HEDGE_INITIAL_DELAY_SECONDS: float = float(os.environ.get("LLM_HEDGE_INITIAL_DELAY_SECONDS", "10"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_HEDGE_BUDGET_RATIO: float = float(os.environ.get("LLM_HEDGE_BUDGET_RATIO", "0.1"))
+    
+    # Model cascade: simple questions (definition/lookup class, small context,
+    # confident retrieval) are answered by LLM_FAST_MODEL, everything else by
+    # LLM_MODEL. With escalation, a fast answer that says the context doesn't
+    # cover the question is regenerated with LLM_MODEL.
+    LLM_ROUTER_ENABLED: bool = os.environ.get("LLM_ROUTER_ENABLED", "true").lower() == "true"
+    LLM_FAST_MODEL: str = os.environ.get("LLM_FAST_MODEL", "gpt-4o-mini")
+    LLM_ROUTER_MAX_FAST_CONTEXT_TOKENS: int = int(os.environ.get("LLM_ROUTER_MAX_FAST_CONTEXT_TOKENS", "1500"))
+    LLM_ROUTER_MIN_CONFIDENCE: float = float(os.environ.get("LLM_ROUTER_MIN_CONFIDENCE", "0.85"))
+    LLM_ROUTER_ESCALATE: bool = os.environ.get("LLM_ROUTER_ESCALATE", "true").lower() == "true"
+    
+    # Concurrent query embeddings are micro-batched into one API request
+    EMBEDDING_BATCHING: bool = os.environ.get("EMBEDDING_BATCHING", "true").lower() == "true"
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", "64"))
+    
     # Database URI (will be set in model_post_init)
     SQLALCHEMY_DATABASE_URI: str = ""
     
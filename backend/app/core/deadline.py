@@ -0,0 +1,84 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time or its client went away."""
+
+    def __init__(self, stage: str, reason: str = "deadline exceeded"):
+        super().__init__(f"{reason} before {stage}")
+        self.stage = stage
+        self.reason = reason
+
+
+class Deadline:
+    """
+    Absolute deadline for one request, shared by every stage it runs.
+
+    The object is carried in a context variable, so worker threads started
+    with run_in_threadpool see the same instance; `cancel()` from the event
+    loop (e.g. on client disconnect) is visible to them at their next check.
+    `client_requested` marks deadlines the client asked for (X-Request-Timeout).
+    """
+
+    def __init__(self, seconds: float, client_requested: bool = False):
+        self.seconds = seconds
+        self.client_requested = client_requested
+        self.expires_at = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+        self.cancel_reason = None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled"):
+        self.cancel_reason = reason
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self, stage: str) -> float:
+        """Raise DeadlineExceeded if cancelled or expired; return the seconds left."""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(stage, self.cancel_reason)
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return remaining
+
+
+_current_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` (None: no deadline) the current deadline for this context and work it spawns."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def check_deadline(stage: str) -> Optional[float]:
+    """Check the current deadline, if any; return the seconds left (None without one)."""
+    deadline = _current_deadline.get()
+    return deadline.check(stage) if deadline is not None else None
+
+
+def remaining_timeout(default: Optional[float] = None) -> Optional[float]:
+    """Timeout for a blocking call: the time left on the current deadline, capped at `default`."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    return remaining if default is None else min(default, remaining)
@@ -0,0 +1,23 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed.
+
+    Meant for endpoints that return already-built, JSON-ready payloads
+    directly, so the body is serialized exactly once. Falls back to the
+    standard JSONResponse encoder without orjson.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
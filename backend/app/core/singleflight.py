@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Hashable, Tuple, Type
+
+from app.core.deadline import DeadlineExceeded, remaining_timeout
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight block on the leader's result instead of
+    repeating the work. Nothing is cached: once the call finishes, the next
+    caller for the key starts a new execution. Exceptions are re-raised in
+    every waiting caller, except those in `retry_on`, which are specific to
+    the leader's request (e.g. its deadline or disconnect): waiters then
+    start over and one of them becomes the new leader.
+
+    Waiters stop waiting when their own request deadline passes.
+    """
+
+    def __init__(self, retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.retry_on = retry_on
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per in-flight key.
+
+        Returns:
+            (result, shared): shared is True when the result came from
+            another caller's execution
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                    leader = False
+                else:
+                    future = Future()
+                    self._calls[key] = future
+                    self.executions += 1
+                    leader = True
+
+            if leader:
+                break
+            try:
+                return future.result(timeout=remaining_timeout()), True
+            except FutureTimeoutError:
+                raise DeadlineExceeded("shared result")
+            except self.retry_on:
+                continue
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result(), False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return in-flight and coalescing counters for metrics endpoints."""
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -1,7 +1,10 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_, func, select
+from sqlalchemy.orm import Session, Query, selectinload
+from typing import List, Optional, Dict, Any, Tuple
 
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash, verify_and_update_password
 from app.db import models
 from app.schemas import user as user_schema
 from app.schemas import query as query_schema
@@ -15,8 +18,10 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: user_schema.UserCreate) -> models.User:
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: user_schema.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    # Callers on the async path hash on the password pool and pass the result in
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -32,19 +37,117 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
     user = get_user_by_email(db, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        update_password_hash(db, user, new_hash)
     return user
 
 
-def get_conversations(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Conversation]:
-    return db.query(models.Conversation).filter(
-        models.Conversation.user_id == user_id
-    ).order_by(models.Conversation.updated_at.desc()).offset(skip).limit(limit).all()
+def update_password_hash(db: Session, user: models.User, hashed_password: str) -> models.User:
+    """Store a re-computed hash, e.g. after the bcrypt work factor changed."""
+    user.hashed_password = hashed_password
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
 
 
-def get_conversation(db: Session, conversation_id: int) -> Optional[models.Conversation]:
-    return db.query(models.Conversation).filter(models.Conversation.id == conversation_id).first()
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor string."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _page_conversations(
+    query: Query,
+    user_id: int,
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[datetime, int]]
+) -> Query:
+    """Restrict a conversations query to one page of a user's listing, most recently updated first."""
+    query = query.filter(models.Conversation.user_id == user_id)
+    if after is not None:
+        updated_at, conversation_id = after
+        query = query.filter(
+            tuple_(models.Conversation.updated_at, models.Conversation.id) < tuple_(updated_at, conversation_id)
+        )
+    query = query.order_by(models.Conversation.updated_at.desc(), models.Conversation.id.desc())
+    if after is None:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def get_conversations(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[models.Conversation]:
+    """
+    List a user's conversations, most recently updated first.
+
+    When `after` (a decoded cursor) is given, keyset pagination continues
+    after that (updated_at, id) position and `skip` is ignored.
+    """
+    return _page_conversations(db.query(models.Conversation), user_id, skip, limit, after).all()
+
+
+def get_conversation_summaries(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    snippet_length: int = 120
+) -> List[Dict[str, Any]]:
+    """
+    List a user's conversations with message count and last-message snippet.
+
+    Computed in a single query with correlated subqueries (served by the
+    (conversation_id, created_at, id) index), so neither messages nor their
+    full bodies are loaded. Paging follows get_conversations.
+    """
+    message_count = select(func.count(models.Message.id)).where(
+        models.Message.conversation_id == models.Conversation.id
+    ).correlate(models.Conversation).scalar_subquery()
+    last_message = select(func.substr(models.Message.content, 1, snippet_length)).where(
+        models.Message.conversation_id == models.Conversation.id
+    ).order_by(
+        models.Message.created_at.desc(), models.Message.id.desc()
+    ).limit(1).correlate(models.Conversation).scalar_subquery()
+
+    query = db.query(
+        models.Conversation.id,
+        models.Conversation.title,
+        models.Conversation.created_at,
+        models.Conversation.updated_at,
+        message_count.label("message_count"),
+        last_message.label("last_message"),
+    )
+    rows = _page_conversations(query, user_id, skip, limit, after).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def get_conversation(db: Session, conversation_id: int, with_messages: bool = False) -> Optional[models.Conversation]:
+    query = db.query(models.Conversation).filter(models.Conversation.id == conversation_id)
+    if with_messages:
+        # Load all messages in one extra IN query instead of a lazy load during serialization
+        query = query.options(selectinload(models.Conversation.messages))
+    return query.first()
 
 
 def create_conversation(db: Session, user_id: int, title: Optional[str] = None) -> models.Conversation:
@@ -55,10 +158,30 @@ def create_conversation(db: Session, user_id: int, title: Optional[str] = None)
     return db_conversation
 
 
-def get_messages(db: Session, conversation_id: int) -> List[models.Message]:
-    return db.query(models.Message).filter(
+def get_messages(
+    db: Session,
+    conversation_id: int,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[models.Message]:
+    """
+    List a conversation's messages, oldest first.
+
+    `after` (a decoded cursor) continues keyset pagination after that
+    (created_at, id) position; without `limit` all remaining messages are returned.
+    """
+    query = db.query(models.Message).filter(
         models.Message.conversation_id == conversation_id
-    ).order_by(models.Message.created_at).all()
+    )
+    if after is not None:
+        created_at, message_id = after
+        query = query.filter(
+            tuple_(models.Message.created_at, models.Message.id) > tuple_(created_at, message_id)
+        )
+    query = query.order_by(models.Message.created_at, models.Message.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 
 def create_message(
@@ -0,0 +1,35 @@
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.models import Base
+from app.db.session import engine
+
+
+def init_db() -> bool:
+    """
+    Create database tables using the shared application engine.
+
+    Runs once at application startup (when DB_CREATE_TABLES_ON_STARTUP is
+    enabled) or as a standalone migration step:
+
+        python -m app.db.init_db
+    """
+    try:
+        Base.metadata.create_all(bind=engine)
+        print("Database tables created successfully")
+        
+        # create_all only builds indexes together with new tables, so add
+        # any indexes introduced after the tables already existed
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        print("Database indexes verified")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error creating database tables: {e}")
+    except Exception as e:
+        print(f"Unexpected error creating database tables: {e}")
+    return False
+
+
+if __name__ == "__main__":
+    init_db()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -30,7 +30,17 @@ class Conversation(Base):
     
     # Relationships
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="(Message.created_at, Message.id)"
+    )
+    
+    # Serves the per-user listing ordered by most recently updated
+    __table_args__ = (
+        Index("ix_conversations_user_id_updated_at", "user_id", "updated_at", "id"),
+    )
 
 
 class Message(Base):
@@ -46,4 +56,9 @@ class Message(Base):
     sources = Column(JSON, nullable=True)  # List of source documents used
     
     # Relationships
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+    
+    # Serves the per-conversation history ordered by creation time
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at", "id"),
+    )
@@ -1,16 +1,97 @@
-from sqlalchemy import create_engine
+import threading
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+
+def get_pool_size() -> int:
+    """
+    Size of the persistent connection pool.
+
+    Defaults to the worker thread-pool size so that every thread offloading
+    DB work can hold a connection without queueing on the pool.
+    """
+    return settings.DB_POOL_SIZE or settings.WORKER_THREADS
+
+
+def _create_engine():
+    """Create the single SQLAlchemy engine used by this process."""
+    connect_args = {}
+    if settings.SQLALCHEMY_DATABASE_URI.startswith("postgresql") and settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    return create_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        pool_size=get_pool_size(),
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+engine = _create_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# Pool metrics, updated by engine pool events
+_pool_lock = threading.Lock()
+_pool_counters = {
+    "connects": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "invalidated": 0,
+}
+
+
+def _incr(name: str):
+    with _pool_lock:
+        _pool_counters[name] += 1
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    _incr("connects")
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _incr("checkouts")
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    _incr("checkins")
+
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _incr("invalidated")
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Return current connection pool state and lifetime counters."""
+    pool = engine.pool
+    with _pool_lock:
+        counters = dict(_pool_counters)
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **counters,
+    }
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
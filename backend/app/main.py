@@ -2,8 +2,6 @@ import os
 from fastapi import FastAPI, Request, Depends, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
 import logging
 from sqlalchemy.orm import Session
 
@@ -13,10 +11,26 @@ setup_env()
 
 # Now import the rest of the modules
 from app.api import auth, users, queries, rag_endpoint, ui_rag_endpoint
+from app.api.query_flow import RETRIEVER_TYPES, query_admission
 from app.core.config import settings
 from app.db.models import Base
 from app.db import models, crud
-from app.db.session import engine, get_db
+from app.db.session import engine, get_db, get_pool_metrics
+from app.db.init_db import init_db
+from app.rag.neo4j import close_shared_driver
+from app.rag.bm25 import load_bm25_index
+from app.rag.reference_rag import get_coalescing_metrics
+from app.rag.scheduler import LLMUnavailableError, get_scheduler_metrics
+from app.core.deadline import DeadlineExceeded
+from app.core.circuit_breaker import DependencyUnavailableError, get_circuit_breaker_metrics
+from app.rag.embeddings import get_embedding_batcher_metrics
+from app.rag.llm_gateway import get_llm_gateway_metrics
+from app.rag.model_router import get_model_router_metrics
+from app.rag.vector_cache import get_vector_cache_metrics
+from app.rag.neighborhood_cache import get_neighborhood_cache_metrics
+from app.rag.graph_snapshot import get_graph_snapshot_metrics
+from app.rag.entity_linker import get_entity_linker_metrics
+from app.rag.decomposition import get_query_decomposer_metrics
 from app.core import security
 from app.schemas.user import User
 from app.check_env import check_required_env_vars
@@ -40,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
 # Global exception handler
@@ -51,15 +66,56 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "An unexpected error occurred. Please try again later."},
     )
 
-# Create database tables
-try:
-    engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully")
-except SQLAlchemyError as e:
-    print(f"Error creating database tables: {e}")
-except Exception as e:
-    print(f"Unexpected error creating database tables: {e}")
+# Model API rate limited or unreachable after retries: tell clients to back off
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    logger.warning(f"LLM unavailable: {exc}")
+    retry_after = max(1, int(round(exc.retry_after or 5)))
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The language model service is busy. Please try again shortly."},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+@app.exception_handler(DependencyUnavailableError)
+async def dependency_unavailable_handler(request: Request, exc: DependencyUnavailableError):
+    logger.warning(f"Dependency unavailable: {exc}")
+    retry_after = max(1, int(round(exc.retry_after or 5)))
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.dependency} is currently unavailable. Please try again shortly.", "dependency": exc.name},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    logger.warning(f"Request deadline: {exc}")
+    return JSONResponse(
+        status_code=504,
+        content={"detail": f"The request could not be answered in time ({exc.reason} before {exc.stage})."},
+    )
+
+@app.on_event("startup")
+async def on_startup():
+    # Size the worker thread pool (sync endpoints, offloaded DB work) to match
+    # the DB connection pool so threads don't queue on connections
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = settings.WORKER_THREADS
+    
+    # Create database tables on the shared engine (or run `python -m app.db.init_db`)
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        init_db()
+    
+    # Load (or build) the BM25 index before serving, not on the first fusion
+    # request; startup fails if it can't be loaded
+    if settings.FUSION_LEXICAL_BACKEND == "bm25":
+        await to_thread.run_sync(load_bm25_index)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    engine.dispose()
+    close_shared_driver()
 
 # Include API routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["authentication"])
@@ -76,7 +132,7 @@ async def get_retriever_type():
 
 @app.post("/api/v1/retriever-type")
 async def set_retriever_type(retriever_type: str = Header(...)):
-    if retriever_type not in ["hybrid", "vector_cypher", "vector"]:
+    if retriever_type not in RETRIEVER_TYPES:
         raise HTTPException(status_code=400, detail="Invalid retriever type")
     
     # In production, this would update environment variables or a database setting
@@ -91,11 +147,25 @@ def root():
 @app.get("/health")
 def health_check():
     """Health check endpoint for the API"""
+    circuit_breakers = get_circuit_breaker_metrics()
     return {
-        "status": "ok",
+        "status": "degraded" if any(b["state"] == "open" for b in circuit_breakers.values()) else "ok",
         "openai_key_available": bool(os.environ.get("OPENAI_API_KEY")),
         "database_uri": settings.SQLALCHEMY_DATABASE_URI is not None,
-        "neo4j_uri": settings.NEO4J_URI is not None
+        "neo4j_uri": settings.NEO4J_URI is not None,
+        "db_pool": get_pool_metrics(),
+        "admission": query_admission.stats(),
+        "query_coalescing": get_coalescing_metrics(),
+        "openai_scheduler": get_scheduler_metrics(),
+        "embedding_batcher": get_embedding_batcher_metrics(),
+        "llm_gateway": get_llm_gateway_metrics(),
+        "model_router": get_model_router_metrics(),
+        "vector_cache": get_vector_cache_metrics(),
+        "neighborhood_cache": get_neighborhood_cache_metrics(),
+        "graph_snapshot": get_graph_snapshot_metrics(),
+        "entity_linker": get_entity_linker_metrics(),
+        "query_decomposition": get_query_decomposer_metrics(),
+        "circuit_breakers": circuit_breakers
     }
 
 @app.get("/api/v1/me", response_model=User)
@@ -0,0 +1,248 @@
+"""
+In-process BM25 lexical index over Chunk texts.
+
+An alternative to the Neo4j fulltext index (`text_embeddings2`) for the
+lexical leg of fusion retrieval: no round-trip and no Lucene query syntax,
+so queries need no special-character sanitization.
+
+Postings are stored CSR-style in flat NumPy arrays (term offsets, doc ids,
+term frequencies) and can be saved as .npy files and memory-mapped on load.
+Build from the graph and save with:
+
+    python -m app.rag.bm25 --output /app/data/bm25
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Alphanumeric runs, keeping internal hyphens/slashes/dots so that terms
+# like IL-13, TGF-beta, 5/6 and 2.5 survive as single tokens
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+_COMPOUND_SPLIT = re.compile(r"[-/.]")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how in into is it its
+of on or that the their there these this those to was were what when where which who why
+will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Medical-aware tokenization.
+
+    Lowercases (EoE -> eoe) and keeps compound terms intact (il-13). Compound
+    terms also emit their joined form (il13) and their parts (il, 13), so
+    "IL-13", "IL13" and "IL 13" all match.
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _COMPOUND_SPLIT.search(token):
+            parts = [part for part in _COMPOUND_SPLIT.split(token) if part]
+            tokens.append("".join(parts))
+            tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed document set with array-backed postings.
+
+    Documents are identified by the Neo4j element id of their Chunk node,
+    and search returns (element_id, score) pairs like the fulltext query.
+    """
+
+    ARRAY_NAMES = ("term_offsets", "postings_docs", "postings_tfs", "doc_lengths")
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        vocabulary: Dict[str, int],
+        term_offsets: np.ndarray,
+        postings_docs: np.ndarray,
+        postings_tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: Optional[float] = None,
+        b: Optional[float] = None
+    ):
+        self.doc_ids = doc_ids
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = settings.BM25_K1 if k1 is None else k1
+        self.b = settings.BM25_B if b is None else b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Per-document length normalization term of the BM25 denominator
+        self._length_norm = (
+            self.k1 * (1 - self.b + self.b * doc_lengths / self.avg_doc_length)
+            if self.avg_doc_length else np.zeros(len(doc_lengths))
+        ).astype(np.float32)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], **kwargs) -> "BM25Index":
+        """Build an index from (element_id, text) pairs."""
+        doc_ids: List[str] = []
+        doc_lengths: List[int] = []
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_index, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text or "")
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((doc_index, tf))
+
+        vocabulary = {term: term_id for term_id, term in enumerate(sorted(term_postings))}
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for term, term_id in vocabulary.items():
+            term_offsets[term_id + 1] = len(term_postings[term])
+        np.cumsum(term_offsets, out=term_offsets)
+
+        postings_docs = np.empty(term_offsets[-1], dtype=np.int32)
+        postings_tfs = np.empty(term_offsets[-1], dtype=np.float32)
+        for term, term_id in vocabulary.items():
+            start, end = term_offsets[term_id], term_offsets[term_id + 1]
+            postings = term_postings[term]
+            postings_docs[start:end] = [doc for doc, _tf in postings]
+            postings_tfs[start:end] = [tf for _doc, tf in postings]
+
+        return cls(
+            doc_ids, vocabulary, term_offsets, postings_docs, postings_tfs,
+            np.asarray(doc_lengths, dtype=np.float32), **kwargs
+        )
+
+    @classmethod
+    def build_from_graph(cls, driver, database: Optional[str] = None, **kwargs) -> "BM25Index":
+        """Build an index from all Chunk nodes in the graph."""
+        with driver.session(database=database) as session:
+            result = session.run("MATCH (c:Chunk) WHERE c.text IS NOT NULL RETURN elementId(c) AS id, c.text AS text")
+            return cls.build(((record["id"], record["text"]) for record in result), **kwargs)
+
+    def save(self, path: str):
+        """Save the index as .npy arrays plus a JSON vocabulary/id table."""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"doc_ids": self.doc_ids, "vocabulary": self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> "BM25Index":
+        """Load a saved index, memory-mapping the postings arrays by default."""
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in cls.ARRAY_NAMES
+        }
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(meta["doc_ids"], meta["vocabulary"], **arrays, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, query_text: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return the top_k (element_id, score) pairs for a free-text query."""
+        n_docs = len(self.doc_ids)
+        if not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query_text)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tfs = self.postings_tfs[start:end]
+            df = end - start
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_bm25_index(attempts: int = 3, retry_delay: float = 5.0) -> BM25Index:
+    """
+    Load the process-wide BM25 index from BM25_INDEX_PATH or, with
+    BM25_BUILD_ON_STARTUP, build it from the graph (and save it to
+    BM25_INDEX_PATH when set).
+
+    Run at app startup when FUSION_LEXICAL_BACKEND=bm25. A failed build is
+    retried up to `attempts` times, then raised: nothing is cached, so the
+    lexical leg is never silently disabled.
+    """
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        path = settings.BM25_INDEX_PATH
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            _index = BM25Index.load(path)
+            print(f"Loaded BM25 index with {len(_index)} chunks from {path}")
+            return _index
+        if not settings.BM25_BUILD_ON_STARTUP:
+            raise RuntimeError("FUSION_LEXICAL_BACKEND=bm25 needs an index saved at BM25_INDEX_PATH "
+                               "or BM25_BUILD_ON_STARTUP=true")
+        from app.rag.neo4j import get_shared_driver
+        for attempt in range(1, attempts + 1):
+            try:
+                index = BM25Index.build_from_graph(get_shared_driver())
+                break
+            except Exception as e:
+                if attempt == attempts:
+                    raise
+                print(f"Error building BM25 index (attempt {attempt}/{attempts}), retrying in {retry_delay:.0f}s: {e}")
+                time.sleep(retry_delay)
+        print(f"Built BM25 index with {len(index)} chunks from the graph")
+        if path:
+            try:
+                index.save(path)
+            except OSError as e:
+                print(f"Error saving BM25 index to {path}: {e}")
+        _index = index
+    return _index
+
+
+def get_bm25_index() -> BM25Index:
+    """
+    Return the process-wide BM25 index, loading it on first use where
+    startup didn't (e.g. scripts). Load errors are raised, not cached.
+    """
+    if _index is not None:
+        return _index
+    return load_bm25_index(attempts=1)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.rag.neo4j import get_shared_driver, close_shared_driver
+
+    parser = argparse.ArgumentParser(description="Build the BM25 chunk index from the graph")
+    parser.add_argument("--output", default=settings.BM25_INDEX_PATH, required=not settings.BM25_INDEX_PATH)
+    args = parser.parse_args()
+
+    index = BM25Index.build_from_graph(get_shared_driver())
+    index.save(args.output)
+    print(f"Saved BM25 index with {len(index)} chunks and {len(index.vocabulary)} terms to {args.output}")
+    close_shared_driver()
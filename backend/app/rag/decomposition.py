@@ -0,0 +1,281 @@
+"""
+Multi-query decomposition for compound questions.
+
+A question like "compare dupilumab and budesonide efficacy and side
+effects" embeds somewhere between its parts and retrieves poorly for each.
+With QUERY_DECOMPOSITION enabled, such questions are split into
+sub-queries:
+
+    rules   several questions in one ("...? ...?"), or entity mentions
+            (found by the entity linker) coordinated with and/or/vs/commas,
+            each combined with the rest of the question
+    model   LLM_FAST_MODEL splits the question; only questions with a
+            coordination or comparison marker are sent, and the rules are
+            the fallback
+
+The original question and its sub-queries are embedded in one batched
+request and retrieved concurrently, so retrieval takes about as long as a
+single one. The hits are merged round-robin without duplicate chunks and
+answered with a single generation.
+"""
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from neo4j_graphrag.types import RetrieverResult
+
+from app.core.config import settings
+from app.rag.bm25 import STOPWORDS
+from app.rag.hits import format_cypher_hits
+from app.rag.model_router import top_similarity
+
+DECOMPOSITION_MODES = ("off", "rules", "model")
+
+DECOMPOSITION_PROMPT = (
+    "Split the user's question into at most {max_queries} short, self-contained search queries, "
+    "one per line, when it asks about several things (e.g. compares treatments or asks several "
+    "questions). Otherwise return the question unchanged. Return only the queries."
+)
+
+# Questions that may be compound; others are never sent to the model
+_COMPOUND_HINT = re.compile(r"\b(and|or|vs|versus|compare[ds]?|comparing|contrast|difference|between)\b|,|\?.*\?",
+                            re.IGNORECASE)
+_QUESTION_SPLIT = re.compile(r"(?<=\?)\s+|;\s*")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+# Tokens that join coordinated mentions, and comparison words that carry no
+# meaning once the question is split per entity
+CONNECTORS = frozenset({"and", "or", "vs", "versus", "with"})
+COMPARISON_WORDS = frozenset({"compare", "compared", "compares", "comparing", "comparison", "contrast",
+                              "difference", "differences", "between", "versus", "vs", "both"})
+
+MIN_QUESTION_WORDS = 3
+
+# The original question is retrieved on the calling thread, sub-queries here
+_subquery_executor = ThreadPoolExecutor(max_workers=settings.WORKER_THREADS, thread_name_prefix="subquery")
+
+
+class QueryDecomposer:
+    """Split compound questions into sub-queries, by rules or with a cheap model."""
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        max_sub_queries: Optional[int] = None,
+        entity_linker=None,
+        gateway=None,
+        model: Optional[str] = None
+    ):
+        self.mode = mode or settings.QUERY_DECOMPOSITION
+        self.max_sub_queries = max_sub_queries or settings.QUERY_DECOMPOSITION_MAX_SUBQUERIES
+        self.entity_linker = entity_linker
+        self.gateway = gateway
+        self.model = model or settings.LLM_FAST_MODEL
+        if self.mode not in DECOMPOSITION_MODES:
+            raise ValueError(f"Invalid query decomposition mode: {self.mode}")
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.decomposed = 0
+        self.sub_queries = 0
+        self.model_calls = 0
+        self.model_failures = 0
+
+    def decompose(self, query: str) -> List[str]:
+        """Sub-queries of a compound question (not including it); [] when it isn't compound."""
+        if self.mode == "off":
+            return []
+        sub_queries = []
+        if self.mode == "model" and _COMPOUND_HINT.search(query):
+            sub_queries = self._model_split(query)
+        if not sub_queries:
+            sub_queries = self._rule_split(query)
+        original = " ".join(query.lower().split())
+        sub_queries = [q for q in dict.fromkeys(sub_queries) if " ".join(q.lower().split()) != original]
+        sub_queries = sub_queries[:self.max_sub_queries] if len(sub_queries) > 1 else []
+        with self._lock:
+            self.queries += 1
+            self.decomposed += bool(sub_queries)
+            self.sub_queries += len(sub_queries)
+        return sub_queries
+
+    def _rule_split(self, query: str) -> List[str]:
+        questions = [part.strip() for part in _QUESTION_SPLIT.split(query) if part.strip()]
+        if len(questions) > 1 and all(len(part.split()) >= MIN_QUESTION_WORDS for part in questions):
+            return questions
+        link = self.entity_linker.link(query) if self.entity_linker is not None else None
+        if link is None or len(link.mentions) < 2:
+            return []
+        # The longest run of mentions joined only by connectors (or commas)
+        mentions = sorted(link.mentions, key=lambda mention: mention.start)
+        best, run = [], [mentions[0]]
+        for previous, mention in zip(mentions, mentions[1:]):
+            between = link.query_tokens[previous.end:mention.start]
+            if all(token in CONNECTORS for token in between):
+                run.append(mention)
+            else:
+                run = [mention]
+            if len(run) > len(best):
+                best = list(run)
+        if len(best) < 2:
+            return []
+        rest = [
+            token for position, token in enumerate(link.query_tokens)
+            if not best[0].start <= position < best[-1].end
+            and token not in STOPWORDS and token not in COMPARISON_WORDS
+        ]
+        return [" ".join([mention.text, *rest]) for mention in best]
+
+    def _model_split(self, query: str) -> List[str]:
+        from app.rag.llm_gateway import get_llm_gateway
+        gateway = self.gateway or get_llm_gateway()
+        messages = [
+            {"role": "system", "content": DECOMPOSITION_PROMPT.format(max_queries=self.max_sub_queries)},
+            {"role": "user", "content": query},
+        ]
+        with self._lock:
+            self.model_calls += 1
+        try:
+            response = gateway.complete(messages, temperature=0.0, estimated_tokens=200, model=self.model)
+            lines = (response.choices[0].message.content or "").splitlines()
+        except Exception as e:
+            print(f"Error decomposing query with {self.model}: {e}")
+            with self._lock:
+                self.model_failures += 1
+            return []
+        return [_LIST_MARKER.sub("", line).strip() for line in lines if _LIST_MARKER.sub("", line).strip()]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "queries": self.queries,
+            "decomposed": self.decomposed,
+            "avg_sub_queries": round(self.sub_queries / self.decomposed, 2) if self.decomposed else 0.0,
+            "model_calls": self.model_calls,
+            "model_failures": self.model_failures,
+        }
+
+
+_decomposer = None
+_decomposer_lock = threading.Lock()
+
+
+def get_query_decomposer() -> Optional[QueryDecomposer]:
+    """Return the process-wide query decomposer, or None when decomposition is off."""
+    global _decomposer
+    if settings.QUERY_DECOMPOSITION == "off":
+        return None
+    if _decomposer is None:
+        with _decomposer_lock:
+            if _decomposer is None:
+                from app.rag.entity_linker import get_entity_linker
+                _decomposer = QueryDecomposer(entity_linker=get_entity_linker())
+    return _decomposer
+
+
+def get_query_decomposer_metrics() -> Optional[Dict[str, Any]]:
+    """Return query decomposition counters, or None before first use."""
+    return _decomposer.stats() if _decomposer is not None else None
+
+
+def _unseen_part(item, seen_chunks: set, seen_relationships: set) -> Optional[Any]:
+    """
+    The item restricted to chunks (and relationships) not merged yet, or
+    None when it adds no chunk. Items of the chunk retrieval query hold
+    several chunks and are rebuilt from their new ones; items without
+    chunk ids are compared by content.
+    """
+    hits = (getattr(item, "metadata", None) or {}).get("hits") or []
+    if not hits or not all(hit.chunk_id for hit in hits):
+        key = str(getattr(item, "content", ""))
+        if key in seen_chunks:
+            return None
+        seen_chunks.add(key)
+        return item
+    new_hits = [hit for hit in hits if hit.chunk_id not in seen_chunks]
+    if not new_hits:
+        return None
+    seen_chunks.update(hit.chunk_id for hit in new_hits)
+    relationships = hits[0].relationships
+    new_relationships = [text for text in relationships if text not in seen_relationships]
+    seen_relationships.update(relationships)
+    if len(new_hits) == len(hits) and len(new_relationships) == len(relationships):
+        return item
+    return format_cypher_hits(new_hits, new_relationships)
+
+
+def merge_results(results: List[RetrieverResult]) -> List[Any]:
+    """
+    Interleave result items by rank (first item of each result, then the
+    second...), keeping only the chunks and relationships of each item that
+    weren't merged already.
+    """
+    merged, seen_chunks, seen_relationships = [], set(), set()
+    ranked = [list(getattr(result, "items", None) or []) for result in results]
+    for rank in range(max((len(items) for items in ranked), default=0)):
+        for items in ranked:
+            if rank >= len(items):
+                continue
+            item = _unseen_part(items[rank], seen_chunks, seen_relationships)
+            if item is not None:
+                merged.append(item)
+    return merged
+
+
+class DecomposingRetriever:
+    """
+    Wraps a retriever's `search(query_text=...)`: compound questions are
+    retrieved as the question plus its sub-queries, concurrently, with one
+    batched embedding request, and the results merged into one
+    RetrieverResult. Other questions go to the retriever unchanged.
+
+    The wrapped retriever's search must accept `query_vector` next to
+    `query_text` (the vector, fusion and entity-linked retrievers do).
+    """
+
+    def __init__(self, retriever, embedder, decomposer: QueryDecomposer, sub_query_top_k: Optional[int] = None):
+        self.retriever = retriever
+        self.embedder = embedder
+        self.decomposer = decomposer
+        self.sub_query_top_k = sub_query_top_k or settings.QUERY_DECOMPOSITION_TOP_K
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        embed_batch = getattr(self.embedder, "embed_batch", None)
+        if embed_batch is not None:
+            return embed_batch(texts)
+        return [self.embedder.embed_query(text) for text in texts]
+
+    def search(self, query_text: str, **kwargs) -> RetrieverResult:
+        sub_queries = self.decomposer.decompose(query_text)
+        if not sub_queries:
+            return self.retriever.search(query_text=query_text, **kwargs)
+
+        start = time.perf_counter()
+        vectors = self._embed([query_text, *sub_queries])
+        embedding_ms = (time.perf_counter() - start) * 1000
+        # Sub-queries are narrower, so each contributes fewer chunks; the
+        # deadline and lane context is carried into the worker threads
+        futures = [
+            _subquery_executor.submit(contextvars.copy_context().run, self.retriever.search,
+                                      query_text=sub_query, query_vector=vector, top_k=self.sub_query_top_k)
+            for sub_query, vector in zip(sub_queries, vectors[1:])
+        ]
+        results = [self.retriever.search(query_text=query_text, query_vector=vectors[0], **kwargs)]
+        results.extend(future.result() for future in futures)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        scores = [score for score in map(top_similarity, results) if score is not None]
+        print(f"Decomposed query into {len(sub_queries)} sub-queries: {sub_queries}")
+        return RetrieverResult(
+            items=merge_results(results),
+            metadata={
+                "__retriever": self.__class__.__name__,
+                "sub_queries": sub_queries,
+                "sub_query_items": [len(getattr(result, "items", None) or []) for result in results],
+                "vector_top_score": max(scores, default=None),
+                "embedding_ms": round(embedding_ms, 1),
+                "total_ms": round(total_ms, 1)
+            }
+        )
@@ -1,11 +1,173 @@
 import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
 from neo4j_graphrag.embeddings.openai import OpenAIEmbeddings
 from app.core.config import settings
+from app.core.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, remaining_timeout
+from app.rag.scheduler import estimate_tokens, get_scheduler
+
+# Process-wide embedder shared by all pipelines, so concurrent requests
+# from every endpoint land in the same micro-batches
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []  # (text, future, enqueued_at, caller deadline)
+        self.full = threading.Event()
+
+
+def _batch_deadline(deadlines: Sequence[Optional[Deadline]]) -> Optional[Deadline]:
+    """Deadline for a batch request: the longest of the callers still waiting, None if one has none."""
+    if any(deadline is None for deadline in deadlines):
+        return None
+    waiting = [deadline for deadline in deadlines if not deadline.cancelled]
+    if not waiting:
+        # Every caller is gone: fail the request at its first deadline check
+        batch_deadline = Deadline(0.0)
+        batch_deadline.cancel(deadlines[0].cancel_reason)
+        return batch_deadline
+    return Deadline(max(deadline.remaining() for deadline in waiting))
+
+
+class EmbeddingBatcher:
+    """
+    Collect concurrent single-text embedding requests into batched API calls.
+    
+    The first caller to arrive opens a batch and becomes its leader: it waits
+    up to `window_ms` (or until `max_batch_size` texts have joined), then
+    sends one request for the whole batch on its own thread and resolves
+    every caller's future. Duplicate texts in a batch are embedded once.
+
+    The request runs under the longest deadline of the callers still
+    waiting (none if any caller has none), so a leader whose client went
+    away or whose deadline is short doesn't fail the rest of the batch.
+    """
+    
+    def __init__(self, send: Callable[[List[str]], List[List[float]]], window_ms: float, max_batch_size: int):
+        self.send = send
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._open: Optional[_Batch] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.deduplicated = 0
+        self.max_observed_batch = 0
+        self.wait_ms_total = 0.0
+    
+    def embed(self, text: str) -> List[float]:
+        future = Future()
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.items.append((text, future, time.monotonic(), current_deadline()))
+            if len(batch.items) >= self.max_batch_size:
+                # Full: close it so later callers open a new batch
+                self._open = None
+                batch.full.set()
+        
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._dispatch(batch.items)
+        try:
+            return future.result(timeout=remaining_timeout())
+        except FutureTimeoutError:
+            raise DeadlineExceeded("embedding")
+    
+    def _dispatch(self, items: Sequence[tuple]):
+        unique_texts = list(dict.fromkeys(text for text, _future, _t, _deadline in items))
+        dispatched_at = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.texts += len(items)
+            self.deduplicated += len(items) - len(unique_texts)
+            self.max_observed_batch = max(self.max_observed_batch, len(items))
+            self.wait_ms_total += sum((dispatched_at - t) * 1000 for _text, _future, t, _deadline in items)
+        try:
+            with deadline_scope(_batch_deadline([deadline for _text, _future, _t, deadline in items])):
+                embeddings = dict(zip(unique_texts, self.send(unique_texts)))
+        except BaseException as e:
+            for _text, future, _t, _deadline in items:
+                future.set_exception(e)
+            return
+        for text, future, _t, _deadline in items:
+            future.set_result(embeddings[text])
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return batch size and queueing counters for metrics endpoints."""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "texts": self.texts,
+            "deduplicated": self.deduplicated,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "avg_wait_ms": round(self.wait_ms_total / self.texts, 2) if self.texts else 0.0,
+        }
+
+
+class ScheduledOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    OpenAIEmbeddings whose requests go through the shared embedding scheduler.
+    
+    With EMBEDDING_BATCHING enabled, concurrent embed_query calls are
+    micro-batched into one embeddings request with an array input.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batcher = None
+        if settings.EMBEDDING_BATCHING and settings.EMBEDDING_MAX_BATCH_SIZE > 1:
+            self.batcher = EmbeddingBatcher(
+                self.embed_batch,
+                window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+                max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE
+            )
+    
+    def embed_query(self, text: str, **kwargs):
+        if self.batcher is not None and not kwargs:
+            return self.batcher.embed(text)
+        return self.embed_batch([text], **kwargs)[0]
+    
+    def embed_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        """Embed several texts with one API request, in input order."""
+        response = get_scheduler("embedding").run(
+            lambda: self.client.embeddings.create(
+                input=texts,
+                model=self.model,
+                timeout=remaining_timeout(settings.OPENAI_TIMEOUT_SECONDS),
+                **kwargs
+            ),
+            estimated_tokens=sum(estimate_tokens(text) for text in texts)
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def get_embedding_batcher_metrics() -> Optional[Dict[str, Any]]:
+    """Return micro-batching metrics of the shared embedder, if created and batching."""
+    batcher = getattr(_embedder, "batcher", None)
+    return batcher.stats() if batcher is not None else None
+
 
 def get_embedder():
     """
-    Create and return an embeddings model instance exactly as in the Jupyter notebook.
+    Return the process-wide embeddings model, creating it on first use.
     """
+    global _embedder
+    if _embedder is not None:
+        return _embedder
+    
     # Make sure the OpenAI API key is set
     if settings.OPENAI_API_KEY:
         # Show first and last few characters of the key for debugging
@@ -22,10 +184,12 @@ def get_embedder():
         raise ValueError("OPENAI_API_KEY not found in settings or environment")
     
     try:
-        # Create the embedder - identical to notebook
-        embedder = OpenAIEmbeddings()
-        print("OpenAI embeddings created successfully")
-        return embedder
+        with _embedder_lock:
+            if _embedder is None:
+                # Create the embedder; retries are left to the scheduler
+                _embedder = ScheduledOpenAIEmbeddings(max_retries=0)
+                print("OpenAI embeddings created successfully")
+        return _embedder
     except Exception as e:
         print(f"Error creating OpenAI embeddings: {e}")
         raise
\ No newline at end of file
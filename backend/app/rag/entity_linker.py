@@ -0,0 +1,432 @@
+"""
+Query-time entity linking over the knowledge graph's entity names.
+
+Every entity `name` (and `aliases`, when present) in the graph is compiled
+into an Aho-Corasick automaton over normalized word tokens, so all entity
+mentions in a query are found in one pass regardless of how many entities
+there are. Normalization lowercases and treats hyphenated, apostrophe and
+dotted compounds as either their parts or their joined form, so "IL-13",
+"IL13" and "il 13" all link to an entity named IL-13.
+
+Linked entities seed retrieval directly: the chunks they come from
+(`FROM_CHUNK`) are ranked by how many of the linked mentions they contain
+and fused with the vector hits. When the query is made up entirely of
+linked entities and enough chunks mention all of them, the vector search
+(and the query embedding) is skipped.
+
+The automaton is built from the graph on first use and rebuilt when the
+graph version changes; entities linked to more than
+ENTITY_LINK_MAX_CHUNKS_PER_ENTITY chunks are too generic to link.
+"""
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import neo4j
+from neo4j_graphrag.types import RawSearchResult
+
+from app.core.config import settings
+from app.rag.bm25 import STOPWORDS
+from app.rag.fusion import RankedList, reciprocal_rank_fusion
+from app.rag.graph_version import get_graph_version
+from app.rag.vector_cache import CachedVectorRetriever
+
+ENTITY_NAMES_QUERY = """
+MATCH (entity)-[:FROM_CHUNK]->(:Chunk)
+WHERE entity.name IS NOT NULL
+WITH entity, count(*) AS chunks
+WHERE $max_chunks = 0 OR chunks <= $max_chunks
+RETURN elementId(entity) AS id, entity.name AS name, entity.aliases AS aliases
+"""
+
+# Chunks of the linked entities, ranked by the number of distinct mentions
+# (each mention may resolve to several entity nodes) they contain
+LINKED_CHUNKS_QUERY = """
+UNWIND range(0, size($mentions) - 1) AS mention
+UNWIND $mentions[mention] AS entity_id
+MATCH (entity) WHERE elementId(entity) = entity_id
+MATCH (entity)-[:FROM_CHUNK]->(chunk:Chunk)
+WITH chunk, count(DISTINCT mention) AS mentions
+ORDER BY mentions DESC, elementId(chunk)
+LIMIT $limit
+RETURN elementId(chunk) AS id, mentions, chunk.text AS text, chunk.source2 AS source2
+"""
+
+# Words are split on anything but letters, digits and the compound
+# separators; compounds are then split into parts or joined
+_WORD_PATTERN = re.compile(r"[^\W_]+(?:['’.-][^\W_]+)*")
+_PART_PATTERN = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase query tokens with compounds joined (IL-13 -> il13)."""
+    return ["".join(_PART_PATTERN.findall(word)) for word in _WORD_PATTERN.findall(text.lower())]
+
+
+def name_variants(name: str) -> List[Tuple[str, ...]]:
+    """Token sequences an entity name is matched as: compounds joined, and split into parts."""
+    joined = tuple(normalize(name))
+    parts = tuple(_PART_PATTERN.findall(name.lower()))
+    return [joined] if parts == joined else [joined, parts]
+
+
+class TokenAutomaton:
+    """Aho-Corasick automaton whose alphabet is word tokens."""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.depth: List[int] = [0]
+        self.values: List[Optional[List[str]]] = [None]
+        # Next state on the failure chain that ends a pattern (0 = none)
+        self.output_link: List[int] = [0]
+
+    def __len__(self) -> int:
+        return len(self.goto)
+
+    def add(self, tokens: Sequence[str], value: str):
+        """Add a pattern; patterns added more than once collect all their values."""
+        state = 0
+        for token in tokens:
+            child = self.goto[state].get(token)
+            if child is None:
+                child = len(self.goto)
+                self.goto[state][token] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.depth.append(self.depth[state] + 1)
+                self.values.append(None)
+                self.output_link.append(0)
+            state = child
+        if self.values[state] is None:
+            self.values[state] = []
+        if value not in self.values[state]:
+            self.values[state].append(value)
+
+    def finalize(self):
+        """Compute failure and output links (breadth-first)."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(token, 0) if state else 0
+                self.fail[child] = target
+                self.output_link[child] = target if self.values[target] is not None else self.output_link[target]
+
+    def matches(self, tokens: Sequence[str]) -> List[Tuple[int, int, int]]:
+        """All (start, end, state) pattern occurrences in the token sequence."""
+        found = []
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            output = state if self.values[state] is not None else self.output_link[state]
+            while output:
+                found.append((position + 1 - self.depth[output], position + 1, output))
+                output = self.output_link[output]
+        return found
+
+
+@dataclass
+class EntityMention:
+    text: str
+    entity_ids: List[str]
+    start: int
+    end: int
+
+
+@dataclass
+class EntityLink:
+    """Entity mentions found in a query and the share of its content words they cover."""
+
+    query_tokens: List[str]
+    mentions: List[EntityMention]
+    coverage: float
+
+    def describe(self) -> Dict[str, Any]:
+        return {"mentions": [mention.text for mention in self.mentions], "coverage": round(self.coverage, 2)}
+
+
+class EntityIndex:
+    """Entity names and aliases compiled into a token automaton."""
+
+    def __init__(self, automaton: TokenAutomaton, entities: int, patterns: int, version: Optional[str] = None):
+        self.automaton = automaton
+        self.entities = entities
+        self.patterns = patterns
+        self.version = version
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, Any, Any]], min_chars: int = 3,
+              version: Optional[str] = None) -> "EntityIndex":
+        """
+        Build from (entity_id, name, aliases) rows. Names shorter than
+        `min_chars` (joined) or made up of stopwords only are left out.
+        """
+        automaton = TokenAutomaton()
+        entities = patterns = 0
+        for entity_id, name, aliases in rows:
+            if isinstance(aliases, str):
+                aliases = [aliases]
+            linked = False
+            for surface in [name, *(aliases or [])]:
+                if not isinstance(surface, str):
+                    continue
+                for tokens in name_variants(surface):
+                    if len("".join(tokens)) < min_chars or all(token in STOPWORDS for token in tokens):
+                        continue
+                    automaton.add(tokens, entity_id)
+                    patterns += 1
+                    linked = True
+            entities += linked
+        automaton.finalize()
+        return cls(automaton, entities, patterns, version)
+
+    def find(self, query: str) -> EntityLink:
+        """Leftmost-longest, non-overlapping entity mentions in the query."""
+        tokens = normalize(query)
+        matches = sorted(self.automaton.matches(tokens), key=lambda match: (match[0], match[0] - match[1]))
+        mentions: List[EntityMention] = []
+        seen = set()
+        covered = set()
+        for start, end, state in matches:
+            if start in covered or end - 1 in covered:
+                continue
+            covered.update(range(start, end))
+            # The same entities mentioned twice (e.g. as IL-13 and IL13) count once
+            entity_ids = self.automaton.values[state]
+            if tuple(entity_ids) in seen:
+                continue
+            seen.add(tuple(entity_ids))
+            mentions.append(EntityMention(" ".join(tokens[start:end]), list(entity_ids), start, end))
+        content = [i for i, token in enumerate(tokens) if token not in STOPWORDS]
+        coverage = sum(i in covered for i in content) / len(content) if content else 0.0
+        return EntityLink(tokens, mentions, coverage)
+
+
+class EntityLinker:
+    """
+    Links queries to graph entities through an EntityIndex that is loaded
+    on first use and rebuilt when the graph version changes.
+
+    Only one thread builds; the others keep linking with the previous index
+    (or don't link at all until the first build finishes).
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[Tuple[str, Any, Any]]],
+        min_chars: int = 3,
+        skip_vector_coverage: float = 1.0,
+        skip_min_entities: int = 2,
+        version_source: Callable[[], Optional[str]] = get_graph_version,
+        retry_seconds: float = 60.0
+    ):
+        self.loader = loader
+        self.min_chars = min_chars
+        self.skip_vector_coverage = skip_vector_coverage
+        self.skip_min_entities = skip_min_entities
+        self.version_source = version_source
+        self.retry_seconds = retry_seconds
+        self._index: Optional[EntityIndex] = None
+        self._build_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._stats_lock = threading.Lock()
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.queries = 0
+        self.linked_queries = 0
+        self.link_seconds = 0.0
+        self.vector_skips = 0
+
+    def index(self) -> Optional[EntityIndex]:
+        """Return the current index, building or rebuilding it when due."""
+        index = self._index
+        version = self.version_source()
+        if index is not None and (version is None or version == index.version):
+            return index
+        if time.monotonic() < self._retry_at or not self._build_lock.acquire(blocking=False):
+            return index
+        try:
+            index = self._index
+            if index is None or (version is not None and version != index.version):
+                start = time.perf_counter()
+                index = EntityIndex.build(self.loader(), self.min_chars, version)
+                self.builds += 1
+                self.build_seconds = time.perf_counter() - start
+                self._index = index
+                print(f"Built entity linker with {index.entities} entities, {index.patterns} patterns "
+                      f"in {self.build_seconds:.1f}s")
+        except Exception as e:
+            print(f"Error building entity linker: {e}")
+            self._retry_at = time.monotonic() + self.retry_seconds
+        finally:
+            self._build_lock.release()
+        return self._index
+
+    def link(self, query: str) -> Optional[EntityLink]:
+        """Find entity mentions in the query (None while no index is available)."""
+        index = self.index()
+        if index is None:
+            return None
+        start = time.perf_counter()
+        link = index.find(query)
+        with self._stats_lock:
+            self.queries += 1
+            self.linked_queries += bool(link.mentions)
+            self.link_seconds += time.perf_counter() - start
+        return link
+
+    def covers_query(self, link: EntityLink) -> bool:
+        """True when the linked mentions make up the query (its content words)."""
+        return bool(link.mentions) and link.coverage >= self.skip_vector_coverage
+
+    def can_skip_vector(self, link: EntityLink) -> bool:
+        """True when the query is specific enough that linked chunks may replace the vector search."""
+        return self.covers_query(link) and len(link.mentions) >= self.skip_min_entities
+
+    def skip_vector(self, link: EntityLink, linked_hits: RankedList, top_k: int) -> bool:
+        """True when at least `top_k` linked chunks mention every linked entity."""
+        complete = sum(1 for _id, mentions in linked_hits if mentions >= len(link.mentions))
+        if not self.can_skip_vector(link) or complete < top_k:
+            return False
+        with self._stats_lock:
+            self.vector_skips += 1
+        return True
+
+    def linked_chunks(self, driver, link: EntityLink, limit: int,
+                      neo4j_database: Optional[str] = None) -> List[neo4j.Record]:
+        """Chunks of the linked entities as (id, mentions, text, source2) records, most mentions first."""
+        if not link.mentions:
+            return []
+        records, _summary, _keys = driver.execute_query(
+            LINKED_CHUNKS_QUERY,
+            {"mentions": [mention.entity_ids for mention in link.mentions], "limit": limit},
+            database_=neo4j_database,
+            routing_=neo4j.RoutingControl.READ
+        )
+        return records
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "entities": index.entities if index is not None else 0,
+            "patterns": index.patterns if index is not None else 0,
+            "states": len(index.automaton) if index is not None else 0,
+            "graph_version": index.version if index is not None else None,
+            "builds": self.builds,
+            "build_seconds": round(self.build_seconds, 2),
+            "queries": self.queries,
+            "linked_queries": self.linked_queries,
+            "avg_link_us": round(self.link_seconds / self.queries * 1e6, 1) if self.queries else 0.0,
+            "vector_skips": self.vector_skips,
+        }
+
+
+def _load_entities() -> List[Tuple[str, Any, Any]]:
+    from app.rag.neo4j import GuardedDriver, get_shared_driver
+    records, _summary, _keys = GuardedDriver(get_shared_driver()).execute_query(
+        ENTITY_NAMES_QUERY,
+        {"max_chunks": settings.ENTITY_LINK_MAX_CHUNKS_PER_ENTITY},
+        routing_=neo4j.RoutingControl.READ
+    )
+    return [(record["id"], record["name"], record["aliases"]) for record in records]
+
+
+_linker = None
+_linker_lock = threading.Lock()
+
+# Linked-chunk lookups of the vector retriever, run while the calling
+# thread embeds the query and runs the vector search
+_link_executor = ThreadPoolExecutor(max_workers=settings.WORKER_THREADS, thread_name_prefix="entity-link")
+
+
+def get_entity_linker() -> Optional[EntityLinker]:
+    """Return the process-wide entity linker, or None when entity linking is disabled."""
+    global _linker
+    if not settings.ENTITY_LINKING_ENABLED:
+        return None
+    if _linker is None:
+        with _linker_lock:
+            if _linker is None:
+                _linker = EntityLinker(
+                    _load_entities,
+                    min_chars=settings.ENTITY_LINK_MIN_CHARS,
+                    skip_vector_coverage=settings.ENTITY_LINK_SKIP_VECTOR_COVERAGE,
+                    skip_min_entities=settings.ENTITY_LINK_SKIP_MIN_ENTITIES
+                )
+    return _linker
+
+
+def get_entity_linker_metrics() -> Optional[Dict[str, Any]]:
+    """Return entity linker metrics, or None before first use."""
+    return _linker.stats() if _linker is not None else None
+
+
+class EntityLinkedVectorRetriever(CachedVectorRetriever):
+    """
+    CachedVectorRetriever whose hits are fused (RRF) with the chunks of the
+    entities linked in the query. Linked chunks the vector search didn't
+    return carry no score; queries made up of linked entities that enough
+    chunks mention together are answered without the vector search.
+
+    Linked chunks are returned with the `text` and `source2` properties.
+    """
+
+    def get_search_results(self, query_vector=None, query_text=None, top_k: int = 5,
+                           effective_search_ratio: int = 1, filters=None) -> RawSearchResult:
+        linker = get_entity_linker()
+        link = linker.link(query_text) if linker is not None and query_text and not filters else None
+        if link is None or not link.mentions:
+            return super().get_search_results(query_vector, query_text, top_k, effective_search_ratio, filters)
+
+        # The lookup carries the request context (deadline, lane) into its
+        # thread; it runs alongside the vector search unless its result can
+        # make the search unnecessary
+        linked_future = _link_executor.submit(contextvars.copy_context().run, linker.linked_chunks,
+                                              self.driver, link, top_k, self.neo4j_database)
+        result = None
+        if not linker.can_skip_vector(link):
+            result = super().get_search_results(query_vector, query_text, top_k, effective_search_ratio)
+        linked = {
+            record["id"]: (record["mentions"], neo4j.Record({
+                "node": {"text": record["text"], "source2": record["source2"]},
+                "score": None,
+                "elementId": record["id"],
+                "id": record["id"],
+            }.items()))
+            for record in linked_future.result()
+        }
+        linked_hits = [(chunk_id, mentions) for chunk_id, (mentions, _record) in linked.items()]
+        metadata = {"entity_link": link.describe(), "entity_candidates": len(linked_hits)}
+        if result is None and linker.skip_vector(link, linked_hits, top_k):
+            metadata.update(vector_skipped=True, vector_top_score=None)
+            return RawSearchResult(records=[record for _mentions, record in linked.values()][:top_k],
+                                   metadata=metadata)
+
+        if result is None:
+            result = super().get_search_results(query_vector, query_text, top_k, effective_search_ratio)
+        vector = {record["elementId"]: record for record in result.records}
+        fused = reciprocal_rank_fusion(
+            [[(chunk_id, record["score"]) for chunk_id, record in vector.items()], linked_hits],
+            [1.0, settings.ENTITY_LINK_WEIGHT],
+            k=settings.FUSION_RRF_K
+        )[:top_k]
+        metadata.update(result.metadata or {})
+        metadata["vector_skipped"] = False
+        metadata["vector_top_score"] = max((record["score"] for record in result.records
+                                            if record["score"] is not None), default=None)
+        return RawSearchResult(
+            records=[vector[chunk_id] if chunk_id in vector else linked[chunk_id][1] for chunk_id, _score in fused],
+            metadata=metadata
+        )
@@ -0,0 +1,265 @@
+"""
+Client-side hybrid retrieval with rank fusion.
+
+Runs the `text_embeddings` vector query and the `text_embeddings2` fulltext
+query concurrently over the shared driver, fuses the two rankings in Python
+(reciprocal rank fusion or weighted score fusion) and runs the graph
+expansion only for the fused top-k chunks, either with the retrieval query
+or through the per-chunk neighborhood cache, precomputed summaries or the
+in-memory graph snapshot. With an entity linker, the chunks of entities
+named in the query are fused in as a third ranking.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import neo4j
+
+from app.core.config import settings
+from app.rag.hits import format_cypher_record
+from app.rag.neighborhood_cache import EXPANSION_MODES, expand_seed_chunks
+from app.rag.vector_cache import get_vector_cache
+
+try:
+    from neo4j_graphrag.types import RetrieverResult
+except Exception:
+    class RetrieverResult:  # Fallback minimal implementation
+        def __init__(self, items=None, metadata=None):
+            self.items = items or []
+            self.metadata = metadata or {}
+
+VECTOR_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $top_k, $embedding)
+YIELD node, score
+RETURN elementId(node) AS id, score
+"""
+
+FULLTEXT_QUERY = """
+CALL db.index.fulltext.queryNodes($index_name, $query_text, {limit: $top_k})
+YIELD node, score
+RETURN elementId(node) AS id, score
+"""
+
+# Re-binds the fused ids to `node` in fused order so the standard
+# retrieval query (which starts with `WITH node AS chunk`) can follow it
+EXPANSION_PREFIX = """
+UNWIND range(0, size($ids) - 1) AS fused_rank
+MATCH (node) WHERE elementId(node) = $ids[fused_rank]
+WITH node ORDER BY fused_rank
+"""
+
+# One extra thread per search runs the fulltext leg while the calling
+# thread embeds the query and runs the vector leg
+_leg_executor = ThreadPoolExecutor(max_workers=settings.WORKER_THREADS, thread_name_prefix="fusion-leg")
+
+RankedList = List[Tuple[str, float]]
+
+
+def reciprocal_rank_fusion(legs: Sequence[RankedList], weights: Sequence[float], k: int = 60) -> RankedList:
+    """
+    Fuse ranked lists with weighted reciprocal rank fusion.
+
+    Each id scores sum(weight / (k + rank)) over the lists it appears in,
+    with 1-based ranks; raw scores are ignored.
+    """
+    fused: Dict[str, float] = {}
+    for leg, weight in zip(legs, weights):
+        for rank, (node_id, _score) in enumerate(leg, start=1):
+            fused[node_id] = fused.get(node_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_score_fusion(legs: Sequence[RankedList], weights: Sequence[float]) -> RankedList:
+    """
+    Fuse ranked lists by weighted sum of max-normalized scores.
+
+    Scores in each list are divided by that list's top score, matching the
+    normalization of the built-in hybrid query, then weighted and summed.
+    """
+    fused: Dict[str, float] = {}
+    for leg, weight in zip(legs, weights):
+        if not leg:
+            continue
+        max_score = max(score for _id, score in leg) or 1.0
+        for node_id, score in leg:
+            fused[node_id] = fused.get(node_id, 0.0) + weight * score / max_score
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class FusionHybridRetriever:
+    """
+    Hybrid retriever that fuses vector and fulltext rankings client-side.
+
+    Exposes the same `search(query_text=..., top_k=...)` interface as the
+    neo4j_graphrag retrievers and returns a RetrieverResult whose items are
+    formatted by `result_formatter`.
+    
+    The lexical leg uses the Neo4j fulltext index, or `lexical_index` (e.g.
+    an in-process BM25Index) when given. It takes the raw query and applies
+    `fulltext_sanitizer` itself, only where Lucene syntax needs it.
+
+    With `entity_linker` (an EntityLinker), chunks of the entities linked in
+    the query are a third leg, ranked by the number of linked mentions they
+    contain. Queries made up of linked entities ask the vector leg for only
+    top_k candidates, or skip it (and the embedding) when the linker finds
+    enough chunks mentioning all of them.
+    """
+
+    handles_raw_query = True
+
+    def __init__(
+        self,
+        driver: neo4j.Driver,
+        embedder,
+        retrieval_query: str,
+        vector_index_name: str = "text_embeddings",
+        fulltext_index_name: str = "text_embeddings2",
+        method: Optional[str] = None,
+        vector_weight: Optional[float] = None,
+        fulltext_weight: Optional[float] = None,
+        rrf_k: Optional[int] = None,
+        candidates: Optional[int] = None,
+        result_formatter=format_cypher_record,
+        lexical_index=None,
+        fulltext_sanitizer: Optional[Callable[[str], str]] = None,
+        expansion_mode: str = "cypher",
+        neo4j_database: Optional[str] = None,
+        entity_linker=None,
+        entity_weight: Optional[float] = None
+    ):
+        self.driver = driver
+        self.embedder = embedder
+        self.retrieval_query = retrieval_query
+        self.vector_index_name = vector_index_name
+        self.fulltext_index_name = fulltext_index_name
+        self.method = method or settings.FUSION_METHOD
+        self.vector_weight = settings.FUSION_VECTOR_WEIGHT if vector_weight is None else vector_weight
+        self.fulltext_weight = settings.FUSION_FULLTEXT_WEIGHT if fulltext_weight is None else fulltext_weight
+        self.rrf_k = rrf_k or settings.FUSION_RRF_K
+        self.candidates = candidates or settings.FUSION_CANDIDATES
+        self.result_formatter = result_formatter
+        self.lexical_index = lexical_index
+        self.fulltext_sanitizer = fulltext_sanitizer
+        self.expansion_mode = expansion_mode
+        self.neo4j_database = neo4j_database
+        self.entity_linker = entity_linker
+        self.entity_weight = settings.ENTITY_LINK_WEIGHT if entity_weight is None else entity_weight
+        if self.expansion_mode not in EXPANSION_MODES:
+            raise ValueError(f"Invalid graph expansion mode: {self.expansion_mode}")
+        if self.method not in ("rrf", "weighted"):
+            raise ValueError(f"Invalid fusion method: {self.method}")
+
+    def _run(self, query: str, params: dict) -> List[neo4j.Record]:
+        records, _summary, _keys = self.driver.execute_query(
+            query,
+            params,
+            database_=self.neo4j_database,
+            routing_=neo4j.RoutingControl.READ
+        )
+        return records
+
+    def _vector_leg(self, query_text: str, top_k: int, query_vector: Optional[List[float]] = None) -> RankedList:
+        embedding = self.embedder.embed_query(query_text) if query_vector is None else query_vector
+        # Paraphrases of a recent query reuse its ranked ids
+        cache = get_vector_cache()
+        namespace = ("fusion", self.vector_index_name, top_k)
+        hits = cache.get(embedding, namespace) if cache is not None else None
+        if hits is not None:
+            return hits
+        records = self._run(VECTOR_QUERY, {
+            "index_name": self.vector_index_name,
+            "top_k": top_k,
+            "embedding": embedding
+        })
+        hits = [(record["id"], record["score"]) for record in records]
+        if cache is not None:
+            cache.put(embedding, hits, namespace)
+        return hits
+
+    def _fulltext_leg(self, query_text: str, top_k: int) -> RankedList:
+        if self.lexical_index is not None:
+            return self.lexical_index.search(query_text, top_k)
+        if self.fulltext_sanitizer is not None:
+            query_text = self.fulltext_sanitizer(query_text)
+        records = self._run(FULLTEXT_QUERY, {
+            "index_name": self.fulltext_index_name,
+            "top_k": top_k,
+            "query_text": query_text
+        })
+        return [(record["id"], record["score"]) for record in records]
+
+    def _entity_leg(self, link, top_k: int) -> RankedList:
+        records = self.entity_linker.linked_chunks(self.driver, link, top_k, self.neo4j_database)
+        return [(record["id"], record["mentions"]) for record in records]
+
+    def fuse(self, vector_hits: RankedList, fulltext_hits: RankedList, entity_hits: RankedList = ()) -> RankedList:
+        """Fuse the legs with the configured method and weights."""
+        legs = (vector_hits, fulltext_hits, entity_hits)
+        weights = (self.vector_weight, self.fulltext_weight, self.entity_weight)
+        if self.method == "weighted":
+            return weighted_score_fusion(legs, weights)
+        return reciprocal_rank_fusion(legs, weights, k=self.rrf_k)
+
+    def search(self, query_text: str, top_k: int = 5, query_vector: Optional[List[float]] = None,
+               **kwargs) -> RetrieverResult:
+        start = time.perf_counter()
+        candidates = max(self.candidates, top_k)
+
+        # Fulltext needs no embedding, so it starts immediately; the vector leg
+        # (embedding + index query) runs on this thread in parallel. The legs
+        # carry the request context (deadline, lane) into the worker threads
+        fulltext_future = _leg_executor.submit(contextvars.copy_context().run, self._fulltext_leg,
+                                               query_text, candidates)
+        link = self.entity_linker.link(query_text) if self.entity_linker is not None else None
+        entity_future = None
+        entity_hits: RankedList = []
+        vector_hits: RankedList = []
+        vector_skipped = False
+        if link is not None and link.mentions:
+            if self.entity_linker.can_skip_vector(link):
+                # Linked chunks decide whether the vector leg runs at all
+                entity_hits = self._entity_leg(link, candidates)
+                vector_skipped = self.entity_linker.skip_vector(link, entity_hits, top_k)
+            else:
+                entity_future = _leg_executor.submit(contextvars.copy_context().run, self._entity_leg, link, candidates)
+        if not vector_skipped:
+            covered = link is not None and self.entity_linker.covers_query(link)
+            vector_hits = self._vector_leg(query_text, top_k if covered else candidates, query_vector)
+        vector_ms = (time.perf_counter() - start) * 1000
+        fulltext_hits = fulltext_future.result()
+        if entity_future is not None:
+            entity_hits = entity_future.result()
+        legs_ms = (time.perf_counter() - start) * 1000
+
+        fused = self.fuse(vector_hits, fulltext_hits, entity_hits)[:top_k]
+        ids = [node_id for node_id, _score in fused]
+
+        # Graph expansion only for the fused top-k
+        if not ids:
+            records = []
+        elif self.expansion_mode == "cypher":
+            records = self._run(EXPANSION_PREFIX + self.retrieval_query, {"ids": ids})
+        else:
+            records = expand_seed_chunks(self.driver, ids, self.expansion_mode, self.neo4j_database)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        return RetrieverResult(
+            items=[self.result_formatter(record) for record in records],
+            metadata={
+                "__retriever": self.__class__.__name__,
+                "fusion_method": self.method,
+                "expansion_mode": self.expansion_mode,
+                "lexical_backend": "neo4j" if self.lexical_index is None else type(self.lexical_index).__name__,
+                "fused": fused,
+                "vector_candidates": len(vector_hits),
+                "vector_top_score": max((score for _id, score in vector_hits), default=None),
+                "fulltext_candidates": len(fulltext_hits),
+                "entity_link": link.describe() if link is not None else None,
+                "entity_candidates": len(entity_hits),
+                "vector_skipped": vector_skipped,
+                "vector_ms": round(vector_ms, 1),
+                "legs_ms": round(legs_ms, 1),
+                "total_ms": round(total_ms, 1)
+            }
+        )
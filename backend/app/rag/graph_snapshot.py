@@ -0,0 +1,412 @@
+"""
+Read-only in-memory snapshot of the entity graph for chunk expansion.
+
+The graph is exported once to flat NumPy arrays and memory-mapped on load,
+so uvicorn workers on one host share a single copy through the page cache:
+
+    node_ids, node_names              string refs per node
+    adjacency_offsets, adjacency_rels CSR index of each node's relationships
+                                      (both directions, FROM_CHUNK excluded)
+    rel_starts, rel_ends, rel_types,  relationship end nodes, type codes and
+    rel_details                       details string refs
+    chunk_texts, chunk_sources        string refs per Chunk (texts cut to
+                                      MAX_CHUNK_CHARS, all expansion uses)
+    chunk_entity_offsets,             CSR index of the entities linked to
+    chunk_entities                    each chunk by FROM_CHUNK
+    string_offsets, string_data       interned UTF-8 string table (-1 = null)
+
+The expansion engine repeats the `(chunk)<-[:FROM_CHUNK]-()-[:!FROM_CHUNK]-{1,2}()`
+walk of CHUNK_RETRIEVAL_QUERY per seed chunk, stopping once MAX_RELATIONSHIPS
+distinct relationships are found, and optionally expanding at most
+GRAPH_SNAPSHOT_MAX_FANOUT relationships per node. Where a neighborhood has
+more relationships than the cap, which ones are kept depends on storage
+order in Neo4j and on export order here, so only sets of uncapped
+neighborhoods are expected to match exactly.
+
+Chunks that aren't in the snapshot are walked in Neo4j; a snapshot whose
+graph version no longer matches the database is not used. Export with:
+
+    python -m app.rag.graph_snapshot --output /app/data/graph_snapshot
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.graph_version import fetch_graph_version, get_graph_version
+from app.rag.neighborhood_cache import (
+    MAX_CHUNK_CHARS, MAX_CHUNKS, MAX_RELATIONSHIPS, ChunkNeighborhood, combine_neighborhoods, expand_chunks,
+    expansion_record, fetch_neighborhoods
+)
+
+NODES_QUERY = "MATCH (n) RETURN elementId(n) AS id, n.name AS name"
+RELATIONSHIPS_QUERY = """
+MATCH (a)-[r]->(b) WHERE type(r) <> 'FROM_CHUNK'
+RETURN elementId(a) AS start, elementId(b) AS end, type(r) AS type, r.details AS details
+"""
+CHUNKS_QUERY = "MATCH (c:Chunk) RETURN elementId(c) AS id, c.text AS text, c.source2 AS source"
+FROM_CHUNK_QUERY = "MATCH (e)-[:FROM_CHUNK]->(c:Chunk) RETURN elementId(c) AS chunk, elementId(e) AS entity"
+
+_ADJACENCY_BLOCK = 32
+
+
+class _StringTable:
+    """Interns strings while building; null is -1."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        ref = self.index.get(value)
+        if ref is None:
+            ref = self.index[value] = len(self.strings)
+            self.strings.append(value.encode("utf-8"))
+        return ref
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        offsets = np.zeros(len(self.strings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(s) for s in self.strings])
+        return offsets, np.frombuffer(b"".join(self.strings), dtype=np.uint8)
+
+
+def _csr(rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+    values = np.fromiter((value for row in rows for value in row), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, values
+
+
+class GraphSnapshot:
+    """Array-backed entity graph with a chunk expansion engine. Read-only after build."""
+
+    ARRAY_NAMES = (
+        "node_ids", "node_names", "adjacency_offsets", "adjacency_rels",
+        "rel_starts", "rel_ends", "rel_types", "rel_details",
+        "chunk_texts", "chunk_sources", "chunk_entity_offsets", "chunk_entities",
+        "string_offsets", "string_data",
+    )
+
+    def __init__(
+        self,
+        chunk_ids: List[str],
+        type_names: List[str],
+        arrays: Dict[str, np.ndarray],
+        version: Optional[str] = None,
+        max_fanout: Optional[int] = None
+    ):
+        self.chunk_ids = chunk_ids
+        self.type_names = type_names
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.version = version
+        self.max_fanout = settings.GRAPH_SNAPSHOT_MAX_FANOUT if max_fanout is None else max_fanout
+        self._chunk_rows = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+
+    @classmethod
+    def build(
+        cls,
+        nodes: Iterable[Tuple[str, Optional[str]]],
+        relationships: Iterable[Tuple[str, str, str, Optional[str]]],
+        chunks: Iterable[Tuple[str, Optional[str], Optional[str]]],
+        memberships: Iterable[Tuple[str, str]],
+        version: Optional[str] = None,
+        **kwargs
+    ) -> "GraphSnapshot":
+        """
+        Build a snapshot from (node id, name), (start id, end id, type,
+        details), (chunk id, text, source) and (chunk id, entity id) rows.
+        """
+        strings = _StringTable()
+        node_rows: Dict[str, int] = {}
+        node_ids, node_names = [], []
+        for node_id, name in nodes:
+            node_rows[node_id] = len(node_ids)
+            node_ids.append(strings.add(node_id))
+            node_names.append(strings.add(name))
+
+        type_codes: Dict[str, int] = {}
+        adjacency: List[List[int]] = [[] for _ in node_ids]
+        rel_starts, rel_ends, rel_types, rel_details = [], [], [], []
+        for start_id, end_id, rel_type, details in relationships:
+            start, end = node_rows[start_id], node_rows[end_id]
+            rel = len(rel_starts)
+            rel_starts.append(start)
+            rel_ends.append(end)
+            rel_types.append(type_codes.setdefault(rel_type, len(type_codes)))
+            rel_details.append(strings.add(details))
+            adjacency[start].append(rel)
+            if end != start:
+                adjacency[end].append(rel)
+
+        chunk_ids, chunk_texts, chunk_sources = [], [], []
+        chunk_rows: Dict[str, int] = {}
+        for chunk_id, text, source in chunks:
+            chunk_rows[chunk_id] = len(chunk_ids)
+            chunk_ids.append(chunk_id)
+            chunk_texts.append(strings.add(text[:MAX_CHUNK_CHARS] if text is not None else None))
+            chunk_sources.append(strings.add(source))
+        chunk_entities: List[List[int]] = [[] for _ in chunk_ids]
+        for chunk_id, entity_id in memberships:
+            chunk_entities[chunk_rows[chunk_id]].append(node_rows[entity_id])
+
+        adjacency_offsets, adjacency_rels = _csr(adjacency)
+        chunk_entity_offsets, chunk_entity_values = _csr(chunk_entities)
+        string_offsets, string_data = strings.arrays()
+        arrays = {
+            "node_ids": np.asarray(node_ids, dtype=np.int32),
+            "node_names": np.asarray(node_names, dtype=np.int32),
+            "adjacency_offsets": adjacency_offsets,
+            "adjacency_rels": adjacency_rels,
+            "rel_starts": np.asarray(rel_starts, dtype=np.int32),
+            "rel_ends": np.asarray(rel_ends, dtype=np.int32),
+            "rel_types": np.asarray(rel_types, dtype=np.int16),
+            "rel_details": np.asarray(rel_details, dtype=np.int32),
+            "chunk_texts": np.asarray(chunk_texts, dtype=np.int32),
+            "chunk_sources": np.asarray(chunk_sources, dtype=np.int32),
+            "chunk_entity_offsets": chunk_entity_offsets,
+            "chunk_entities": chunk_entity_values,
+            "string_offsets": string_offsets,
+            "string_data": string_data,
+        }
+        type_names = sorted(type_codes, key=type_codes.get)
+        return cls(chunk_ids, type_names, arrays, version=version, **kwargs)
+
+    @classmethod
+    def build_from_graph(cls, driver, database: Optional[str] = None, **kwargs) -> "GraphSnapshot":
+        """Export the whole graph (FROM_CHUNK links as chunk memberships)."""
+        version = fetch_graph_version(driver)
+        with driver.session(database=database) as session:
+            nodes = [(record["id"], record["name"]) for record in session.run(NODES_QUERY)]
+            relationships = [
+                (record["start"], record["end"], record["type"], record["details"])
+                for record in session.run(RELATIONSHIPS_QUERY)
+            ]
+            chunks = [(record["id"], record["text"], record["source"]) for record in session.run(CHUNKS_QUERY)]
+            memberships = [(record["chunk"], record["entity"]) for record in session.run(FROM_CHUNK_QUERY)]
+        return cls.build(nodes, relationships, chunks, memberships, version=version, **kwargs)
+
+    def save(self, path: str):
+        """Save the snapshot as .npy arrays plus a JSON table of chunk ids and relationship types."""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"chunk_ids": self.chunk_ids, "type_names": self.type_names, "version": self.version}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> "GraphSnapshot":
+        """Load a saved snapshot, memory-mapping the arrays by default."""
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in cls.ARRAY_NAMES
+        }
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(meta["chunk_ids"], meta["type_names"], arrays, version=meta["version"], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def string(self, ref: int) -> Optional[str]:
+        if ref < 0:
+            return None
+        start, end = self.string_offsets[ref], self.string_offsets[ref + 1]
+        return self.string_data[start:end].tobytes().decode("utf-8")
+
+    def relationship_text(self, rel: int) -> Optional[str]:
+        """The retrieval query's relationship text (null when either end has no name)."""
+        start_name = self.string(int(self.node_names[self.rel_starts[rel]]))
+        end_name = self.string(int(self.node_names[self.rel_ends[rel]]))
+        if start_name is None or end_name is None:
+            return None
+        details = self.string(int(self.rel_details[rel])) or ""
+        return f"{start_name} - {self.type_names[self.rel_types[rel]]}({details}) -> {end_name}"
+
+    def _adjacent(self, node: int) -> Iterator[int]:
+        start, end = int(self.adjacency_offsets[node]), int(self.adjacency_offsets[node + 1])
+        if self.max_fanout:
+            end = min(end, start + self.max_fanout)
+        # Hubs have thousands of relationships but the walk stops after a
+        # few dozen, so they are read in small blocks
+        for block in range(start, end, _ADJACENCY_BLOCK):
+            yield from self.adjacency_rels[block:min(block + _ADJACENCY_BLOCK, end)].tolist()
+
+    def _walk_into(self, chunk_row: int, rels: Dict[int, None], max_rels: int):
+        start, end = self.chunk_entity_offsets[chunk_row], self.chunk_entity_offsets[chunk_row + 1]
+        for entity in self.chunk_entities[start:end].tolist():
+            for first in self._adjacent(entity):
+                rels.setdefault(first)
+                if len(rels) >= max_rels:
+                    return
+                far = int(self.rel_ends[first]) if self.rel_starts[first] == entity else int(self.rel_starts[first])
+                for second in self._adjacent(far):
+                    if second != first:
+                        rels.setdefault(second)
+                        if len(rels) >= max_rels:
+                            return
+
+    def walk(self, chunk_row: int, max_rels: int = MAX_RELATIONSHIPS) -> List[int]:
+        """Distinct relationships of the chunk's 1-2 hop paths in traversal order, up to max_rels."""
+        rels: Dict[int, None] = {}
+        self._walk_into(chunk_row, rels, max_rels)
+        return list(rels)
+
+    def _has_paths(self, chunk_row: int) -> bool:
+        start, end = self.chunk_entity_offsets[chunk_row], self.chunk_entity_offsets[chunk_row + 1]
+        offsets = self.adjacency_offsets
+        return any(offsets[entity + 1] > offsets[entity] for entity in self.chunk_entities[start:end].tolist())
+
+    def expand(self, ids: Sequence[str]) -> Tuple[List[Any], List[str]]:
+        """
+        Return the CHUNK_RETRIEVAL_QUERY record for seed chunks, or the ids
+        that aren't in the snapshot (and no record) when there are any.
+
+        Like the query, one distinct walk runs over the paths of all seeds,
+        so relationship texts are only built for the relationships kept.
+        """
+        ids = list(dict.fromkeys(ids))
+        missing = [chunk_id for chunk_id in ids if chunk_id not in self._chunk_rows]
+        if missing:
+            return [], missing
+        rows = [self._chunk_rows[chunk_id] for chunk_id in ids]
+        kept = [(chunk_id, row) for chunk_id, row in zip(ids, rows) if self._has_paths(row)][:MAX_CHUNKS]
+        rels: Dict[int, None] = {}
+        for row in rows:
+            if len(rels) >= MAX_RELATIONSHIPS:
+                break
+            self._walk_into(row, rels, MAX_RELATIONSHIPS)
+        texts = [self.relationship_text(rel) for rel in rels]
+        return expansion_record(
+            [(chunk_id, self.string(int(self.chunk_texts[row])), self.string(int(self.chunk_sources[row])))
+             for chunk_id, row in kept],
+            [text for text in texts if text is not None]
+        ), []
+
+    def neighborhoods(self, ids: Sequence[str], max_rels: int = MAX_RELATIONSHIPS
+                      ) -> Tuple[Dict[str, ChunkNeighborhood], List[str]]:
+        """Return the neighborhoods of the chunks in the snapshot and the ids that aren't."""
+        found, missing = {}, []
+        for chunk_id in ids:
+            row = self._chunk_rows.get(chunk_id)
+            if row is None:
+                missing.append(chunk_id)
+                continue
+            found[chunk_id] = ChunkNeighborhood(
+                text=self.string(int(self.chunk_texts[row])),
+                source=self.string(int(self.chunk_sources[row])),
+                relationships=[(str(rel), self.relationship_text(rel)) for rel in self.walk(row, max_rels)]
+            )
+        return found, missing
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "nodes": len(self.node_ids),
+            "relationships": len(self.rel_starts),
+            "chunks": len(self.chunk_ids),
+            "max_fanout": self.max_fanout,
+        }
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_snapshot_loaded = False
+_expansions = {"expansions": 0, "expand_seconds": 0.0, "missing_chunks": 0, "stale_fallbacks": 0}
+_expansions_lock = threading.Lock()
+_stale_warned = False
+
+
+def _count(name: str, amount=1):
+    with _expansions_lock:
+        _expansions[name] += amount
+
+
+def get_graph_snapshot() -> Optional[GraphSnapshot]:
+    """Return the process-wide graph snapshot from GRAPH_SNAPSHOT_PATH, or None when there is none."""
+    global _snapshot, _snapshot_loaded
+    if _snapshot_loaded:
+        return _snapshot
+    with _snapshot_lock:
+        if _snapshot_loaded:
+            return _snapshot
+        path = settings.GRAPH_SNAPSHOT_PATH
+        try:
+            if path and os.path.exists(os.path.join(path, "meta.json")):
+                _snapshot = GraphSnapshot.load(path)
+                print(f"Loaded graph snapshot with {len(_snapshot.node_ids)} nodes, "
+                      f"{len(_snapshot.rel_starts)} relationships and {len(_snapshot)} chunks from {path}")
+            else:
+                print("No graph snapshot found; expanding chunks through Neo4j")
+        except Exception as e:
+            print(f"Error loading graph snapshot: {e}")
+            _snapshot = None
+        _snapshot_loaded = True
+    return _snapshot
+
+
+def get_graph_snapshot_metrics() -> Optional[Dict[str, Any]]:
+    """Return snapshot size and expansion counters, or None when no snapshot is loaded."""
+    if _snapshot is None:
+        return None
+    expansions = _expansions["expansions"]
+    return {
+        **_snapshot.stats(),
+        "expansions": expansions,
+        "avg_expand_us": round(_expansions["expand_seconds"] / expansions * 1e6, 1) if expansions else 0.0,
+        "missing_chunks": _expansions["missing_chunks"],
+        "stale_fallbacks": _expansions["stale_fallbacks"],
+    }
+
+
+def expand_from_snapshot(driver, ids: Sequence[str], neo4j_database: Optional[str] = None):
+    """
+    Expand seed chunks into the CHUNK_RETRIEVAL_QUERY record from the graph
+    snapshot, walking chunks it doesn't have in Neo4j. Without a current
+    snapshot, falls back to the neighborhood cache.
+    """
+    global _stale_warned
+    snapshot = get_graph_snapshot()
+    if snapshot is None:
+        return expand_chunks(driver, ids, neo4j_database=neo4j_database)
+    current = get_graph_version()
+    if current is not None and snapshot.version is not None and current != snapshot.version:
+        if not _stale_warned:
+            print(f"Graph snapshot is stale (snapshot {snapshot.version}, graph {current}); using Neo4j")
+            _stale_warned = True
+        _count("stale_fallbacks")
+        return expand_chunks(driver, ids, neo4j_database=neo4j_database)
+
+    start = time.perf_counter()
+    records, missing = snapshot.expand(ids)
+    _count("expansions")
+    _count("expand_seconds", time.perf_counter() - start)
+    if not missing:
+        return records
+    # Chunks added since the export: combine per-chunk neighborhoods instead
+    _count("missing_chunks", len(missing))
+    ids = list(dict.fromkeys(ids))
+    neighborhoods, missing = snapshot.neighborhoods(ids)
+    neighborhoods.update(fetch_neighborhoods(driver, missing, neo4j_database))
+    return combine_neighborhoods(ids, neighborhoods)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.rag.neo4j import get_shared_driver, close_shared_driver
+
+    parser = argparse.ArgumentParser(description="Export the entity graph as a memory-mappable snapshot")
+    parser.add_argument("--output", default=settings.GRAPH_SNAPSHOT_PATH, required=not settings.GRAPH_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    snapshot = GraphSnapshot.build_from_graph(get_shared_driver())
+    snapshot.save(args.output)
+    print(f"Saved graph snapshot (version {snapshot.version}) with {len(snapshot.node_ids)} nodes, "
+          f"{len(snapshot.rel_starts)} relationships and {len(snapshot)} chunks to {args.output}")
+    close_shared_driver()
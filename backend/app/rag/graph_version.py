@@ -0,0 +1,70 @@
+"""
+Graph version used to invalidate caches derived from the knowledge graph.
+
+The version combines the highest `version` of any (:GraphVersion) node
+(bump it from ingestion scripts after loading or editing data) with the
+Chunk count, so loads that don't maintain a GraphVersion node are still
+detected. It is polled at most every GRAPH_VERSION_CHECK_SECONDS per
+process; only one thread polls, the others keep using the last value.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+GRAPH_VERSION_QUERY = """
+OPTIONAL MATCH (v:GraphVersion)
+WITH max(v.version) AS version
+OPTIONAL MATCH (c:Chunk)
+RETURN version, count(c) AS chunks
+"""
+
+
+class GraphVersionTracker:
+    def __init__(self, fetch: Callable[[], str], check_interval: float):
+        self.fetch = fetch
+        self.check_interval = check_interval
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._poll_lock = threading.Lock()
+        self.changes = 0
+
+    def current(self) -> Optional[str]:
+        """Return the graph version, refreshing it when a check is due (None until known)."""
+        if time.monotonic() - self._checked_at >= self.check_interval and self._poll_lock.acquire(blocking=False):
+            try:
+                version = self.fetch()
+                if self._version is not None and version != self._version:
+                    self.changes += 1
+                    print(f"Graph version changed: {self._version} -> {version}")
+                self._version = version
+            except Exception as e:
+                # Keep serving the last known version
+                print(f"Error checking graph version: {e}")
+            finally:
+                self._checked_at = time.monotonic()
+                self._poll_lock.release()
+        return self._version
+
+
+def fetch_graph_version(driver) -> str:
+    """Read the graph version from the database."""
+    records, _summary, _keys = driver.execute_query(GRAPH_VERSION_QUERY)
+    record = records[0] if records else None
+    version = record["version"] if record is not None else None
+    chunks = record["chunks"] if record is not None else 0
+    return f"{version}:{chunks}"
+
+
+def _fetch_graph_version() -> str:
+    from app.rag.neo4j import GuardedDriver, get_shared_driver
+    return fetch_graph_version(GuardedDriver(get_shared_driver()))
+
+
+_tracker = GraphVersionTracker(_fetch_graph_version, settings.GRAPH_VERSION_CHECK_SECONDS)
+
+
+def get_graph_version() -> Optional[str]:
+    """Return the current graph version (None until the first successful check)."""
+    return _tracker.current()
@@ -0,0 +1,129 @@
+"""
+Structured retrieval hits.
+
+Retriever records are parsed once into RetrievalHit objects, which then feed
+the LLM context, QueryResult sources, the RAG Assistant format and the UI
+formatter directly, without serializing back to strings and re-parsing.
+"""
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+import neo4j
+
+try:
+    from neo4j_graphrag.types import RetrieverResultItem
+except Exception:
+    RetrieverResultItem = None
+
+# Separator used by the Cypher retrieval query when concatenating values
+CYPHER_JOIN_SEPARATOR = "\n---\n"
+
+
+@dataclass
+class RetrievalHit:
+    """A single retrieved chunk with its source document."""
+    source_path: str
+    text: str
+    score: Optional[float] = None
+    relationships: List[str] = field(default_factory=list)
+    chunk_id: Optional[str] = None  # Neo4j element id, when the query returns it
+
+    @property
+    def title(self) -> str:
+        """Basename of the source path (handles both / and \\ separators)."""
+        return self.source_path.split("/")[-1].split("\\")[-1]
+
+
+def split_joined(value: Optional[str]) -> List[str]:
+    """Split a string concatenated by the Cypher query with CYPHER_JOIN_SEPARATOR."""
+    if not value:
+        return []
+    return value.split(CYPHER_JOIN_SEPARATOR)
+
+
+def format_vector_record(record) -> "RetrieverResultItem":
+    """
+    VectorRetriever result formatter.
+
+    Keeps the default content string (used verbatim as LLM context) and adds
+    the structured hit to the item metadata.
+    """
+    node = record.get("node") or {}
+    hit = RetrievalHit(
+        source_path=node.get("source2") or "",
+        text=node.get("text") or "",
+        score=record.get("score"),
+        chunk_id=record.get("elementId"),
+    )
+    return RetrieverResultItem(
+        content=str(node),
+        metadata={"score": record.get("score"), "hits": [hit]},
+    )
+
+
+def format_cypher_record(record) -> "RetrieverResultItem":
+    """
+    VectorCypher/HybridCypher result formatter for the chunk retrieval query.
+
+    Keeps the default content string (without the chunk ids) and pairs each
+    chunk source with its chunk text, and id when returned, as structured
+    hits in the item metadata.
+    """
+    chunk_texts = split_joined(record.get("truncated_chunk_texts"))
+    chunk_sources = split_joined(record.get("chunk_sources"))
+    relationships = split_joined(record.get("truncated_relationship_texts"))
+    chunk_ids = list(record.get("chunk_ids") or [])
+    if len(chunk_ids) != len(chunk_texts) or len(chunk_ids) != len(chunk_sources):
+        # Null texts or sources were skipped, so ids can't be paired safely
+        chunk_ids = [None] * len(chunk_texts)
+    hits = [
+        RetrievalHit(source_path=source.strip(), text=text.strip(), relationships=relationships, chunk_id=chunk_id)
+        for source, text, chunk_id in zip(chunk_sources, chunk_texts, chunk_ids)
+    ]
+    if "chunk_ids" in record.keys():
+        record = neo4j.Record((key, value) for key, value in record.items() if key != "chunk_ids")
+    return RetrieverResultItem(
+        content=str(record),
+        metadata={"hits": hits},
+    )
+
+
+def format_cypher_hits(hits: List[RetrievalHit], relationships: List[str]) -> "RetrieverResultItem":
+    """
+    The item format_cypher_record would build for a record of just these
+    chunks and relationships (e.g. what is left after de-duplication).
+    """
+    record = neo4j.Record({
+        "truncated_chunk_texts": CYPHER_JOIN_SEPARATOR.join(hit.text for hit in hits),
+        "chunk_sources": CYPHER_JOIN_SEPARATOR.join(hit.source_path for hit in hits),
+        "truncated_relationship_texts": CYPHER_JOIN_SEPARATOR.join(relationships),
+    }.items())
+    hits = [replace(hit, relationships=list(relationships)) for hit in hits]
+    return RetrieverResultItem(content=str(record), metadata={"hits": hits})
+
+
+def hits_from_items(items: List[Any]) -> List[RetrievalHit]:
+    """Collect the structured hits attached to retriever result items."""
+    hits = []
+    for item in items:
+        metadata = getattr(item, "metadata", None) or {}
+        hits.extend(metadata.get("hits", []))
+    return hits
+
+
+def unique_source_hits(hits: List[RetrievalHit]) -> List[RetrievalHit]:
+    """
+    Keep the first hit per source path, preserving retrieval order.
+
+    A later hit only fills in text if the first hit for that source had none.
+    """
+    by_path: Dict[str, RetrievalHit] = {}
+    for hit in hits:
+        if not hit.source_path:
+            continue
+        existing = by_path.get(hit.source_path)
+        if existing is None:
+            by_path[hit.source_path] = hit
+        elif not existing.text and hit.text:
+            by_path[hit.source_path] = hit
+    return list(by_path.values())
@@ -0,0 +1,323 @@
+"""
+LLM gateway: hedged chat completions with ordered failover across endpoints.
+
+The primary endpoint is OPENAI_API_KEY / LLM_MODEL (optionally at
+LLM_BASE_URL); LLM_FALLBACK_ENDPOINTS adds OpenAI-compatible or Azure
+deployments, or smaller models, tried in order. Each endpoint has its own
+scheduler and circuit breaker ("chat", "chat:<name>").
+
+- Failover: when an endpoint fails (retries exhausted, breaker open), the
+  next one is tried. The request deadline is never extended.
+- Hedging: when the primary hasn't answered after its recent p95 latency,
+  one duplicate request is sent to it and the first answer wins. Hedges
+  are limited by a budget (LLM_HEDGE_BUDGET_RATIO of requests) and skipped
+  while the endpoint's scheduler is queueing. The losing request can't be
+  cancelled mid-flight and is still billed, which is what the budget bounds.
+
+Each completion logs the prompt tokens the provider served from its prompt
+cache (`usage.prompt_tokens_details.cached_tokens`); totals and latency
+with and without a cache hit are reported per endpoint.
+"""
+import collections
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from openai import AzureOpenAI, OpenAI
+
+from app.core.circuit_breaker import DependencyUnavailableError
+from app.core.config import settings
+from app.core.deadline import check_deadline, remaining_timeout
+from app.rag.scheduler import LLMUnavailableError, OpenAIScheduler, get_scheduler
+
+# Errors after which the next endpoint is tried
+FAILOVER_ERRORS = (LLMUnavailableError, DependencyUnavailableError)
+
+
+class LLMEndpoint:
+    """One chat deployment: a client, a default model and the scheduler that rate limits it."""
+
+    def __init__(self, name: str, model: str, client, scheduler: OpenAIScheduler, latency_window: int = 200):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.scheduler = scheduler
+        self.latency_window = latency_window
+        self._latencies: Dict[str, "collections.deque[float]"] = {}  # per model
+        self.requests = 0
+        self.failures = 0
+        self._cache = {"prompt_tokens": 0, "cached_tokens": 0, "hits": 0, "hit_latency": 0.0,
+                       "misses": 0, "miss_latency": 0.0}
+
+    def _record_usage(self, response, model: str, latency: float):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if not isinstance(prompt_tokens, int):
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        cache = self._cache
+        cache["prompt_tokens"] += prompt_tokens
+        cache["cached_tokens"] += cached_tokens
+        if cached_tokens:
+            cache["hits"] += 1
+            cache["hit_latency"] += latency
+        else:
+            cache["misses"] += 1
+            cache["miss_latency"] += latency
+        print(f"🧾 LLM {self.name}/{model}: {cached_tokens}/{prompt_tokens} prompt tokens cached, "
+              f"{latency * 1000:.0f} ms")
+
+    def complete(self, messages: List[Dict[str, str]], temperature: float, estimated_tokens: int,
+                 model: Optional[str] = None):
+        model = model or self.model
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            response = self.scheduler.run(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=remaining_timeout(settings.OPENAI_TIMEOUT_SECONDS)
+                ),
+                estimated_tokens=estimated_tokens
+            )
+        except BaseException:
+            self.failures += 1
+            raise
+        latency = time.perf_counter() - start
+        latencies = self._latencies.get(model)
+        if latencies is None:
+            latencies = self._latencies.setdefault(model, collections.deque(maxlen=self.latency_window))
+        latencies.append(latency)
+        self._record_usage(response, model, latency)
+        return response
+
+    def latency_samples(self, model: Optional[str] = None) -> int:
+        return len(self._latencies.get(model or self.model, ()))
+
+    def latency_percentile(self, percentile: float, model: Optional[str] = None) -> Optional[float]:
+        """Latency percentile of a model over recent successful calls (None without samples)."""
+        latencies = sorted(self._latencies.get(model or self.model, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for model in list(self._latencies):
+            p50 = self.latency_percentile(50, model)
+            p95 = self.latency_percentile(95, model)
+            models[model] = {
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
+        cache = self._cache
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency": models,
+            "prompt_cache": {
+                "prompt_tokens": cache["prompt_tokens"],
+                "cached_tokens": cache["cached_tokens"],
+                "cached_ratio": round(cache["cached_tokens"] / cache["prompt_tokens"], 3) if cache["prompt_tokens"] else 0.0,
+                "hit_requests": cache["hits"],
+                "avg_hit_latency_ms": round(cache["hit_latency"] / cache["hits"] * 1000, 1) if cache["hits"] else None,
+                "avg_miss_latency_ms": round(cache["miss_latency"] / cache["misses"] * 1000, 1) if cache["misses"] else None,
+            },
+        }
+
+
+class LLMGateway:
+    """Chat completions over an ordered list of endpoints with hedging and failover."""
+
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        hedging: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_delay: Optional[float] = None,
+        hedge_initial_delay: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        hedge_budget_ratio: Optional[float] = None,
+        max_workers: Optional[int] = None
+    ):
+        if not endpoints:
+            raise ValueError("LLMGateway needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedging = settings.LLM_HEDGING if hedging is None else hedging
+        self.hedge_percentile = settings.LLM_HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        self.hedge_min_delay = settings.LLM_HEDGE_MIN_DELAY_SECONDS if hedge_min_delay is None else hedge_min_delay
+        self.hedge_initial_delay = settings.LLM_HEDGE_INITIAL_DELAY_SECONDS if hedge_initial_delay is None else hedge_initial_delay
+        self.hedge_min_samples = settings.LLM_HEDGE_MIN_SAMPLES if hedge_min_samples is None else hedge_min_samples
+        self.hedge_budget_ratio = settings.LLM_HEDGE_BUDGET_RATIO if hedge_budget_ratio is None else hedge_budget_ratio
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.LLM_GATEWAY_MAX_WORKERS,
+            thread_name_prefix="llm-gateway"
+        )
+        self._lock = threading.Lock()
+        # Each request earns `hedge_budget_ratio` of a hedge, capped so an
+        # idle period can't bank a burst of hedges
+        self._hedge_credits = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.failovers = 0
+
+    def hedge_delay(self, model: Optional[str] = None) -> float:
+        """Seconds to wait for the primary (serving `model`) before hedging."""
+        primary = self.endpoints[0]
+        if primary.latency_samples(model) < self.hedge_min_samples:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, primary.latency_percentile(self.hedge_percentile, model))
+
+    def _take_hedge_credit(self) -> bool:
+        with self._lock:
+            if self._hedge_credits >= 1.0 and not self.endpoints[0].scheduler.saturated:
+                self._hedge_credits -= 1.0
+                self.hedges += 1
+                return True
+            self.hedges_skipped += 1
+            return False
+
+    def _submit(self, endpoint: LLMEndpoint, messages, temperature, estimated_tokens, model=None):
+        # Carry the request deadline and priority lane into the worker thread
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, endpoint.complete, messages, temperature, estimated_tokens, model)
+
+    def complete(self, messages: List[Dict[str, str]], temperature: float = 0.0, estimated_tokens: int = 1,
+                 model: Optional[str] = None):
+        """
+        Return the first successful chat completion.
+
+        Args:
+            model: Model for the primary endpoint (and its hedge) instead of
+                its default; fallback endpoints always use their own model
+
+        Raises:
+            LLMUnavailableError / DependencyUnavailableError: every endpoint failed
+            DeadlineExceeded: the request deadline passed first
+        """
+        with self._lock:
+            self.requests += 1
+            self._hedge_credits = min(10.0, self._hedge_credits + self.hedge_budget_ratio)
+
+        next_endpoint = 1
+        pending = {self._submit(self.endpoints[0], messages, temperature, estimated_tokens, model): "primary"}
+        hedge_at = time.monotonic() + self.hedge_delay(model) if self.hedging else None
+        last_error = None
+
+        while pending:
+            timeout = remaining_timeout()
+            if hedge_at is not None:
+                until_hedge = max(0.0, hedge_at - time.monotonic())
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if "primary" in pending.values() and self._take_hedge_credit():
+                        print(f"LLM primary slower than {self.hedge_delay(model):.2f}s, sending hedge request")
+                        pending[self._submit(self.endpoints[0], messages, temperature, estimated_tokens, model)] = "hedge"
+                    continue
+                check_deadline("LLM completion")
+                continue
+
+            for future in done:
+                role = pending.pop(future)
+                try:
+                    response = future.result()
+                except FAILOVER_ERRORS as e:
+                    last_error = e
+                    print(f"LLM {role} request failed: {e}")
+                    continue
+                if role == "hedge":
+                    self.hedge_wins += 1
+                return response
+
+            if not pending:
+                # Everything in flight failed: fail over to the next endpoint
+                hedge_at = None
+                if next_endpoint >= len(self.endpoints):
+                    break
+                endpoint = self.endpoints[next_endpoint]
+                next_endpoint += 1
+                check_deadline(f"LLM failover to {endpoint.name}")
+                self.failovers += 1
+                print(f"LLM failing over to endpoint '{endpoint.name}' ({endpoint.model})")
+                pending[self._submit(endpoint, messages, temperature, estimated_tokens)] = endpoint.name
+
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hedging/failover counters and per-endpoint latency for metrics endpoints."""
+        return {
+            "requests": self.requests,
+            "hedging": self.hedging,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "failovers": self.failovers,
+            "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
+
+
+def _endpoint_from_config(config: Dict[str, Any]) -> LLMEndpoint:
+    name = config["name"]
+    api_key = os.environ.get(config["api_key_env"], "") if config.get("api_key_env") else settings.OPENAI_API_KEY
+    # Retries and backoff are handled by the scheduler
+    if config.get("azure_endpoint"):
+        client = AzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=config["azure_endpoint"],
+            api_version=config.get("api_version"),
+            max_retries=0
+        )
+    else:
+        client = OpenAI(api_key=api_key, base_url=config.get("base_url") or None, max_retries=0)
+    return LLMEndpoint(name, config["model"], client, get_scheduler(f"chat:{name}"))
+
+
+def build_endpoints() -> List[LLMEndpoint]:
+    """Primary endpoint from OPENAI_API_KEY / LLM_MODEL, then LLM_FALLBACK_ENDPOINTS in order."""
+    primary = LLMEndpoint(
+        "primary",
+        settings.LLM_MODEL,
+        OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.LLM_BASE_URL or None, max_retries=0),
+        get_scheduler("chat")
+    )
+    endpoints = [primary]
+    if settings.LLM_FALLBACK_ENDPOINTS:
+        for config in json.loads(settings.LLM_FALLBACK_ENDPOINTS):
+            endpoints.append(_endpoint_from_config(config))
+    return endpoints
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Return the process-wide LLM gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                endpoints = build_endpoints()
+                print(f"LLM gateway endpoints: {', '.join(f'{e.name} ({e.model})' for e in endpoints)}")
+                _gateway = LLMGateway(endpoints)
+    return _gateway
+
+
+def get_llm_gateway_metrics() -> Optional[Dict[str, Any]]:
+    """Return gateway metrics, or None before the first completion."""
+    return _gateway.stats() if _gateway is not None else None
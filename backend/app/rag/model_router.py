@@ -0,0 +1,175 @@
+"""
+Model cascade for the generation stage.
+
+Each answer is routed to a model tier from three signals known before
+generation: the query class (definition / lookup / complex), the size of
+the retrieved context and retrieval confidence (top vector similarity).
+Only questions that are simple on all three go to the fast tier
+(LLM_FAST_MODEL); everything else keeps LLM_MODEL. With escalation, a fast
+answer that says the context doesn't cover the question is regenerated
+on the strong tier, so a wrong routing costs latency, not quality.
+"""
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.rag.scheduler import estimate_tokens
+
+FAST = "fast"
+STRONG = "strong"
+
+# Questions that need synthesis or carry clinical risk always use the strong tier
+_COMPLEX_PATTERN = re.compile(
+    r"\b(compare|comparison|differen\w*|versus|vs\.?|why|explain|how (do|does|did|should|can|would)|"
+    r"should|recommend\w*|best|risk\w*|interact\w*|contraindicat\w*|dos(e|es|age|ing)|pregnan\w*|"
+    r"pediatric|child\w*|side effects?|prognosis|manag\w*|treat\w*|diagnos\w*)\b",
+    re.IGNORECASE
+)
+_DEFINITION_PATTERN = re.compile(
+    r"^\s*(what\s+(is|are|was)\b|what's\b|define\b|definition of\b|meaning of\b|"
+    r"what does .+ (mean|stand for)\b)",
+    re.IGNORECASE
+)
+_LOOKUP_PATTERN = re.compile(r"^\s*(who|when|where|which|list|name)\b", re.IGNORECASE)
+
+# Answers that say the context doesn't support an answer
+_LOW_CONFIDENCE_PATTERN = re.compile(
+    r"(not (mentioned|provided|specified|included|covered|stated)|does not (mention|provide|contain|"
+    r"specify|include|say)|no (information|mention)|not enough (information|context)|"
+    r"(cannot|can't|unable to) (answer|determine|find)|i don't know)",
+    re.IGNORECASE
+)
+
+MAX_SIMPLE_QUERY_WORDS = 20
+
+
+def classify_query(query: str) -> str:
+    """Classify a question as "definition", "lookup" or "complex"."""
+    if len(query.split()) > MAX_SIMPLE_QUERY_WORDS or query.count("?") > 1 or _COMPLEX_PATTERN.search(query):
+        return "complex"
+    if _DEFINITION_PATTERN.search(query):
+        return "definition"
+    if _LOOKUP_PATTERN.search(query):
+        return "lookup"
+    return "complex"
+
+
+def top_similarity(retriever_results) -> Optional[float]:
+    """Top vector similarity of a retrieval, when the retriever reports scores."""
+    metadata = getattr(retriever_results, "metadata", None) or {}
+    if metadata.get("vector_top_score") is not None:
+        return float(metadata["vector_top_score"])
+    scores = [
+        (getattr(item, "metadata", None) or {}).get("score")
+        for item in getattr(retriever_results, "items", None) or []
+    ]
+    scores = [score for score in scores if score is not None]
+    return float(max(scores)) if scores else None
+
+
+def needs_escalation(answer: str) -> bool:
+    """True when a fast-tier answer is empty or says the context doesn't answer the question."""
+    return not answer.strip() or bool(_LOW_CONFIDENCE_PATTERN.search(answer))
+
+
+@dataclass
+class RoutingDecision:
+    tier: str
+    model: str
+    query_class: str
+    context_tokens: int
+    top_score: Optional[float]
+    reasons: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        score = f"{self.top_score:.3f}" if self.top_score is not None else "n/a"
+        return (f"tier={self.tier} model={self.model} class={self.query_class} "
+                f"context_tokens={self.context_tokens} top_score={score} ({'; '.join(self.reasons)})")
+
+
+class ModelRouter:
+    """Pick a model tier per question and keep per-tier latency counters."""
+
+    def __init__(
+        self,
+        fast_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        max_fast_context_tokens: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        escalate: Optional[bool] = None
+    ):
+        self.fast_model = fast_model or settings.LLM_FAST_MODEL
+        self.strong_model = strong_model or settings.LLM_MODEL
+        self.enabled = settings.LLM_ROUTER_ENABLED if enabled is None else enabled
+        self.max_fast_context_tokens = (settings.LLM_ROUTER_MAX_FAST_CONTEXT_TOKENS
+                                        if max_fast_context_tokens is None else max_fast_context_tokens)
+        self.min_confidence = settings.LLM_ROUTER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.escalate = settings.LLM_ROUTER_ESCALATE if escalate is None else escalate
+        self._lock = threading.Lock()
+        self._tiers = {tier: {"requests": 0, "latency_total": 0.0} for tier in (FAST, STRONG)}
+        self.escalations = 0
+
+    def route(self, query: str, context: str, top_score: Optional[float]) -> RoutingDecision:
+        query_class = classify_query(query)
+        context_tokens = estimate_tokens(context)
+        reasons = []
+        if not self.enabled:
+            reasons.append("router disabled")
+        if query_class == "complex":
+            reasons.append("complex question")
+        if context_tokens > self.max_fast_context_tokens:
+            reasons.append(f"context over {self.max_fast_context_tokens} tokens")
+        if top_score is None:
+            reasons.append("no retrieval score")
+        elif top_score < self.min_confidence:
+            reasons.append(f"top score under {self.min_confidence}")
+
+        if reasons:
+            return RoutingDecision(STRONG, self.strong_model, query_class, context_tokens, top_score, reasons)
+        return RoutingDecision(FAST, self.fast_model, query_class, context_tokens, top_score, ["simple question"])
+
+    def record(self, tier: str, latency: float, escalated: bool = False):
+        with self._lock:
+            self._tiers[tier]["requests"] += 1
+            self._tiers[tier]["latency_total"] += latency
+            if escalated:
+                self.escalations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-tier request counts, average latency and escalations for metrics endpoints."""
+        tiers = {}
+        for tier, counters in self._tiers.items():
+            requests = counters["requests"]
+            tiers[tier] = {
+                "requests": requests,
+                "avg_latency_ms": round(counters["latency_total"] / requests * 1000, 1) if requests else 0.0,
+            }
+        return {
+            "enabled": self.enabled,
+            "fast_model": self.fast_model,
+            "strong_model": self.strong_model,
+            "tiers": tiers,
+            "escalations": self.escalations,
+        }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def get_model_router_metrics() -> Optional[Dict[str, Any]]:
+    """Return router metrics, or None before the first routed answer."""
+    return _router.stats() if _router is not None else None
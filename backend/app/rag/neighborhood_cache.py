@@ -0,0 +1,267 @@
+"""
+Per-chunk graph neighborhood cache for the chunk expansion query.
+
+CHUNK_RETRIEVAL_QUERY re-walks
+`(chunk)<-[:FROM_CHUNK]-()-[rel:!FROM_CHUNK]-{1,2}()` for every seed chunk of
+every query, although the same popular chunks are seeds again and again.
+Here the walk is done per chunk and cached: a chunk's neighborhood (its
+text, source and relationship texts) is looked up by element id, and only
+the missing ids are sent to Neo4j in one `UNWIND $ids` query. The cached
+neighborhoods are then combined into the same single record the Cypher
+expansion returns, so `format_cypher_record` consumes either.
+
+The cache is an LRU bounded by entries and approximate bytes, and is
+dropped when the graph version changes.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import neo4j
+
+from app.core.config import settings
+from app.rag.graph_version import get_graph_version
+from app.rag.hits import CYPHER_JOIN_SEPARATOR
+
+# Limits of CHUNK_RETRIEVAL_QUERY
+MAX_CHUNKS = 10
+MAX_RELATIONSHIPS = 20
+MAX_CHUNK_CHARS = 1000
+
+# A chunk's distinct relationships as [element id, text] pairs, in the
+# traversal order of CHUNK_RETRIEVAL_QUERY. Capped per chunk at the
+# query-wide limit, since no more than that can be used.
+NEIGHBORHOOD_RELS = """COLLECT {
+    MATCH (chunk)<-[:FROM_CHUNK]-()-[relList:!FROM_CHUNK]-{1,2}()
+    UNWIND relList AS rel
+    WITH DISTINCT rel
+    LIMIT $max_rels
+    RETURN [elementId(rel), startNode(rel).name + ' - ' + type(rel) + '(' + coalesce(rel.details, '') + ')' + ' -> ' + endNode(rel).name]
+}"""
+
+# One row per requested chunk
+NEIGHBORHOOD_QUERY = f"""
+UNWIND $ids AS id
+MATCH (chunk) WHERE elementId(chunk) = id
+RETURN id, chunk.text AS text, chunk.source2 AS source, {NEIGHBORHOOD_RELS} AS rels
+"""
+
+EXPANSION_MODES = ("cypher", "cached", "precomputed", "snapshot")
+
+
+@dataclass
+class ChunkNeighborhood:
+    text: Optional[str]
+    source: Optional[str]
+    relationships: List[Tuple[str, Optional[str]]]  # (relationship element id, text)
+
+    def size(self) -> int:
+        """Approximate memory footprint in bytes."""
+        return (200 + len(self.text or "") + len(self.source or "")
+                + sum(100 + len(rel_id) + len(text or "") for rel_id, text in self.relationships))
+
+
+class NeighborhoodCache:
+    """LRU cache of chunk neighborhoods bounded by entries and bytes. Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = 20000,
+        max_bytes: int = 64 * 1024 * 1024,
+        version_source: Optional[Callable[[], Optional[str]]] = get_graph_version
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_source = version_source
+        self._entries: "OrderedDict[str, Tuple[ChunkNeighborhood, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: Optional[str]):
+        # Called with the lock held
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                print(f"Neighborhood cache invalidated (graph version {self._version} -> {version})")
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get_many(self, ids: Sequence[str]) -> Tuple[Dict[str, ChunkNeighborhood], List[str]]:
+        """Return the cached neighborhoods and the ids that are missing."""
+        version = self.version_source() if self.version_source is not None else None
+        found, missing = {}, []
+        with self._lock:
+            self._check_version(version)
+            for chunk_id in ids:
+                entry = self._entries.get(chunk_id)
+                if entry is None:
+                    missing.append(chunk_id)
+                    continue
+                self._entries.move_to_end(chunk_id)
+                found[chunk_id] = entry[0]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, neighborhoods: Dict[str, ChunkNeighborhood]):
+        version = self.version_source() if self.version_source is not None else None
+        with self._lock:
+            self._check_version(version)
+            for chunk_id, neighborhood in neighborhoods.items():
+                size = neighborhood.size()
+                previous = self._entries.pop(chunk_id, None)
+                if previous is not None:
+                    self._bytes -= previous[1]
+                self._entries[chunk_id] = (neighborhood, size)
+                self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _chunk_id, (_neighborhood, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters (per chunk id) for metrics endpoints."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "graph_version": self._version,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_neighborhood_cache() -> NeighborhoodCache:
+    """Return the process-wide neighborhood cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NeighborhoodCache(
+                    max_entries=settings.NEIGHBORHOOD_CACHE_MAX_ENTRIES,
+                    max_bytes=int(settings.NEIGHBORHOOD_CACHE_MAX_MB * 1024 * 1024)
+                )
+    return _cache
+
+
+def get_neighborhood_cache_metrics() -> Optional[Dict[str, Any]]:
+    """Return neighborhood cache metrics, or None before first use."""
+    return _cache.stats() if _cache is not None else None
+
+
+def fetch_neighborhoods(driver, ids: Sequence[str], neo4j_database: Optional[str] = None,
+                        max_rels: int = MAX_RELATIONSHIPS) -> Dict[str, ChunkNeighborhood]:
+    """Walk the neighborhoods of the given chunks in one query."""
+    records, _summary, _keys = driver.execute_query(
+        NEIGHBORHOOD_QUERY,
+        {"ids": list(ids), "max_rels": max_rels},
+        database_=neo4j_database,
+        routing_=neo4j.RoutingControl.READ
+    )
+    return {
+        record["id"]: ChunkNeighborhood(
+            text=record["text"],
+            source=record["source"],
+            relationships=[(rel_id, text) for rel_id, text in record["rels"]]
+        )
+        for record in records
+    }
+
+
+def _join(values: Sequence[str]) -> str:
+    return CYPHER_JOIN_SEPARATOR.join(values)
+
+
+def combine_neighborhoods(ids: Sequence[str], neighborhoods: Dict[str, ChunkNeighborhood]) -> List[neo4j.Record]:
+    """
+    Build the CHUNK_RETRIEVAL_QUERY record for seed chunks in seed order.
+
+    As in the Cypher query, chunks without relationships are left out, at
+    most MAX_CHUNKS chunks and MAX_RELATIONSHIPS distinct relationships are
+    kept, and there is no record when no seed has a neighborhood.
+    """
+    chunks: List[Tuple[str, ChunkNeighborhood]] = []
+    rel_texts: List[str] = []
+    seen_chunks, seen_rels = set(), set()
+    for chunk_id in ids:
+        neighborhood = neighborhoods.get(chunk_id)
+        if neighborhood is None or not neighborhood.relationships or chunk_id in seen_chunks:
+            continue
+        seen_chunks.add(chunk_id)
+        if len(chunks) < MAX_CHUNKS:
+            chunks.append((chunk_id, neighborhood))
+        for rel_id, text in neighborhood.relationships:
+            if rel_id in seen_rels:
+                continue
+            seen_rels.add(rel_id)
+            if len(seen_rels) <= MAX_RELATIONSHIPS and text is not None:
+                rel_texts.append(text)
+    return expansion_record([(chunk_id, chunk.text, chunk.source) for chunk_id, chunk in chunks], rel_texts)
+
+
+def expansion_record(chunks: Sequence[Tuple[str, Optional[str], Optional[str]]],
+                     rel_texts: Sequence[str]) -> List[neo4j.Record]:
+    """The CHUNK_RETRIEVAL_QUERY record for kept (id, text, source) chunks; none without chunks."""
+    if not chunks:
+        return []
+    return [neo4j.Record({
+        "truncated_chunk_texts": _join([text[:MAX_CHUNK_CHARS] for _id, text, _source in chunks if text is not None]),
+        "chunk_sources": _join([source for _id, _text, source in chunks if source is not None]),
+        "truncated_relationship_texts": _join(rel_texts),
+        "chunk_ids": [chunk_id for chunk_id, _text, _source in chunks],
+    }.items())]
+
+
+def expand_chunks(driver, ids: Sequence[str], cache: Optional[NeighborhoodCache] = None,
+                  neo4j_database: Optional[str] = None) -> List[neo4j.Record]:
+    """
+    Expand seed chunks into the CHUNK_RETRIEVAL_QUERY record, querying
+    Neo4j only for chunks whose neighborhood isn't cached.
+    """
+    if cache is None:
+        cache = get_neighborhood_cache()
+    ids = list(dict.fromkeys(ids))
+    neighborhoods, missing = cache.get_many(ids)
+    if missing:
+        fetched = fetch_neighborhoods(driver, missing, neo4j_database)
+        # Ids that no longer exist are cached as empty neighborhoods
+        fetched.update({chunk_id: ChunkNeighborhood(None, None, []) for chunk_id in missing if chunk_id not in fetched})
+        cache.put_many(fetched)
+        neighborhoods.update(fetched)
+    return combine_neighborhoods(ids, neighborhoods)
+
+
+def expand_seed_chunks(driver, ids: Sequence[str], mode: str = "cached",
+                       neo4j_database: Optional[str] = None) -> List[neo4j.Record]:
+    """Expand seed chunks from the neighborhood cache, precomputed summaries or the graph snapshot."""
+    if mode == "precomputed":
+        from app.rag.neighborhood_summaries import expand_precomputed
+        return expand_precomputed(driver, ids, neo4j_database)
+    if mode == "snapshot":
+        from app.rag.graph_snapshot import expand_from_snapshot
+        return expand_from_snapshot(driver, ids, neo4j_database)
+    return expand_chunks(driver, ids, neo4j_database=neo4j_database)
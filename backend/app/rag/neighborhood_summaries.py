@@ -0,0 +1,131 @@
+"""
+Chunk neighborhood summaries precomputed offline.
+
+Instead of walking two hops at query time, an offline job stores each
+Chunk's relationship texts on the chunk itself, selected and truncated as
+CHUNK_RETRIEVAL_QUERY would for that chunk (distinct relationships in
+traversal order, at most MAX_RELATIONSHIPS):
+
+    chunk.neighborhood_rel_ids  relationship element ids (for de-duplication
+                                across seed chunks)
+    chunk.neighborhood_rels     relationship texts ('' where the text is null)
+    chunk.neighborhood_at       job start time (epoch ms) of the last summary
+
+With GRAPH_EXPANSION_MODE=precomputed, expansion is a property lookup per
+seed chunk; chunks without a summary yet are walked live.
+
+The job is incremental: it only recomputes chunks that have no summary,
+or where the chunk, its entities or nodes up to two hops from them carry
+an `updated_at` (epoch ms) newer than the summary. Ingestion scripts must
+set `updated_at = timestamp()` on nodes they add or change (e.g. renamed
+entities) and on both end nodes of relationships they add, change or
+delete, FROM_CHUNK links included; `--full` recomputes everything. Run
+with:
+
+    python -m app.rag.neighborhood_summaries [--full]
+"""
+import time
+from typing import Optional, Sequence
+
+import neo4j
+
+from app.rag.neighborhood_cache import (
+    MAX_RELATIONSHIPS, NEIGHBORHOOD_RELS, ChunkNeighborhood, combine_neighborhoods, fetch_neighborhoods
+)
+
+STALE_CHUNKS_QUERY = """
+MATCH (chunk:Chunk)
+WHERE $full OR chunk.neighborhood_at IS NULL OR chunk.updated_at > chunk.neighborhood_at OR EXISTS {
+    MATCH (chunk)<-[:FROM_CHUNK]-()-[:!FROM_CHUNK]-{0,2}(node)
+    WHERE node.updated_at > chunk.neighborhood_at
+}
+RETURN elementId(chunk) AS id
+"""
+
+SUMMARIZE_QUERY = f"""
+UNWIND $ids AS id
+MATCH (chunk) WHERE elementId(chunk) = id
+WITH chunk, {NEIGHBORHOOD_RELS} AS rels
+SET chunk.neighborhood_rel_ids = [rel IN rels | rel[0]],
+    chunk.neighborhood_rels = [rel IN rels | coalesce(rel[1], '')],
+    chunk.neighborhood_at = $started_at
+RETURN count(chunk) AS summarized
+"""
+
+PRECOMPUTED_QUERY = """
+UNWIND $ids AS id
+MATCH (chunk) WHERE elementId(chunk) = id
+RETURN id, chunk.text AS text, chunk.source2 AS source,
+       chunk.neighborhood_rel_ids AS rel_ids, chunk.neighborhood_rels AS rel_texts
+"""
+
+def expand_precomputed(driver, ids: Sequence[str], neo4j_database: Optional[str] = None):
+    """
+    Expand seed chunks into the CHUNK_RETRIEVAL_QUERY record from their
+    precomputed summaries, walking only chunks that have none.
+    """
+    ids = list(dict.fromkeys(ids))
+    records, _summary, _keys = driver.execute_query(
+        PRECOMPUTED_QUERY,
+        {"ids": ids},
+        database_=neo4j_database,
+        routing_=neo4j.RoutingControl.READ
+    )
+    neighborhoods, unsummarized = {}, []
+    for record in records:
+        if record["rel_ids"] is None:
+            unsummarized.append(record["id"])
+            continue
+        neighborhoods[record["id"]] = ChunkNeighborhood(
+            text=record["text"],
+            source=record["source"],
+            relationships=[(rel_id, text or None) for rel_id, text in zip(record["rel_ids"], record["rel_texts"])]
+        )
+    if unsummarized:
+        neighborhoods.update(fetch_neighborhoods(driver, unsummarized, neo4j_database))
+    return combine_neighborhoods(ids, neighborhoods)
+
+
+def summarize_neighborhoods(driver, full: bool = False, batch_size: int = 500,
+                            max_rels: int = MAX_RELATIONSHIPS, neo4j_database: Optional[str] = None) -> int:
+    """
+    Recompute the summaries of stale chunks (all chunks with `full`).
+
+    Returns the number of chunks summarized. The graph version is left
+    alone: summaries only restate graph data, whose changes ingestion has
+    already versioned, and a bump would flush every graph-derived cache
+    and make graph snapshots look stale.
+    """
+    # Changes that land while the job runs are newer than this and are
+    # picked up by the next run
+    started_at = int(time.time() * 1000)
+    records, _summary, _keys = driver.execute_query(
+        STALE_CHUNKS_QUERY, {"full": full}, database_=neo4j_database, routing_=neo4j.RoutingControl.READ
+    )
+    ids = [record["id"] for record in records]
+    print(f"Summarizing neighborhoods of {len(ids)} chunks{' (full rebuild)' if full else ''}")
+    summarized = 0
+    for offset in range(0, len(ids), batch_size):
+        records, _summary, _keys = driver.execute_query(
+            SUMMARIZE_QUERY,
+            {"ids": ids[offset:offset + batch_size], "max_rels": max_rels, "started_at": started_at},
+            database_=neo4j_database
+        )
+        summarized += records[0]["summarized"] if records else 0
+        print(f"Summarized {summarized}/{len(ids)} chunks")
+    return summarized
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.rag.neo4j import get_shared_driver, close_shared_driver
+
+    parser = argparse.ArgumentParser(description="Precompute chunk neighborhood summaries in the graph")
+    parser.add_argument("--full", action="store_true", help="recompute every chunk, not only stale ones")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = summarize_neighborhoods(get_shared_driver(), full=args.full, batch_size=args.batch_size)
+    print(f"Summarized {count} chunk neighborhoods in {time.perf_counter() - start:.1f}s")
+    close_shared_driver()
@@ -1,6 +1,13 @@
 import neo4j
 import os
+import threading
 from app.core.config import settings
+from app.core.circuit_breaker import DependencyUnavailableError, get_circuit_breaker
+from app.core.deadline import check_deadline
+
+# Process-wide pooled driver shared by request handlers
+_shared_driver = None
+_shared_driver_lock = threading.Lock()
 
 def get_neo4j_driver():
     """
@@ -22,6 +29,35 @@ def get_neo4j_driver():
         return None
 
 
+def get_shared_driver():
+    """
+    Return the process-wide Neo4j driver, creating it on first use.
+    
+    The driver is thread-safe and keeps a connection pool, so request
+    handlers should share it instead of creating a driver per request.
+    """
+    global _shared_driver
+    if _shared_driver is None:
+        with _shared_driver_lock:
+            if _shared_driver is None:
+                print(f"Creating shared Neo4j driver for: {settings.NEO4J_URI}")
+                _shared_driver = neo4j.GraphDatabase.driver(
+                    settings.NEO4J_URI,
+                    auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD),
+                    max_connection_pool_size=settings.NEO4J_MAX_CONNECTION_POOL_SIZE,
+                    connection_acquisition_timeout=settings.NEO4J_CONNECTION_ACQUISITION_TIMEOUT
+                )
+    return _shared_driver
+
+
+def close_shared_driver():
+    """Close the process-wide Neo4j driver (application shutdown)."""
+    global _shared_driver
+    with _shared_driver_lock:
+        close_neo4j_driver(_shared_driver)
+        _shared_driver = None
+
+
 def close_neo4j_driver(driver):
     """Close the Neo4j driver."""
     if driver:
@@ -32,6 +68,51 @@ def close_neo4j_driver(driver):
             print(f"Error closing Neo4j driver: {e}")
 
 
+def is_neo4j_outage(error: BaseException) -> bool:
+    """Errors that mean the database is unreachable or unhealthy (not bad queries or timeouts we set)."""
+    return isinstance(error, (
+        neo4j.exceptions.ServiceUnavailable,
+        neo4j.exceptions.SessionExpired,
+        neo4j.exceptions.TransientError,
+    ))
+
+
+class GuardedDriver:
+    """
+    Driver wrapper that runs `execute_query` through the Neo4j circuit
+    breaker and bounds it by the current request deadline.
+    
+    Each query fails fast while the breaker is open or once the deadline
+    has passed (or the request was cancelled), and otherwise runs with a
+    server-side transaction timeout of the time left. Connectivity errors
+    are raised as DependencyUnavailableError so the API reports the outage
+    instead of an empty retrieval. Everything else is delegated to the
+    wrapped driver.
+    """
+    
+    def __init__(self, driver):
+        self._driver = driver
+        self._breaker = get_circuit_breaker("neo4j")
+    
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+    
+    def execute_query(self, query_, parameters_=None, *args, **kwargs):
+        remaining = check_deadline("Neo4j query")
+        if remaining is not None:
+            if isinstance(query_, neo4j.Query):
+                query_ = neo4j.Query(query_.text, metadata=query_.metadata, timeout=remaining)
+            else:
+                query_ = neo4j.Query(query_, timeout=remaining)
+        try:
+            with self._breaker.guard(is_neo4j_outage):
+                return self._driver.execute_query(query_, parameters_, *args, **kwargs)
+        except Exception as e:
+            if is_neo4j_outage(e):
+                raise DependencyUnavailableError("neo4j") from e
+            raise
+
+
 class Neo4jManager:
     """Context manager for Neo4j connections"""
     def __init__(self):
@@ -0,0 +1,65 @@
+"""
+RAG prompt layout for provider prompt caching.
+
+OpenAI-compatible APIs cache prompts by exact prefix, so the prompt is laid
+out from most to least shared:
+
+1. the static instructions, as the system message (identical for every request)
+2. the context blocks, deduplicated and sorted by chunk id (or source and
+   text), so requests that retrieve the same or overlapping chunks share a
+   long prefix regardless of retrieval rank
+3. the question, last
+
+The instructions are the reference app's, unchanged; only their position
+and the order of context blocks differ.
+"""
+from typing import Any, Dict, List, Tuple
+
+RAG_INSTRUCTIONS = (
+    "Answer the Question using the following Context. Only respond with information mentioned "
+    "in the Context. Do not inject any speculative information not mentioned."
+)
+
+RAG_USER_TEMPLATE = """# Context:
+{context}
+
+# Question:
+{query_text}
+
+# Answer:
+"""
+
+
+def _block_key(item) -> Tuple[str, str]:
+    metadata = getattr(item, "metadata", None) or {}
+    hits = metadata.get("hits") or []
+    ids = sorted(hit.chunk_id for hit in hits if hit.chunk_id)
+    if ids:
+        return ids[0], str(item.content)
+    sources = sorted(f"{hit.source_path}\x00{hit.text}" for hit in hits)
+    return (sources[0] if sources else ""), str(item.content)
+
+
+def context_blocks(retriever_results) -> List[str]:
+    """Context blocks of a retrieval in deterministic order, without duplicates."""
+    items = [item for item in getattr(retriever_results, "items", None) or [] if hasattr(item, "content")]
+    blocks = []
+    seen = set()
+    for item in sorted(items, key=_block_key):
+        block = str(item.content)
+        if block not in seen:
+            seen.add(block)
+            blocks.append(block)
+    return blocks
+
+
+def join_context(blocks: List[str]) -> str:
+    return "".join(block + "\n\n" for block in blocks)
+
+
+def build_rag_messages(query_text: str, context: str) -> List[Dict[str, Any]]:
+    """Chat messages with the static instructions first and the question last."""
+    return [
+        {"role": "system", "content": RAG_INSTRUCTIONS},
+        {"role": "user", "content": RAG_USER_TEMPLATE.format(context=context, query_text=query_text)},
+    ]
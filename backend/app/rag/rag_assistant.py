@@ -1,6 +1,7 @@
 import re
 from typing import List, Dict, Any, Optional
 from app.schemas.query import RagResponse, RagSource
+from app.rag.hits import RetrievalHit
 
 def format_rag_response(answer: str, retriever_items: List[Any], retriever_type: str) -> RagResponse:
     """
@@ -28,6 +29,39 @@ def format_rag_response(answer: str, retriever_items: List[Any], retriever_type:
         # Both hybrid_cypher and vector_cypher use the same format
         sources = process_cypher_results(retriever_items)
     
+    return _build_response(answer, sources)
+
+
+def build_rag_response(answer: str, hits: List[RetrievalHit]) -> RagResponse:
+    """
+    Build the RAG Assistant response directly from structured retrieval hits.
+    
+    Same output as format_rag_response, without serializing hits to
+    strings and re-parsing them.
+    
+    Args:
+        answer: The generated answer text
+        hits: Retrieval hits in rank order
+        
+    Returns:
+        RagResponse: Formatted response with answer and sources
+    """
+    if not hits:
+        return RagResponse(
+            answer="I don't have enough evidence in the current knowledge base to answer.",
+            sources=[]
+        )
+    
+    sources = [
+        {"path": hit.source_path, "title": hit.title, "snippets": [extract_snippet(hit.text)]}
+        for hit in hits
+        if hit.source_path
+    ]
+    return _build_response(answer, sources)
+
+
+def _build_response(answer: str, sources: List[Dict[str, Any]]) -> RagResponse:
+    """Deduplicate source dictionaries by path and wrap the top 5 in a RagResponse."""
     # Deduplicate sources by path
     unique_sources = {}
     for source in sources:
@@ -37,11 +71,12 @@ def format_rag_response(answer: str, retriever_items: List[Any], retriever_type:
     # Get the top 5 sources (or fewer if not available)
     top_sources = list(unique_sources.values())[:5]
     
-    # Create RagSource objects
+    # Create RagSource objects. The data is built internally from retriever
+    # output, so skip re-validation with model_construct.
     rag_sources = []
     for source in top_sources:
         rag_sources.append(
-            RagSource(
+            RagSource.model_construct(
                 path=source["path"],
                 title=source["title"],
                 url=None,  # URL should be null per requirements
@@ -49,7 +84,7 @@ def format_rag_response(answer: str, retriever_items: List[Any], retriever_type:
             )
         )
     
-    return RagResponse(
+    return RagResponse.model_construct(
         answer=answer,
         sources=rag_sources
     )
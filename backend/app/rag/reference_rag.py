@@ -2,130 +2,119 @@
 Reference RAG Implementation - Exact replica of the Streamlit app logic
 """
 import os
-import re
-import json
-from openai import OpenAI
+import threading
+import time
 from typing import Dict, List, Any, Union
 
-from app.rag.neo4j import Neo4jManager
+from app.rag.neo4j import GuardedDriver, Neo4jManager, get_shared_driver, is_neo4j_outage
+from app.rag.fusion import FusionHybridRetriever
+from app.rag.bm25 import get_bm25_index
+from app.rag.entity_linker import EntityLinkedVectorRetriever, get_entity_linker
+from app.rag.decomposition import DecomposingRetriever, get_query_decomposer
+from app.rag.hits import format_vector_record, format_cypher_record, hits_from_items, unique_source_hits
 from app.rag.embeddings import get_embedder
+from app.rag.scheduler import LLMUnavailableError, estimate_tokens
+from app.rag.llm_gateway import get_llm_gateway
+from app.rag.prompts import build_rag_messages, context_blocks, join_context
+from app.rag.model_router import FAST, STRONG, get_model_router, needs_escalation, top_similarity
 from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.core.deadline import DeadlineExceeded, check_deadline
+from app.core.circuit_breaker import DependencyUnavailableError, get_circuit_breaker
+
+# Identical questions in flight at the same time (e.g. a shared link in a
+# webinar) share one retrieval + generation, across all endpoints. A leader
+# whose own request times out or disconnects hands over to a waiter.
+_query_flights = SingleFlight(retry_on=(DeadlineExceeded,))
+
+# Failures the API reports (503/504) instead of a "no evidence" answer
+_PROPAGATED_ERRORS = (LLMUnavailableError, DependencyUnavailableError, DeadlineExceeded)
+
+
+def normalize_query_key(query: str) -> str:
+    """Normalize a query for request coalescing (case and whitespace)."""
+    return " ".join(query.lower().split())
+
+
+def get_coalescing_metrics() -> Dict[str, Any]:
+    """Return single-flight counters for the health endpoint."""
+    return dict(_query_flights.stats(), enabled=settings.RAG_COALESCE_QUERIES)
 
 # Exact replica of the reference app's LLMHandler
 class ReferenceLLMHandler:
-    def __init__(self, retriever, api_key=None, model=None, temperature=None):
-        self.api_key = api_key or settings.OPENAI_API_KEY
-        self.model = model or settings.LLM_MODEL
+    def __init__(self, retriever, temperature=None, gateway=None, router=None):
         self.temperature = temperature or 0.0
         self.retriever = retriever
-        self.client = OpenAI(api_key=self.api_key)
+        # Endpoint selection, hedging, failover and retries live in the gateway
+        self.gateway = gateway or get_llm_gateway()
+        self.router = router or get_model_router()
         
-    def _generate_completion(self, prompt, use_history=False):
-        """Generate a completion using OpenAI API - updated for v1.0+"""
-        try:
-            messages = [{"role": "user", "content": prompt}]
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Error generating completion: {e}")
-            return f"Error: {str(e)}"
+    def _generate_completion(self, messages, use_history=False, model=None):
+        """
+        Generate a completion through the LLM gateway.
+        
+        Args:
+            messages: Chat messages, or a prompt string sent as one user message
+        
+        Raises LLMUnavailableError when every endpoint stays rate limited or
+        unreachable, instead of returning the error text as the answer. The
+        request timeout is bounded by the request deadline.
+        """
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        response = self.gateway.complete(
+            messages,
+            temperature=self.temperature,
+            estimated_tokens=prompt_tokens + settings.OPENAI_COMPLETION_TOKEN_ESTIMATE,
+            model=model
+        )
+        return response.choices[0].message.content.strip()
     
-    def _extract_sources(self, results):
-        """Extract sources and their content from retriever results - exact replica"""
-        sources = []
-        source_contents = {}
-        retriever_type = getattr(self.retriever, "__class__").__name__
+    def _generate_routed(self, messages, decision):
+        """Generate on the routed tier, escalating a fast answer that doesn't answer the question."""
+        start = time.perf_counter()
+        answer = self._generate_completion(messages, model=decision.model)
+        latency = time.perf_counter() - start
+        print(f"🧭 Model routing: {decision.describe()} -> {latency * 1000:.0f} ms")
         
-        # Handle different types of retrievers - EXACT logic from reference app
-        print(f"🔍 Extracting sources from {retriever_type} with {len(results.items)} items")
+        if decision.tier != FAST or not self.router.escalate or not needs_escalation(answer):
+            self.router.record(decision.tier, latency)
+            return answer
         
-        if retriever_type == "VectorRetriever":
-            for item in results.items:
-                try:
-                    content = item.content
-                    print(f"📄 Vector item content: {str(content)[:200]}...")
-                    data_dict = json.loads(content.replace("'", '"'))
-                    source = data_dict.get("source2", "")
-                    text = data_dict.get("text", "")
-                    if source and source not in sources:
-                        sources.append(source)
-                        if text:
-                            # Store or append the content for this source
-                            if source in source_contents:
-                                source_contents[source] += f"\n\n{text}"
-                            else:
-                                source_contents[source] = text
-                        print(f"✅ Added vector source: {source}")
-                except Exception as e:
-                    print(f"❌ Error parsing vector item: {e}")
-                    continue
-        else:  # VectorCypherRetriever or HybridCypherRetriever
-            for item in results.items:
-                try:
-                    content = str(item.content)
-                    print(f"📄 Cypher item content: {content[:200]}...")
-                    
-                    # Extract sources - EXACT regex from reference
-                    source_pattern = r"chunk_sources='(.*?)'(?=\s*truncated_relationship_texts=)"
-                    source_match = re.search(source_pattern, content, re.DOTALL)
-                    
-                    # Extract text chunks - EXACT regex from reference  
-                    text_pattern = r"truncated_chunk_texts='(.*?)'(?=\s*chunk_sources=)"
-                    text_match = re.search(text_pattern, content, re.DOTALL)
-                    
-                    if source_match and text_match:
-                        chunk_sources_text = source_match.group(1)
-                        chunk_texts = text_match.group(1)
-                        
-                        print(f"📚 Found sources text: {chunk_sources_text[:100]}...")
-                        print(f"📝 Found chunks text: {chunk_texts[:100]}...")
-                        
-                        # Split sources and texts - EXACT logic
-                        chunk_sources = re.split(r'\\n---\\n', chunk_sources_text)
-                        chunk_texts_list = re.split(r'\\n---\\n', chunk_texts)
-                        
-                        # Match sources with their content where possible - EXACT logic
-                        for idx, source in enumerate(chunk_sources):
-                            source = source.strip()
-                            if source and source not in sources:
-                                sources.append(source)
-                                
-                                # Try to get corresponding text if available
-                                if idx < len(chunk_texts_list):
-                                    text = chunk_texts_list[idx].strip()
-                                    if text:
-                                        source_contents[source] = text
-                                print(f"✅ Added cypher source: {source}")
-                    else:
-                        print(f"❌ No source/text match found in: {content[:100]}...")
-                except Exception as e:
-                    print(f"❌ Error parsing cypher item: {e}")
-                    continue
+        self.router.record(FAST, latency)
+        check_deadline("escalation")
+        start = time.perf_counter()
+        answer = self._generate_completion(messages, model=self.router.strong_model)
+        latency = time.perf_counter() - start
+        self.router.record(STRONG, latency, escalated=True)
+        print(f"🧭 Escalated low-confidence answer to {self.router.strong_model} -> {latency * 1000:.0f} ms")
+        return answer
+    
+    def _extract_sources(self, results):
+        """Extract sources and their content from the structured hits on retriever results"""
+        items = getattr(results, "items", None) or []
+        hits = unique_source_hits(hits_from_items(items))
+        print(f"🔍 Extracted {len(hits)} sources from {len(items)} items")
         
-        print(f"🎯 Final result: {len(sources)} sources, {len(source_contents)} with content")
-                    
-        return sources, source_contents
+        sources = [hit.source_path for hit in hits]
+        source_contents = {hit.source_path: hit.text for hit in hits if hit.text}
+        return sources, source_contents, hits
     
     def query(self, user_query):
         """Process a user query - exact replica of reference app logic"""
         try:
             # Search for relevant documents with the sanitized query
             # (sanitization happens in the retriever's overridden search method)
+            check_deadline("retrieval")
             retriever_results = self.retriever.search(query_text=user_query)
             
-            # Extract text from search results for context - exact logic
-            context = ""
-            if hasattr(retriever_results, "items") and retriever_results.items:
-                for item in retriever_results.items:
-                    if hasattr(item, "content"):
-                        context += str(item.content) + "\n\n"
+            # Context blocks in deterministic order so overlapping retrievals
+            # share a prompt prefix
+            context = join_context(context_blocks(retriever_results))
             
             # Extract sources and their content - exact logic
-            sources, source_contents = self._extract_sources(retriever_results)
+            sources, source_contents, hits = self._extract_sources(retriever_results)
             
             # If we got no context or sources, it could be due to problematic characters
             if not context.strip() and not sources:
@@ -139,49 +128,66 @@ class ReferenceLLMHandler:
                     retriever_results = self.retriever.search(query_text=simplified_query)
                     
                     # Extract context again
-                    context = ""
-                    if hasattr(retriever_results, "items") and retriever_results.items:
-                        for item in retriever_results.items:
-                            if hasattr(item, "content"):
-                                context += str(item.content) + "\n\n"
+                    context = join_context(context_blocks(retriever_results))
                     
                     # Extract sources again
-                    sources, source_contents = self._extract_sources(retriever_results)
+                    sources, source_contents, hits = self._extract_sources(retriever_results)
             
-            # Create the RAG prompt - exact template from reference
-            RAG_TEMPLATE = '''Answer the Question using the following Context. Only respond with information mentioned in the Context. Do not inject any speculative information not mentioned.
-
-# Question:
-{query_text}
-
-# Context:
-{context}
-
-# Answer:
-'''
-            
-            full_prompt = RAG_TEMPLATE.format(
-                query_text=user_query,
-                context=context
-            )
+            # Static instructions first, question last (prompt-cache friendly)
+            messages = build_rag_messages(user_query, context)
             
-            # Generate answer - always use RAG only, no history mixing
-            answer = self._generate_completion(full_prompt, use_history=False)
+            # Generate answer - always use RAG only, no history mixing - on
+            # the model tier the question needs
+            check_deadline("generation")
+            decision = self.router.route(user_query, context, top_similarity(retriever_results))
+            answer = self._generate_routed(messages, decision)
             
+        except _PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error in query processing: {e}")
             answer = f"I'm sorry, I encountered an error when processing your query. Please try a different question without special characters. Technical details: {str(e)}"
             sources = []
             source_contents = {}
+            hits = []
         
         return {
             "query": user_query,
             "answer": answer,
             "sources": sources,
-            "source_contents": source_contents
+            "source_contents": source_contents,
+            "hits": hits
         }
 
 
+# Graph expansion query appended to vector/fulltext search results
+CHUNK_RETRIEVAL_QUERY = """
+        // 1) Go out 2-3 hops in the entity graph and get relationships
+        WITH node AS chunk
+        MATCH (chunk)<-[:FROM_CHUNK]-()-[relList:!FROM_CHUNK]-{1,2}() 
+        UNWIND relList AS rel
+
+        // 2) Collect relationships, text chunks, and sources
+        WITH collect(DISTINCT chunk)[0..10] AS chunks, 
+          collect(DISTINCT rel)[0..20] AS rels
+
+        // 3) Build concatenated strings manually without APOC
+        UNWIND chunks AS c
+        WITH collect(c.text) AS chunk_texts, collect(c.source2) AS chunk_sources, collect(elementId(c)) AS chunk_ids, rels
+        
+        UNWIND rels AS r
+        WITH chunk_texts, chunk_sources, chunk_ids, 
+             collect(startNode(r).name + ' - ' + type(r) + '(' + coalesce(r.details, '') + ')' + ' -> ' + endNode(r).name) AS rel_texts
+        
+        // Use reduce to concatenate instead of apoc.text.join
+        RETURN 
+          reduce(s = '', t IN chunk_texts | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + substring(t, 0, 1000)) AS truncated_chunk_texts,
+          reduce(s = '', t IN chunk_sources | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + t) AS chunk_sources,
+          reduce(s = '', t IN rel_texts | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + t) AS truncated_relationship_texts,
+          chunk_ids
+        """
+
+
 # Exact replica of the reference app's DocumentRetriever
 class ReferenceDocumentRetriever:
     def __init__(self, driver, embedder, retriever_type="hybrid"):
@@ -190,15 +196,23 @@ class ReferenceDocumentRetriever:
         self.embedder = embedder
         self.retriever_type = retriever_type
         self.retriever = self._create_retriever()
+        # Every graph query goes through the Neo4j breaker and the request deadline
+        self.retriever.driver = GuardedDriver(self.driver)
         
         # Override the search method of the retriever object to implement our sanitization
         original_search = self.retriever.search
         
         def safe_search(query_text, **kwargs):
-            sanitized_query = self._sanitize_query(query_text)
+            # Retrievers that sanitize their own fulltext leg get the raw query
+            if getattr(self.retriever, "handles_raw_query", False):
+                sanitized_query = query_text
+            else:
+                sanitized_query = self._sanitize_query(query_text)
             print(f"Original query: '{query_text}', Sanitized query: '{sanitized_query}'")
             try:
                 return original_search(query_text=sanitized_query, **kwargs)
+            except _PROPAGATED_ERRORS:
+                raise
             except Exception as e:
                 print(f"Error in retriever search: {str(e)}")
                 # Return empty results on error
@@ -242,23 +256,27 @@ class ReferenceDocumentRetriever:
         
     def _create_retriever(self):
         """Create the appropriate retriever based on the type - exact replica"""
-        from neo4j_graphrag.retrievers import VectorRetriever, VectorCypherRetriever, HybridCypherRetriever
+        from neo4j_graphrag.retrievers import VectorCypherRetriever, HybridCypherRetriever
         
         VECTOR_INDEX_NAME = "text_embeddings"
         
         if self.retriever_type == "vector":
-            return VectorRetriever(
+            # Paraphrased queries reuse cached top-k via the vector result
+            # cache; chunks of entities named in the query are fused in
+            return EntityLinkedVectorRetriever(
                 self.driver,
                 index_name=VECTOR_INDEX_NAME,
                 embedder=self.embedder,
-                return_properties=["text", "source2"]
+                return_properties=["text", "source2"],
+                result_formatter=format_vector_record
             )
         elif self.retriever_type == "vector_cypher":
             return VectorCypherRetriever(
                 self.driver,
                 index_name=VECTOR_INDEX_NAME,
                 embedder=self.embedder,
-                retrieval_query=self._get_cypher_query()
+                retrieval_query=self._get_cypher_query(),
+                result_formatter=format_cypher_record
             )
         elif self.retriever_type == "hybrid":
             return HybridCypherRetriever(
@@ -266,37 +284,30 @@ class ReferenceDocumentRetriever:
                 vector_index_name=VECTOR_INDEX_NAME,
                 fulltext_index_name=f"{VECTOR_INDEX_NAME}2", 
                 retrieval_query=self._get_cypher_query(), 
-                embedder=self.embedder
+                embedder=self.embedder,
+                result_formatter=format_cypher_record
+            )
+        elif self.retriever_type == "fusion":
+            # Concurrent vector + fulltext queries fused client-side; the
+            # fused top-k are expanded per GRAPH_EXPANSION_MODE
+            return FusionHybridRetriever(
+                self.driver,
+                embedder=self.embedder,
+                retrieval_query=self._get_cypher_query(),
+                vector_index_name=VECTOR_INDEX_NAME,
+                fulltext_index_name=f"{VECTOR_INDEX_NAME}2",
+                result_formatter=format_cypher_record,
+                lexical_index=get_bm25_index() if settings.FUSION_LEXICAL_BACKEND == "bm25" else None,
+                fulltext_sanitizer=self._sanitize_query,
+                expansion_mode=settings.GRAPH_EXPANSION_MODE,
+                entity_linker=get_entity_linker()
             )
         else:
             raise ValueError(f"Invalid retriever type: {self.retriever_type}")
             
     def _get_cypher_query(self):
         """Get the Cypher query for the retriever - simplified without APOC dependency"""
-        return """
-        // 1) Go out 2-3 hops in the entity graph and get relationships
-        WITH node AS chunk
-        MATCH (chunk)<-[:FROM_CHUNK]-()-[relList:!FROM_CHUNK]-{1,2}() 
-        UNWIND relList AS rel
-
-        // 2) Collect relationships, text chunks, and sources
-        WITH collect(DISTINCT chunk)[0..10] AS chunks, 
-          collect(DISTINCT rel)[0..20] AS rels
-
-        // 3) Build concatenated strings manually without APOC
-        UNWIND chunks AS c
-        WITH collect(c.text) AS chunk_texts, collect(c.source2) AS chunk_sources, rels
-        
-        UNWIND rels AS r
-        WITH chunk_texts, chunk_sources, 
-             collect(startNode(r).name + ' - ' + type(r) + '(' + coalesce(r.details, '') + ')' + ' -> ' + endNode(r).name) AS rel_texts
-        
-        // Use reduce to concatenate instead of apoc.text.join
-        RETURN 
-          reduce(s = '', t IN chunk_texts | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + substring(t, 0, 1000)) AS truncated_chunk_texts,
-          reduce(s = '', t IN chunk_sources | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + t) AS chunk_sources,
-          reduce(s = '', t IN rel_texts | s + CASE WHEN s = '' THEN '' ELSE '\n---\n' END + t) AS truncated_relationship_texts
-        """
+        return CHUNK_RETRIEVAL_QUERY
 
 
 # Main RAG Pipeline that exactly replicates the reference app
@@ -305,6 +316,8 @@ class ReferenceRagPipeline:
     
     def __init__(self):
         self.rag_enabled = False
+        self._retrievers = {}
+        self._retrievers_lock = threading.Lock()
         try:
             print("Initializing Reference RAG pipeline...")
             self.embedder = get_embedder()
@@ -323,6 +336,37 @@ class ReferenceRagPipeline:
             print(f"Error initializing Reference RAG pipeline: {str(e)}")
             self.rag_enabled = False
     
+    def _get_document_retriever(self, retriever_type: str) -> "ReferenceDocumentRetriever":
+        """
+        Return the document retriever for a type, built once on the shared driver.
+        
+        Retrievers are stateless between searches, so reusing them avoids a
+        new driver, connection and index lookup on every request.
+        """
+        retriever = self._retrievers.get(retriever_type)
+        if retriever is None:
+            # Construction queries the raw driver (version, index info), so
+            # it goes through the Neo4j breaker too: while Neo4j is down,
+            # requests fail fast with a 503 instead of waiting to connect
+            breaker = get_circuit_breaker("neo4j")
+            breaker.check()
+            with self._retrievers_lock:
+                retriever = self._retrievers.get(retriever_type)
+                if retriever is None:
+                    try:
+                        with breaker.guard(is_neo4j_outage):
+                            retriever = ReferenceDocumentRetriever(
+                                driver=get_shared_driver(),
+                                embedder=self.embedder,
+                                retriever_type=retriever_type
+                            )
+                    except Exception as e:
+                        if is_neo4j_outage(e):
+                            raise DependencyUnavailableError("neo4j") from e
+                        raise
+                    self._retrievers[retriever_type] = retriever
+        return retriever
+    
     def search(self, query: str, conversation_history=None, retriever_type=None, use_rag_format: bool = False) -> Dict[str, Any]:
         """Search using exact reference app logic"""
         print(f"Reference RAG search for query: {query}")
@@ -331,38 +375,60 @@ class ReferenceRagPipeline:
             print("Reference RAG pipeline is not enabled")
             return {
                 "answer": "I don't have enough evidence in the current knowledge base to answer.",
-                "sources": []
+                "sources": [],
+                "hits": []
             }
             
+        # Use vector only to avoid APOC dependency, unless client-side
+        # fusion is explicitly requested
+        effective_type = "fusion" if retriever_type == "fusion" else "vector"
+        
+        if not settings.RAG_COALESCE_QUERIES:
+            return self._search(query, effective_type)
+        
+        # Concurrent identical queries wait for one execution. The pipeline
+        # ignores conversation history, so callers only differ in what they
+        # persist afterwards; each gets its own copy of the result.
+        key = (normalize_query_key(query), effective_type)
+        result, shared = _query_flights.do(key, lambda: self._search(query, effective_type))
+        if shared:
+            print(f"Coalesced query with in-flight request: {query}")
+        return dict(result)
+    
+    def _search(self, query: str, effective_type: str) -> Dict[str, Any]:
+        """Run retrieval and generation for one query with the given retriever type"""
         try:
-            # Create Neo4j connection
-            with Neo4jManager() as neo4j_manager:
-                # Create the retriever - use vector only to avoid APOC dependency
-                retriever = ReferenceDocumentRetriever(
-                    driver=neo4j_manager.driver,
-                    embedder=self.embedder,
-                    retriever_type="vector"  # Force vector to avoid APOC issues
-                )
-                
-                # Create the LLM handler - exact replica
-                llm_handler = ReferenceLLMHandler(retriever=retriever.retriever)
-                
-                # Process the query - exact replica
-                result = llm_handler.query(query)
-                
-                print(f"Reference query result: {result['answer'][:100]}... with {len(result['sources'])} sources")
-                
-                return {
-                    "answer": result["answer"],
-                    "sources": result["sources"][:5],  # Limit to 5 sources like reference
-                    "source_contents": result["source_contents"]
-                }
+            retriever = self._get_document_retriever(effective_type)
+            
+            # Compound questions are retrieved per sub-query, then answered once
+            search_retriever = retriever.retriever
+            decomposer = get_query_decomposer()
+            if decomposer is not None:
+                search_retriever = DecomposingRetriever(search_retriever, self.embedder, decomposer)
+            
+            # Create the LLM handler - exact replica
+            llm_handler = ReferenceLLMHandler(retriever=search_retriever)
+            
+            # Process the query - exact replica
+            result = llm_handler.query(query)
+            
+            print(f"Reference query result: {result['answer'][:100]}... with {len(result['sources'])} sources")
+            
+            return {
+                "answer": result["answer"],
+                "sources": result["sources"][:5],  # Limit to 5 sources like reference
+                "source_contents": result["source_contents"],
+                "hits": result["hits"][:5]
+            }
                 
+        except _PROPAGATED_ERRORS:
+            raise
         except Exception as e:
             print(f"Error during Reference RAG search: {e}")
             import traceback
             traceback.print_exc()
             return {
                 "answer": "I don't have enough evidence in the current knowledge base to answer.",
-                "sources": []
+                "sources": [],
+                "hits": []
             }
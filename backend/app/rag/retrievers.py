@@ -18,7 +18,8 @@ RetrieverResult = _RetrieverResult
 from app.rag.neo4j import Neo4jManager
 from app.rag.embeddings import get_embedder
 from app.rag.llm import get_llm
-from app.rag.rag_assistant import format_rag_response
+from app.rag.rag_assistant import build_rag_response
+from app.rag.hits import RetrievalHit
 from app.rag.reference_rag import ReferenceRagPipeline
 from app.schemas.query import Source, RagResponse
 from app.core.config import settings
@@ -204,47 +205,27 @@ class RagPipeline:
             use_rag_format=use_rag_format
         )
         
-        # Convert sources to Source objects for compatibility
-        if "sources" in result and isinstance(result["sources"], list):
-            converted_sources = []
-            source_contents = result.get("source_contents", {})
-            
-            for source_path in result["sources"]:
-                source_name = source_path.split('\\')[-1] if '\\' in source_path else source_path.split('/')[-1]
-                clean_name = self._clean_source_name(source_name)
-                url = self._get_box_url(source_name)
-                content = source_contents.get(source_path, "")
-                
-                src_obj = Source(
-                    source_path=source_path,
-                    source_name=clean_name,
-                    paper_url=url,
-                    content=content[:1000] if content else "",
-                    location="Document excerpt",
-                    why_it_supports="Contains relevant information that directly addresses the query."
-                )
-                converted_sources.append(src_obj)
-            
-            result["sources"] = converted_sources
+        # Build Source objects and the RAG format directly from the structured hits
+        hits = result.get("hits", [])
         
         if use_rag_format:
-            # Convert to RagResponse format if needed
-            from app.rag.rag_assistant import format_rag_response
-            # Create dummy items for format_rag_response
-            items = []
-            for source_path in result.get("sources", []):
-                if hasattr(source_path, 'source_path'):
-                    source_path = source_path.source_path
-                class DummyItem:
-                    def __init__(self, path, content):
-                        self.content = f"chunk_sources='{path}' truncated_chunk_texts='{content}'"
-                content = result.get("source_contents", {}).get(source_path, "")
-                items.append(DummyItem(source_path, content))
-            
-            return format_rag_response(result["answer"], items, retriever_type or "hybrid")
+            return build_rag_response(result["answer"], hits)
         
+        result["sources"] = [self._source_from_hit(hit) for hit in hits]
         return result
 
+    def _source_from_hit(self, hit: RetrievalHit) -> Source:
+        """Convert a retrieval hit into a Source for QueryResult."""
+        source_name = hit.title
+        return Source(
+            source_path=hit.source_path,
+            source_name=self._clean_source_name(source_name),
+            paper_url=self._get_box_url(source_name),
+            content=hit.text[:1000] if hit.text else "",
+            location="Document excerpt",
+            why_it_supports="Contains relevant information that directly addresses the query."
+        )
+
     def _extract_relevant_section(self, chunk: str, source: Source) -> str:
         """Extract the most relevant section of a chunk for a particular source and topic."""
         # Clean up the chunk text by removing newlines and fixing spacing
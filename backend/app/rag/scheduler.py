@@ -0,0 +1,389 @@
+"""
+Rate-limit-aware scheduler for OpenAI chat and embedding calls.
+
+Every call goes through a per-kind OpenAIScheduler ("chat", "embedding")
+that enforces, in order:
+
+1. Priority lanes: waiting calls are admitted interactive-first, then
+   batch, FIFO within a lane. Batch work (evaluation, benchmarks) opts in
+   with `with priority_lane("batch"): ...`.
+2. A bounded concurrency pool.
+3. Token buckets for requests and tokens per minute, charged with an
+   estimate up front and corrected from the response `usage`.
+
+Retryable failures (429, 5xx, timeouts, connection errors) are retried
+with jittered exponential backoff. A `retry-after` header is honored and
+pauses the whole scheduler, since the limit is per account. When retries
+are exhausted or the queue wait times out, LLMUnavailableError is raised;
+the API maps it to a 503 rather than returning error text as an answer.
+Queue waits and retries also stop at the current request deadline
+(DeadlineExceeded). Each kind has a circuit breaker: outage errors (5xx,
+timeouts, connection errors) count against it, and while it is open calls
+fail immediately with DependencyUnavailableError instead of queueing;
+timeouts count only when the call wasn't cut short by a tight deadline.
+"""
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import openai
+
+from app.core.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, check_deadline, remaining_timeout
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+LANES = ("interactive", "batch")
+
+_current_lane = contextvars.ContextVar("openai_lane", default="interactive")
+
+
+class LLMUnavailableError(Exception):
+    """The model API could not serve the request within its retry/queue budget."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def priority_lane(lane: str):
+    """Run OpenAI calls made in this context (and threadpool calls it spawns) in `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Invalid priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt (tiktoken if installed, else ~4 chars/token)."""
+    global _encoding
+    if tiktoken is not None:
+        try:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            return len(_encoding.encode(text))
+        except Exception:
+            pass
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Per-minute budget refilled continuously. A limit of 0 disables it.
+
+    Not thread-safe on its own; OpenAIScheduler guards it with its lock.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.capacity > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read retry-after-ms / retry-after (seconds) from an API error response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _is_outage(error: BaseException, timeout: Optional[float] = None) -> bool:
+    """
+    Errors that mean the API is down or degraded (not rate limits or bad requests).
+
+    A timeout only counts when the call was given at least
+    min(OPENAI_TIMEOUT_SECONDS, OPENAI_OUTAGE_MIN_TIMEOUT_SECONDS): one cut
+    short by the request deadline (e.g. a client-requested 0.5 s) says
+    nothing about the API.
+    """
+    if isinstance(error, openai.APITimeoutError):
+        floor = min(settings.OPENAI_TIMEOUT_SECONDS, settings.OPENAI_OUTAGE_MIN_TIMEOUT_SECONDS)
+        return timeout is None or timeout >= floor
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+
+class OpenAIScheduler:
+    """Admission, rate limiting and retries for one kind of OpenAI call."""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        max_retries: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.max_concurrency = max_concurrency
+        self.max_retries = settings.OPENAI_MAX_RETRIES if max_retries is None else max_retries
+        self.queue_timeout = settings.OPENAI_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.backoff_base = settings.OPENAI_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+        self.backoff_max = settings.OPENAI_BACKOFF_MAX_SECONDS if backoff_max is None else backoff_max
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane rank, arrival seq)
+        self._seq = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self._lane_metrics = {lane: {"queued": 0, "admitted": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0} for lane in LANES}
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.queue_timeouts = 0
+
+    def _admission_wait(self, tokens: int) -> float:
+        """Seconds the head of the queue must still wait for a pause or rate budget."""
+        return max(
+            self._paused_until - time.monotonic(),
+            self._requests.wait_time(1),
+            self._tokens.wait_time(tokens)
+        )
+
+    def _acquire(self, tokens: int, lane: str):
+        entry = (LANES.index(lane), next(self._seq))
+        metrics = self._lane_metrics[lane]
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        # A request deadline shorter than the queue timeout bounds the wait
+        request_remaining = check_deadline(f"OpenAI {self.name} call")
+        request_bound = request_remaining is not None and request_remaining < self.queue_timeout
+        if request_bound:
+            deadline = start + request_remaining
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            metrics["queued"] += 1
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == entry and self._active < self.max_concurrency:
+                        wait = self._admission_wait(tokens)
+                        if wait <= 0:
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if request_bound:
+                            raise DeadlineExceeded(f"OpenAI {self.name} call")
+                        self.queue_timeouts += 1
+                        raise LLMUnavailableError(
+                            f"OpenAI {self.name} queue wait exceeded {self.queue_timeout:.0f}s",
+                            retry_after=wait
+                        )
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                metrics["queued"] -= 1
+                if self._waiting[0] == entry:
+                    heapq.heappop(self._waiting)
+                else:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                # The next entry may now be at the head
+                self._cond.notify_all()
+            self._active += 1
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            waited_ms = (time.monotonic() - start) * 1000
+            metrics["admitted"] += 1
+            metrics["wait_ms_total"] += waited_ms
+            metrics["wait_ms_max"] = max(metrics["wait_ms_max"], waited_ms)
+
+    @property
+    def saturated(self) -> bool:
+        """True when calls are queueing (extra, optional calls should be skipped)."""
+        return bool(self._waiting) or self._active >= self.max_concurrency
+
+    def _release(self, tokens_delta: int = 0):
+        with self._cond:
+            self._active -= 1
+            if tokens_delta:
+                self._tokens.consume(tokens_delta)
+            self._cond.notify_all()
+
+    def _pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def run(self, fn: Callable[[], Any], estimated_tokens: int = 1, lane: Optional[str] = None) -> Any:
+        """
+        Call fn() once admitted, retrying transient API errors.
+
+        Args:
+            fn: Zero-argument callable making one OpenAI API request
+            estimated_tokens: Token cost charged up front (prompt + expected output)
+            lane: Priority lane; defaults to the lane of the current context
+
+        Returns:
+            The API response returned by fn
+        """
+        lane = lane or _current_lane.get()
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                # Don't queue for a dependency that is known to be down
+                self.breaker.check()
+            self._acquire(estimated_tokens, lane)
+            try:
+                if self.breaker is not None:
+                    # The timeout fn passes to the client, give or take the time to call it
+                    timeout = remaining_timeout(settings.OPENAI_TIMEOUT_SECONDS)
+                    with self.breaker.guard(lambda e: _is_outage(e, timeout)):
+                        result = fn()
+                else:
+                    result = fn()
+            except openai.APIError as e:
+                self._release()
+                retry_after = _retry_after_seconds(e)
+                if isinstance(e, openai.RateLimitError):
+                    self.rate_limited += 1
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise LLMUnavailableError(f"OpenAI {self.name} request failed: {e}", retry_after=retry_after) from e
+
+                # Full jitter on the exponential step, never earlier than retry-after
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if retry_after is not None:
+                    delay = retry_after + delay / 2
+                    self._pause(retry_after)
+                remaining = check_deadline(f"OpenAI {self.name} retry")
+                if remaining is not None and delay >= remaining:
+                    # No time left for another attempt
+                    self.failures += 1
+                    raise DeadlineExceeded(f"OpenAI {self.name} retry")
+                attempt += 1
+                self.retries += 1
+                print(f"OpenAI {self.name} request failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            # Correct the token bucket with the actual usage when reported
+            usage = getattr(result, "usage", None)
+            actual = getattr(usage, "total_tokens", None)
+            self._release(actual - estimated_tokens if isinstance(actual, int) else 0)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, wait time and retry counters for metrics endpoints."""
+        lanes = {}
+        for lane, metrics in self._lane_metrics.items():
+            admitted = metrics["admitted"]
+            lanes[lane] = {
+                "queue_depth": metrics["queued"],
+                "admitted": admitted,
+                "avg_wait_ms": round(metrics["wait_ms_total"] / admitted, 1) if admitted else 0.0,
+                "max_wait_ms": round(metrics["wait_ms_max"], 1),
+            }
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "lanes": lanes,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "queue_timeouts": self.queue_timeouts,
+        }
+
+
+_schedulers: Dict[str, OpenAIScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kind: str) -> OpenAIScheduler:
+    """
+    Return the process-wide scheduler for "chat" or "embedding" calls.
+
+    "chat:<endpoint>" returns the scheduler of a fallback chat endpoint
+    (own rate limits, queue and circuit breaker, chat settings).
+    """
+    scheduler = _schedulers.get(kind)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(kind)
+            if scheduler is None:
+                if kind == "chat" or kind.startswith("chat:"):
+                    endpoint = kind.partition(":")[2]
+                    scheduler = OpenAIScheduler(
+                        kind,
+                        requests_per_minute=settings.OPENAI_CHAT_RPM,
+                        tokens_per_minute=settings.OPENAI_CHAT_TPM,
+                        max_concurrency=settings.OPENAI_CHAT_MAX_CONCURRENCY,
+                        breaker=get_circuit_breaker(kind, f"The {endpoint} chat endpoint" if endpoint else None)
+                    )
+                elif kind == "embedding":
+                    scheduler = OpenAIScheduler(
+                        kind,
+                        requests_per_minute=settings.OPENAI_EMBEDDING_RPM,
+                        tokens_per_minute=settings.OPENAI_EMBEDDING_TPM,
+                        max_concurrency=settings.OPENAI_EMBEDDING_MAX_CONCURRENCY,
+                        breaker=get_circuit_breaker(kind)
+                    )
+                else:
+                    raise ValueError(f"Invalid scheduler kind: {kind}")
+                _schedulers[kind] = scheduler
+    return scheduler
+
+
+def get_scheduler_metrics() -> Dict[str, Any]:
+    """Return metrics for the schedulers created so far."""
+    return {kind: scheduler.stats() for kind, scheduler in list(_schedulers.items())}
@@ -109,34 +109,108 @@ def enhance_with_metadata(sources: List[SourceItem], query: str) -> List[SourceI
     Returns:
         Enhanced list of sources
     """
-    # Extract key terms from the query
-    query_terms = set(query.lower().split())
-    key_terms = {term for term in query_terms if len(term) > 3}
+    key_terms = _query_key_terms(query)
     
     for source in sources:
-        # Extract title and snippets
-        title = source.title
-        # We'll use the exact_passage from the expanded view
-        snippet_text = source.expanded.exact_passage
+        location, why_it_supports = _describe_source(source.title, source.expanded.exact_passage, query, key_terms)
+        if location:
+            source.expanded.location = location
+        if why_it_supports:
+            source.expanded.why_it_supports = why_it_supports
+    
+    return sources
+
+
+def _query_key_terms(query: str) -> set:
+    """Extract key terms (longer than 3 characters) from the query."""
+    query_terms = set(query.lower().split())
+    return {term for term in query_terms if len(term) > 3}
+
+
+def _describe_source(title: str, snippet_text: str, query: str, key_terms: set):
+    """
+    Determine a more specific location and support justification for a source.
+    
+    Returns:
+        Tuple of (location, why_it_supports); either is None when no more
+        specific value applies and the default should be kept.
+    """
+    location = None
+    why_it_supports = None
+    
+    # Determine a more specific location if possible
+    title_lower = title.lower()
+    if "clinical" in title_lower or "trial" in title_lower:
+        location = "Clinical research findings"
+    elif "review" in title_lower:
+        location = "Literature review"
+    elif "guideline" in title_lower:
+        location = "Clinical guidelines"
+    
+    # Generate a more specific justification
+    snippet_text_lower = snippet_text.lower()
+    query_lower = query.lower()
+    
+    if any(term in snippet_text_lower for term in key_terms):
+        why_it_supports = f"Directly addresses {', '.join(key_terms)} mentioned in the query."
+    elif "treatment" in query_lower and any(term in snippet_text_lower for term in ["treatment", "therapy", "medication"]):
+        why_it_supports = "Provides treatment information relevant to the query."
+    elif "pathophysiology" in query_lower and any(term in snippet_text_lower for term in ["mechanism", "pathology", "cause"]):
+        why_it_supports = "Explains pathophysiological mechanisms relevant to the query."
+    elif "variant" in query_lower and any(term in snippet_text_lower for term in ["variant", "type", "form"]):
+        why_it_supports = "Describes disease variants mentioned in the query."
+    
+    return location, why_it_supports
+
+
+def build_ui_payload(rag_response: RagResponse, query: str) -> Dict[str, Any]:
+    """
+    Build the UI response as plain JSON-ready data in a single pass.
+    
+    Equivalent to format_for_ui followed by enhance_with_metadata and
+    .dict(), but reads the trusted RagResponse directly and creates no
+    intermediate pydantic models, so the result can be serialized once.
+    
+    Args:
+        rag_response: RAG Assistant response from the pipeline
+        query: Original user query
         
-        # Determine a more specific location if possible
-        if "clinical" in title.lower() or "trial" in title.lower():
-            source.expanded.location = "Clinical research findings"
-        elif "review" in title.lower():
-            source.expanded.location = "Literature review"
-        elif "guideline" in title.lower():
-            source.expanded.location = "Clinical guidelines"
+    Returns:
+        Dictionary matching the UIRagResponse schema
+    """
+    sources = rag_response.sources
+    key_terms = _query_key_terms(query)
+    
+    items = []
+    seen_titles = set()
+    for source in sources[:5]:  # Limit to 5 sources
+        # Skip duplicates (by title)
+        if source.title in seen_titles:
+            continue
+        seen_titles.add(source.title)
         
-        # Generate a more specific justification
-        snippet_text_lower = snippet_text.lower()
+        readable_title = make_readable_title(source.title)
+        exact_passage = combine_snippets(source.snippets)
+        location, why_it_supports = _describe_source(readable_title, exact_passage, query, key_terms)
         
-        if any(term in snippet_text_lower for term in key_terms):
-            source.expanded.why_it_supports = f"Directly addresses {', '.join(key_terms)} mentioned in the query."
-        elif "treatment" in query.lower() and any(term in snippet_text_lower for term in ["treatment", "therapy", "medication"]):
-            source.expanded.why_it_supports = "Provides treatment information relevant to the query."
-        elif "pathophysiology" in query.lower() and any(term in snippet_text_lower for term in ["mechanism", "pathology", "cause"]):
-            source.expanded.why_it_supports = "Explains pathophysiological mechanisms relevant to the query."
-        elif "variant" in query.lower() and any(term in snippet_text_lower for term in ["variant", "type", "form"]):
-            source.expanded.why_it_supports = "Describes disease variants mentioned in the query."
+        items.append({
+            "title": readable_title,
+            "source": source.path,
+            "expanded": {
+                "exact_passage": exact_passage,
+                "location": location or "Document excerpt",
+                "why_it_supports": why_it_supports or "Contains relevant information that directly addresses the query."
+            }
+        })
     
-    return sources
+    return {
+        "answer": rag_response.answer,
+        "SOURCES_PANEL": {
+            "title": f"Sources ({min(len(sources), 5)})",
+            "ui": dict(_DEFAULT_UI_SETTINGS),
+            "items": items
+        }
+    }
+
+
+_DEFAULT_UI_SETTINGS = UISettings().model_dump()
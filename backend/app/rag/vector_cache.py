@@ -0,0 +1,209 @@
+"""
+Vector search result cache keyed by query embedding.
+
+Different phrasings of a question often embed close together and retrieve
+the same top-k chunks. This cache sits between the embedder and the vector
+index query: a query embedding is hashed with random-hyperplane LSH, the
+buckets at Hamming distance <= 1 are probed, and the closest cached query
+embedding is verified with an exact cosine. At or above
+VECTOR_CACHE_MIN_COSINE the cached top-k (ids and scores of the cached
+query) is returned without an index round-trip.
+
+Entries are bounded by LRU (VECTOR_CACHE_MAX_ENTRIES) with a TTL, and the
+whole cache is dropped when the graph version changes.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from neo4j_graphrag.retrievers import VectorRetriever
+from neo4j_graphrag.types import RawSearchResult
+
+from app.core.config import settings
+from app.rag.graph_version import get_graph_version
+
+
+class VectorResultCache:
+    """Approximate-key cache from query embeddings to vector search results. Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        min_cosine: float = 0.95,
+        lsh_bits: int = 12,
+        ttl: Optional[float] = 3600.0,
+        version_source: Optional[Callable[[], Optional[str]]] = get_graph_version,
+        seed: int = 0
+    ):
+        self.max_entries = max_entries
+        self.min_cosine = min_cosine
+        self.lsh_bits = lsh_bits
+        self.ttl = ttl
+        self.version_source = version_source
+        self.seed = seed
+        self._planes: Optional[np.ndarray] = None
+        # entry id -> (namespace, signature, unit embedding, value, expires_at)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: Dict[Tuple[Hashable, int], List[int]] = {}
+        self._ids = itertools.count()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._hit_cosine_total = 0.0
+
+    def _unit(self, embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _signature(self, unit: np.ndarray) -> int:
+        if self._planes is None or self._planes.shape[1] != unit.shape[0]:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((self.lsh_bits, unit.shape[0])).astype(np.float32)
+        bits = self._planes @ unit > 0
+        return int(np.dot(bits, 1 << np.arange(self.lsh_bits)))
+
+    def _current_version(self) -> Optional[str]:
+        # May query the graph, so it runs before taking the lock
+        return self.version_source() if self.version_source is not None else None
+
+    def _check_version(self, version: Optional[str]):
+        # Called with the lock held
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                print(f"Vector cache invalidated (graph version {self._version} -> {version})")
+            self._entries.clear()
+            self._buckets.clear()
+            self._version = version
+
+    def _remove(self, entry_id: int):
+        namespace, signature, _unit, _value, _expires = self._entries.pop(entry_id)
+        bucket = self._buckets.get((namespace, signature))
+        if bucket is not None:
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[(namespace, signature)]
+
+    def get(self, embedding: Sequence[float], namespace: Hashable = None) -> Optional[Any]:
+        """Return the cached result for a nearby query embedding, or None."""
+        unit = self._unit(embedding)
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            signature = self._signature(unit)
+            probes = [signature] + [signature ^ (1 << bit) for bit in range(self.lsh_bits)]
+            now = time.monotonic()
+            best_id, best_cosine = None, self.min_cosine
+            for probe in probes:
+                for entry_id in list(self._buckets.get((namespace, probe), ())):
+                    _ns, _sig, cached_unit, _value, expires_at = self._entries[entry_id]
+                    if expires_at is not None and expires_at <= now:
+                        self._remove(entry_id)
+                        continue
+                    cosine = float(np.dot(cached_unit, unit))
+                    if cosine >= best_cosine:
+                        best_id, best_cosine = entry_id, cosine
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self._hit_cosine_total += best_cosine
+            return self._entries[best_id][3]
+
+    def put(self, embedding: Sequence[float], value: Any, namespace: Hashable = None):
+        """Cache the result computed for this query embedding."""
+        unit = self._unit(embedding)
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            signature = self._signature(unit)
+            entry_id = next(self._ids)
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[entry_id] = (namespace, signature, unit, value, expires_at)
+            self._buckets.setdefault((namespace, signature), []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters for metrics endpoints."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_cosine": round(self._hit_cosine_total / self.hits, 4) if self.hits else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "graph_version": self._version,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_vector_cache() -> Optional[VectorResultCache]:
+    """Return the process-wide vector result cache, or None when disabled."""
+    global _cache
+    if not settings.VECTOR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = VectorResultCache(
+                    max_entries=settings.VECTOR_CACHE_MAX_ENTRIES,
+                    min_cosine=settings.VECTOR_CACHE_MIN_COSINE,
+                    lsh_bits=settings.VECTOR_CACHE_LSH_BITS,
+                    ttl=settings.VECTOR_CACHE_TTL_SECONDS
+                )
+    return _cache
+
+
+def get_vector_cache_metrics() -> Optional[Dict[str, Any]]:
+    """Return vector cache metrics, or None before first use."""
+    return _cache.stats() if _cache is not None else None
+
+
+class CachedVectorRetriever(VectorRetriever):
+    """
+    VectorRetriever that embeds the query itself and serves the index
+    query from the vector result cache when a nearby query is cached.
+    """
+
+    def get_search_results(self, query_vector=None, query_text=None, top_k: int = 5,
+                           effective_search_ratio: int = 1, filters=None) -> RawSearchResult:
+        cache = get_vector_cache()
+        if cache is None or filters:
+            # A precomputed vector (e.g. from a batched request) replaces the text
+            if query_vector is not None:
+                query_text = None
+            return super().get_search_results(query_vector, query_text, top_k, effective_search_ratio, filters)
+        if query_vector is None and query_text:
+            query_vector = self.embedder.embed_query(query_text)
+        namespace = ("vector", self.index_name, tuple(self.return_properties or ()), top_k, effective_search_ratio)
+        records = cache.get(query_vector, namespace)
+        if records is None:
+            result = super().get_search_results(query_vector=query_vector, top_k=top_k,
+                                                effective_search_ratio=effective_search_ratio)
+            cache.put(query_vector, result.records, namespace)
+            return result
+        return RawSearchResult(records=records, metadata={"query_vector": query_vector, "cache": "hit"})
@@ -57,6 +57,18 @@ class Conversation(ConversationBase):
         from_attributes = True  # Updated from orm_mode in Pydantic v2
 
 
+class ConversationSummary(ConversationBase):
+    """Lightweight conversation listing entry (no message bodies)."""
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    last_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True  # Updated from orm_mode in Pydantic v2
+
+
 class QueryRequest(BaseModel):
     query: str
     conversation_id: Optional[int] = None
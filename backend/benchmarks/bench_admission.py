@@ -0,0 +1,100 @@
+"""
+Simulate an overload of the query endpoints with and without admission control.
+
+Requests arrive at a fixed rate above what a simulated downstream (LLM +
+retrieval) can serve. The downstream's latency grows with the number of
+requests in flight beyond its capacity, like a saturated API. Clients give
+up after `--client-timeout`. Reports goodput (answers delivered before the
+client gave up), fast 503s, p50 latency and peak in-flight requests for:
+no admission control, a fixed limit and the adaptive (AIMD) limit.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_admission --rate 60 --duration 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import HTTPException
+
+from app.core.admission import AdmissionController
+
+
+class Downstream:
+    def __init__(self, capacity: int, base_latency: float):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.in_flight = 0
+        self.peak = 0
+
+    async def call(self):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            # Fair-share slowdown once over capacity
+            await asyncio.sleep(self.base_latency * max(1.0, self.in_flight / self.capacity))
+        finally:
+            self.in_flight -= 1
+
+
+async def run(controller, args):
+    downstream = Downstream(args.capacity, args.base_latency)
+    results = {"ok": [], "late": 0, "shed": 0}
+
+    async def request():
+        start = time.monotonic()
+        try:
+            if controller is None:
+                await downstream.call()
+            else:
+                async with controller.admit():
+                    await downstream.call()
+        except HTTPException:
+            results["shed"] += 1
+            return
+        latency = time.monotonic() - start
+        if latency <= args.client_timeout:
+            results["ok"].append(latency)
+        else:
+            results["late"] += 1
+
+    tasks = []
+    interval = 1.0 / args.rate
+    for _ in range(int(args.rate * args.duration)):
+        tasks.append(asyncio.ensure_future(request()))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return results, downstream.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=60, help="arrivals per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--capacity", type=int, default=20, help="downstream concurrency before slowing down")
+    parser.add_argument("--base-latency", type=float, default=0.5)
+    parser.add_argument("--client-timeout", type=float, default=3.0)
+    args = parser.parse_args()
+
+    modes = {
+        "none": None,
+        "fixed": AdmissionController("fixed", limit=args.capacity, max_queue=args.capacity * 2,
+                                     queue_timeout=args.client_timeout / 2),
+        "adaptive": AdmissionController("adaptive", limit=args.capacity * 4, max_queue=args.capacity * 2,
+                                        queue_timeout=args.client_timeout / 2, adaptive=True, min_limit=2,
+                                        max_limit=args.capacity * 4, latency_target=args.base_latency * 1.5),
+    }
+    total = int(args.rate * args.duration)
+    print(f"{total} requests at {args.rate:.0f}/s, downstream capacity {args.capacity} "
+          f"x {args.base_latency * 1000:.0f} ms, client timeout {args.client_timeout:.1f}s")
+    print(f"{'mode':<10}{'goodput':>9}{'late':>7}{'503s':>7}{'p50 s':>8}{'peak':>7}{'limit':>7}")
+    for name, controller in modes.items():
+        results, peak = asyncio.run(run(controller, args))
+        p50 = statistics.median(results["ok"]) if results["ok"] else float("nan")
+        limit = controller.limit if controller is not None else "-"
+        print(f"{name:<10}{len(results['ok']):>9}{results['late']:>7}{results['shed']:>7}{p50:>8.2f}{peak:>7}{limit:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure request latency during a dependency outage with and without a circuit breaker.
+
+A simulated dependency is down: every call blocks for `--connect-timeout`
+(as a driver waiting for a connection) and then fails. Requests arrive from
+`--workers` threads, like the API's worker pool. Without a breaker every
+request holds its worker for the full timeout; with one, the breaker opens
+after `--min-calls` failures and the rest fail immediately. Reports p50/p99
+latency, total worker-seconds held and wall time.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_circuit_breaker --requests 200 --workers 16
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.circuit_breaker import CircuitBreaker, DependencyUnavailableError
+
+
+class DownDependency:
+    def __init__(self, connect_timeout: float):
+        self.connect_timeout = connect_timeout
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        time.sleep(self.connect_timeout)
+        raise ConnectionError("connection refused")
+
+
+def run(breaker, args):
+    dependency = DownDependency(args.connect_timeout)
+
+    def request():
+        start = time.perf_counter()
+        try:
+            if breaker is None:
+                dependency.call()
+            else:
+                with breaker.guard():
+                    dependency.call()
+        except (ConnectionError, DependencyUnavailableError):
+            pass
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        latencies = list(pool.map(lambda _: request(), range(args.requests)))
+    return sorted(latencies), time.perf_counter() - start, dependency.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--connect-timeout", type=float, default=0.5)
+    parser.add_argument("--min-calls", type=int, default=5)
+    args = parser.parse_args()
+
+    modes = {
+        "none": None,
+        "breaker": CircuitBreaker("dependency", minimum_calls=args.min_calls, open_seconds=60),
+    }
+    print(f"{args.requests} requests on {args.workers} workers, dependency down "
+          f"({args.connect_timeout * 1000:.0f} ms per failed call)")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'worker-s':>10}{'wall s':>8}{'calls':>7}")
+    for name, breaker in modes.items():
+        latencies, wall, calls = run(breaker, args)
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"{name:<10}{p50:>10.3f}{p99:>10.1f}{sum(latencies):>10.1f}{wall:>8.2f}{calls:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark micro-batched query embeddings against one request per query.
+
+Concurrent callers embed distinct queries through ScheduledOpenAIEmbeddings
+backed by a fake embeddings client. The client costs a fixed round-trip
+plus a small per-input time and allows a limited number of in-flight
+requests, like a connection/rate-limited API. Reports API requests made,
+throughput and p50/p95 caller latency with batching off and on.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_embedding_batching --callers 64 --requests 512
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from app.rag.embeddings import EmbeddingBatcher, ScheduledOpenAIEmbeddings
+
+
+class FakeEmbeddingsClient:
+    def __init__(self, round_trip_ms: float, per_input_ms: float, max_in_flight: int):
+        self.round_trip = round_trip_ms / 1000
+        self.per_input = per_input_ms / 1000
+        self.slots = threading.Semaphore(max_in_flight)
+        self.requests = 0
+        self.embeddings = SimpleNamespace(create=self.create)
+
+    def create(self, input, model, **kwargs):
+        texts = [input] if isinstance(input, str) else input
+        with self.slots:
+            self.requests += 1
+            time.sleep(self.round_trip + self.per_input * len(texts))
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(texts)]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=8 * len(texts)))
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run(embedder, callers: int, requests: int):
+    latencies = []
+
+    def call(i):
+        t0 = time.perf_counter()
+        vector = embedder.embed_query(f"query {i}")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert vector == [float(len(f"query {i}"))]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(call, range(requests)))
+    return time.perf_counter() - t0, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--round-trip-ms", type=float, default=60)
+    parser.add_argument("--per-input-ms", type=float, default=0.2)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.requests} queries from {args.callers} concurrent callers, "
+          f"{args.round_trip_ms:.0f} ms round trip, {args.max_in_flight} requests in flight")
+    print(f"{'mode':<10}{'API calls':>10}{'q/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode in ("single", "batched"):
+        embedder = ScheduledOpenAIEmbeddings(api_key="sk-bench", max_retries=0)
+        embedder.client = FakeEmbeddingsClient(args.round_trip_ms, args.per_input_ms, args.max_in_flight)
+        embedder.batcher = (
+            EmbeddingBatcher(embedder.embed_batch, window_ms=args.window_ms, max_batch_size=args.max_batch)
+            if mode == "batched" else None
+        )
+        elapsed, latencies = run(embedder, args.callers, args.requests)
+        print(f"{mode:<10}{embedder.client.requests:>10}{args.requests / elapsed:>9.0f}"
+              f"{statistics.median(latencies):>9.1f}{_percentile(latencies, 95):>9.1f}")
+        if embedder.batcher is not None:
+            print(f"batcher: {embedder.batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
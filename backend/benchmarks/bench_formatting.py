@@ -0,0 +1,70 @@
+"""
+Benchmark response-formatting CPU per request: legacy string round-trip vs
+structured retrieval hits.
+
+The legacy path rebuilt each source as
+    chunk_sources='<path>' truncated_chunk_texts='<text>'
+and regex-reparsed it in format_rag_response. The structured path builds
+the RagResponse directly from RetrievalHit objects. Passages contain
+apostrophes, which the legacy quoting mangled.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_formatting --sources 5 --chars 1000
+"""
+import argparse
+import time
+
+from app.rag.hits import RetrievalHit
+from app.rag.rag_assistant import build_rag_response, format_rag_response
+
+PASSAGE = (
+    "Dupilumab's efficacy in adults with eosinophilic esophagitis was shown in a "
+    "randomized trial. Patients' dysphagia scores improved and the drug's safety "
+    "profile was consistent with other indications. "
+)
+
+
+def make_hits(count: int, chars: int):
+    text = (PASSAGE * (chars // len(PASSAGE) + 1))[:chars]
+    return [RetrievalHit(source_path=f"/papers/Study {i} of EoE.pdf", text=text, score=0.9) for i in range(count)]
+
+
+def legacy_format(answer: str, hits):
+    class DummyItem:
+        def __init__(self, path, content):
+            self.content = f"chunk_sources='{path}' truncated_chunk_texts='{content}'"
+    items = [DummyItem(hit.source_path, hit.text) for hit in hits]
+    return format_rag_response(answer, items, "hybrid")
+
+
+def _per_request_us(fn, iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--chars", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    hits = make_hits(args.sources, args.chars)
+    answer = "Dupilumab is approved for eosinophilic esophagitis."
+
+    legacy = legacy_format(answer, hits)
+    structured = build_rag_response(answer, hits)
+    legacy_us = _per_request_us(lambda: legacy_format(answer, hits), args.iterations)
+    structured_us = _per_request_us(lambda: build_rag_response(answer, hits), args.iterations)
+
+    print(f"{args.sources} sources x {args.chars} chars, {args.iterations} iterations")
+    print(f"{'path':<12}{'us/request':>12}{'sources':>10}{'snippet chars':>16}")
+    for name, us, response in (("legacy", legacy_us, legacy), ("structured", structured_us, structured)):
+        snippet_chars = sum(len(s) for source in response.sources for s in source.snippets)
+        print(f"{name:<12}{us:>12.1f}{len(response.sources):>10}{snippet_chars:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Measure chunk expansion from the CSR graph snapshot and check its parity.
+
+Builds a synthetic entity graph (hub entities included), exports it with
+GraphSnapshot.build, saves it and loads it memory-mapped. Then expands
+random top-k seed sets and reports time per expansion, load time and the
+size on disk. The records are compared with an independent list-based
+implementation of the CHUNK_RETRIEVAL_QUERY walk.
+
+With --neo4j N it checks parity against a live database instead: N random
+chunks from the snapshot at --path (default GRAPH_SNAPSHOT_PATH) are walked
+both in the snapshot and with NEIGHBORHOOD_QUERY, and their full
+relationship text sets are compared (uncapped, since capped neighborhoods
+depend on storage order).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_graph_snapshot --chunks 20000 --entities 20000
+    python -m benchmarks.bench_graph_snapshot --neo4j 200 --path /app/data/graph_snapshot
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from app.core.config import settings
+from app.rag.hits import CYPHER_JOIN_SEPARATOR
+from app.rag.graph_snapshot import GraphSnapshot
+from app.rag.neighborhood_cache import (
+    MAX_CHUNK_CHARS, MAX_CHUNKS, MAX_RELATIONSHIPS, combine_neighborhoods, fetch_neighborhoods
+)
+
+UNCAPPED = 1_000_000
+
+
+def synthetic_graph(rng, n_chunks, n_entities, n_rels):
+    nodes = [(f"e{i}", f"Entity{i}" if i % 97 else None) for i in range(n_entities)]
+    hub_weights = list(itertools.accumulate(1.0 / (i + 1) ** 0.8 for i in range(n_entities)))
+    relationships = []
+    for _ in range(n_rels):
+        start, end = rng.choices(range(n_entities), cum_weights=hub_weights, k=2)
+        details = rng.choice([None, "phase 3", "first-line", "off-label"])
+        relationships.append((f"e{start}", f"e{end}", rng.choice(["TREATS", "CAUSES", "ASSOCIATED_WITH"]), details))
+    chunks = [(f"c{i}", f"chunk {i} " + "text " * rng.randint(50, 400), f"/docs/doc{i // 5}.pdf")
+              for i in range(n_chunks)]
+    memberships = [(f"c{i}", f"e{entity}") for i in range(n_chunks)
+                   for entity in rng.sample(range(n_entities), rng.randint(0, 4))]
+    return nodes, relationships, chunks, memberships
+
+
+class ReferenceWalk:
+    """The retrieval query's aggregation, walked over plain Python dicts and lists."""
+
+    def __init__(self, graph):
+        nodes, self.relationships, chunks, memberships = graph
+        self.names = dict(nodes)
+        self.chunks = {chunk_id: (text, source) for chunk_id, text, source in chunks}
+        self.adjacency = {}
+        for rel, (start, end, _type, _details) in enumerate(self.relationships):
+            self.adjacency.setdefault(start, []).append(rel)
+            if end != start:
+                self.adjacency.setdefault(end, []).append(rel)
+        self.entities = {}
+        for chunk_id, entity in memberships:
+            self.entities.setdefault(chunk_id, []).append(entity)
+
+    def rel_text(self, rel):
+        start, end, rel_type, details = self.relationships[rel]
+        if self.names[start] is None or self.names[end] is None:
+            return None
+        return f"{self.names[start]} - {rel_type}({details or ''}) -> {self.names[end]}"
+
+    def path_rels(self, chunk_id):
+        for entity in self.entities.get(chunk_id, []):
+            for first in self.adjacency.get(entity, []):
+                yield first
+                start, end = self.relationships[first][0], self.relationships[first][1]
+                far = end if start == entity else start
+                for second in self.adjacency.get(far, []):
+                    if second != first:
+                        yield second
+
+    def records(self, ids):
+        # Chunks without any path drop out of the aggregation
+        kept_chunks = [chunk_id for chunk_id in dict.fromkeys(ids)
+                       if any(self.adjacency.get(entity) for entity in self.entities.get(chunk_id, []))][:MAX_CHUNKS]
+        if not kept_chunks:
+            return []
+        # collect(DISTINCT rel)[0..20] over the paths of all seeds
+        rels = {}
+        for rel in (rel for chunk_id in ids for rel in self.path_rels(chunk_id)):
+            rels.setdefault(rel)
+            if len(rels) == MAX_RELATIONSHIPS:
+                break
+        texts = [self.rel_text(rel) for rel in rels]
+        return [{
+            "truncated_chunk_texts": CYPHER_JOIN_SEPARATOR.join(
+                self.chunks[c][0][:MAX_CHUNK_CHARS] for c in kept_chunks),
+            "chunk_sources": CYPHER_JOIN_SEPARATOR.join(self.chunks[c][1] for c in kept_chunks),
+            "truncated_relationship_texts": CYPHER_JOIN_SEPARATOR.join(text for text in texts if text is not None),
+            "chunk_ids": kept_chunks,
+        }]
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run_synthetic(args):
+    rng = random.Random(13)
+    graph = synthetic_graph(rng, args.chunks, args.entities, args.rels)
+    start = time.perf_counter()
+    snapshot = GraphSnapshot.build(*graph, version="bench")
+    build_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as path:
+        snapshot.save(path)
+        size_mb = directory_size(path) / 1024 / 1024
+        start = time.perf_counter()
+        snapshot = GraphSnapshot.load(path, max_fanout=0)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        reference = ReferenceWalk(graph)
+        chunk_ids = [chunk_id for chunk_id, _text, _source in graph[2]]
+        seed_sets = [rng.sample(chunk_ids, args.top_k) for _ in range(args.queries)]
+        timings = []
+        mismatches = 0
+        for ids in seed_sets:
+            start = time.perf_counter()
+            records, _missing = snapshot.expand(ids)
+            timings.append(time.perf_counter() - start)
+            expected = reference.records(ids)
+            # The per-chunk path (used when some seeds aren't in the snapshot) must agree too
+            combined = combine_neighborhoods(ids, snapshot.neighborhoods(ids)[0])
+            mismatches += [dict(record) for record in records] != expected
+            mismatches += [dict(record) for record in combined] != expected
+
+    timings.sort()
+    print(f"chunks={args.chunks} entities={args.entities} rels={args.rels} queries={args.queries} top_k={args.top_k}")
+    print(f"build {build_s:.1f}s, {size_mb:.1f} MB on disk, mmap load {load_ms:.1f} ms")
+    print(f"expansion of {args.top_k} seeds: p50 {timings[len(timings) // 2] * 1e6:.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us")
+    print(f"records matching the reference walk: {2 * args.queries - mismatches}/{2 * args.queries} "
+          f"(expand and per-chunk combine)")
+
+
+def run_neo4j(args):
+    from app.rag.neo4j import close_shared_driver, get_shared_driver
+
+    snapshot = GraphSnapshot.load(args.path, max_fanout=0)
+    driver = get_shared_driver()
+    ids = random.Random(13).sample(snapshot.chunk_ids, min(args.neo4j, len(snapshot)))
+    expected = fetch_neighborhoods(driver, ids, max_rels=UNCAPPED)
+    actual, _missing = snapshot.neighborhoods(ids, max_rels=UNCAPPED)
+    mismatched = [
+        chunk_id for chunk_id in ids
+        if chunk_id not in expected
+        or Counter(text for _id, text in actual[chunk_id].relationships)
+        != Counter(text for _id, text in expected[chunk_id].relationships)
+        or actual[chunk_id].source != expected[chunk_id].source
+    ]
+    print(f"snapshot version {snapshot.version}; {len(ids) - len(mismatched)}/{len(ids)} chunk neighborhoods "
+          f"match Neo4j")
+    for chunk_id in mismatched[:10]:
+        print(f"  mismatch: {chunk_id}")
+    close_shared_driver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--rels", type=int, default=60000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--neo4j", type=int, default=0, help="check N chunks against a live database")
+    parser.add_argument("--path", default=settings.GRAPH_SNAPSHOT_PATH)
+    args = parser.parse_args()
+    if args.neo4j:
+        run_neo4j(args)
+    else:
+        run_synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
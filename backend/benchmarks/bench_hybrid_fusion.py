@@ -0,0 +1,90 @@
+"""
+Benchmark client-side fusion retrieval against the built-in HybridCypherRetriever.
+
+Runs each query through both retrievers against the configured Neo4j and
+OpenAI settings and reports p50/p95 latency plus recall of the fusion
+retriever's chunk sources relative to the built-in hybrid results.
+
+Usage (from the backend directory, with NEO4J_* and OPENAI_API_KEY set):
+    python -m benchmarks.bench_hybrid_fusion --repeat 3
+    python -m benchmarks.bench_hybrid_fusion --method weighted --queries-file queries.txt
+"""
+import argparse
+import statistics
+import time
+
+from app.rag.embeddings import get_embedder
+from app.rag.hits import hits_from_items
+from app.rag.neo4j import get_shared_driver, close_shared_driver
+from app.rag.reference_rag import ReferenceDocumentRetriever
+from app.rag.scheduler import priority_lane
+
+DEFAULT_QUERIES = [
+    "What is eosinophilic esophagitis?",
+    "What role does IL-13 play in EoE pathogenesis?",
+    "Which therapies are FDA approved for eosinophilic esophagitis?",
+    "How effective is dupilumab in adults with EoE?",
+    "What are the EoE endotypes?",
+    "Does TSLP risk allele affect food allergen triggers?",
+    "How is eosinophilic gastritis treated with benralizumab?",
+    "What is the clinical severity index for EoE?",
+]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _sources(result):
+    return {hit.source_path for hit in hits_from_items(result.items)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries-file", help="One query per line")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--method", choices=["rrf", "weighted"], default=None)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    driver = get_shared_driver()
+    embedder = get_embedder()
+    # Both go through ReferenceDocumentRetriever so queries are sanitized identically
+    builtin = ReferenceDocumentRetriever(driver, embedder, retriever_type="hybrid").retriever
+    fusion_retriever = ReferenceDocumentRetriever(driver, embedder, retriever_type="fusion")
+    if args.method:
+        fusion_retriever.retriever.method = args.method
+    fusion = fusion_retriever.retriever
+
+    latencies = {"builtin": [], "fusion": []}
+    recalls = []
+    # Embedding calls queue behind interactive traffic when run against a live deployment
+    with priority_lane("batch"):
+        for query in queries:
+            results = {}
+            for name, retriever in (("builtin", builtin), ("fusion", fusion)):
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    results[name] = retriever.search(query_text=query, top_k=args.top_k)
+                    latencies[name].append((time.perf_counter() - t0) * 1000)
+            expected = _sources(results["builtin"])
+            if expected:
+                recalls.append(len(expected & _sources(results["fusion"])) / len(expected))
+
+    print(f"{len(queries)} queries x {args.repeat} runs, top_k={args.top_k}, method={fusion.method}")
+    print(f"{'retriever':<10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, values in latencies.items():
+        print(f"{name:<10}{statistics.median(values):>10.1f}{_percentile(values, 95):>10.1f}")
+    if recalls:
+        print(f"fusion recall of built-in hybrid sources: {statistics.mean(recalls):.2f}")
+    close_shared_driver()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark LLM gateway hedging and failover against local fake OpenAI-compatible servers.
+
+Each fake server answers POST /v1/chat/completions after an injected
+latency: mostly `--base-ms` (+/- 50%), with `--tail-rate` of requests taking
+`--tail-ms` (a long tail like a busy deployment). A "down" server answers 500.
+The real OpenAI client talks to them over HTTP, so the full request path
+(scheduler, breaker, client timeouts) is exercised.
+
+Scenarios: a single endpoint without hedging, the same with hedging, and
+failover from a down primary to a fallback endpoint. Reports p50/p95/p99,
+the extra requests hedging sent, and failovers.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_llm_gateway --requests 400 --clients 16
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.rag.llm_gateway import LLMEndpoint, LLMGateway
+from app.rag.scheduler import OpenAIScheduler
+
+
+def start_fake_server(base_ms: float, tail_rate: float, tail_ms: float, down: bool = False,
+                      model_base_ms=None, reply=None):
+    """
+    Start a fake chat completions server; returns (server, base_url).
+
+    `model_base_ms` overrides the base latency per model and `reply(body)`
+    the answer text (default: "answer from <model>").
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = 0
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            Handler.requests += 1
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if down:
+                payload, status = {"error": {"message": "upstream unavailable", "type": "server_error"}}, 500
+            else:
+                model_ms = (model_base_ms or {}).get(body["model"], base_ms)
+                latency = tail_ms if random.random() < tail_rate else model_ms * random.uniform(0.5, 1.5)
+                time.sleep(latency / 1000)
+                status = 200
+                payload = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": reply(body) if reply else f"answer from {body['model']}",
+                        },
+                    }],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                }
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.handler = Handler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def make_endpoint(name: str, model: str, base_url: str) -> LLMEndpoint:
+    client = OpenAI(api_key="sk-fake", base_url=base_url, max_retries=0)
+    scheduler = OpenAIScheduler(
+        name, requests_per_minute=0, tokens_per_minute=0, max_concurrency=64,
+        max_retries=1, backoff_base=0.01, breaker=CircuitBreaker(name, minimum_calls=5)
+    )
+    return LLMEndpoint(name, model, client, scheduler)
+
+
+def run(gateway: LLMGateway, args):
+    messages = [{"role": "user", "content": "What are the treatment options?"}]
+
+    def request(_):
+        start = time.perf_counter()
+        gateway.complete(messages, estimated_tokens=15)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        latencies = sorted(pool.map(request, range(args.requests)))
+    return latencies
+
+
+def report(name: str, latencies, gateway: LLMGateway):
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+    extra = gateway.hedges / gateway.requests * 100
+    print(f"{name:<14}{statistics.median(latencies) * 1000:>9.0f}{pct(95):>9.0f}{pct(99):>9.0f}"
+          f"{extra:>9.1f}%{gateway.hedge_wins:>7}{gateway.failovers:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--base-ms", type=float, default=80)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-ms", type=float, default=1500)
+    parser.add_argument("--budget", type=float, default=0.1, help="hedges per request")
+    args = parser.parse_args()
+
+    _primary_server, primary_url = start_fake_server(args.base_ms, args.tail_rate, args.tail_ms)
+    _down_server, down_url = start_fake_server(args.base_ms, 0, 0, down=True)
+    _fallback_server, fallback_url = start_fake_server(args.base_ms, args.tail_rate, args.tail_ms)
+
+    hedge_options = dict(hedge_min_delay=0.05, hedge_initial_delay=0.5, hedge_min_samples=20,
+                         hedge_budget_ratio=args.budget)
+    scenarios = {
+        "no hedging": LLMGateway([make_endpoint("primary", "gpt-4o", primary_url)], hedging=False),
+        "hedging": LLMGateway([make_endpoint("primary", "gpt-4o", primary_url)], hedging=True, **hedge_options),
+        "failover": LLMGateway([make_endpoint("down", "gpt-4o", down_url),
+                                make_endpoint("fallback", "gpt-4o-mini", fallback_url)], hedging=False),
+    }
+    print(f"{args.requests} requests from {args.clients} clients; latency {args.base_ms:.0f} ms, "
+          f"{args.tail_rate * 100:.0f}% at {args.tail_ms:.0f} ms; hedge budget {args.budget * 100:.0f}%")
+    print(f"{'scenario':<14}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'hedged':>10}{'wins':>7}{'failovers':>10}")
+    for name, gateway in scenarios.items():
+        report(name, run(gateway, args), gateway)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark login throughput with bcrypt on the event loop vs the password pool.
+
+Simulates a login storm of N concurrent password verifications and reports
+logins/second plus event-loop stall (the worst delay of a 10 ms heartbeat
+coroutine), which is what other requests on the same worker experience.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_login --logins 64 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+async def _heartbeat(stop: asyncio.Event, delays: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        delays.append(time.perf_counter() - t0 - 0.01)
+
+
+async def _storm(verify, logins: int):
+    stop = asyncio.Event()
+    delays = []
+    beat = asyncio.create_task(_heartbeat(stop, delays))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await beat
+    return elapsed, max(delays) if delays else elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.logins)
+    from app.core import security
+
+    hashed = security.get_password_hash("correct horse battery staple")
+
+    async def inline_verify():
+        return security.verify_and_update_password("correct horse battery staple", hashed)
+
+    async def pooled_verify():
+        return await security.verify_and_update_password_async("correct horse battery staple", hashed)
+
+    print(f"{args.logins} concurrent logins, bcrypt rounds={args.rounds}, pool workers={args.workers}")
+    print(f"{'mode':<12}{'total s':>10}{'logins/s':>12}{'max loop stall ms':>20}")
+    for name, verify in (("inline", inline_verify), ("pooled", pooled_verify)):
+        elapsed, stall = asyncio.run(_storm(verify, args.logins))
+        print(f"{name:<12}{elapsed:>10.2f}{args.logins / elapsed:>12.1f}{stall * 1000:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Compare answer latency and cost with and without the model cascade.
+
+Runs ReferenceLLMHandler over a mix of questions (definitions and lookups
+with small, confident retrievals; complex clinical questions with larger
+contexts) against a local fake OpenAI-compatible server where the fast
+model answers in `--fast-ms` and the strong model in `--strong-ms`. A share
+of fast answers (`--fast-miss-rate`) say the context doesn't cover the
+question, exercising escalation. Cost uses per-1M-token prices.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_model_router --questions 200
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from openai import OpenAI
+
+from app.rag.llm_gateway import LLMEndpoint, LLMGateway
+from app.rag.model_router import ModelRouter
+from app.rag.reference_rag import ReferenceLLMHandler
+from app.rag.scheduler import OpenAIScheduler, estimate_tokens
+from benchmarks.bench_llm_gateway import start_fake_server
+
+SIMPLE = [
+    "What is hypertension?",
+    "What does HbA1c stand for?",
+    "Define tachycardia",
+    "Which hormone regulates blood glucose?",
+]
+COMPLEX = [
+    "Compare first-line treatments for type 2 diabetes in elderly patients",
+    "Why should ACE inhibitors be avoided in pregnancy and what are the alternatives?",
+    "What dose adjustments are needed for metformin in renal impairment?",
+]
+CHUNK = "Hypertension is a condition in which blood pressure is persistently elevated. " * 6
+# Per 1M input tokens (USD)
+PRICES = {"gpt-4o": 2.50, "gpt-4o-mini": 0.15}
+
+
+class FakeRetriever:
+    def __init__(self, chunks: int, score: float):
+        self.chunks = chunks
+        self.score = score
+
+    def search(self, query_text, **kwargs):
+        items = [
+            SimpleNamespace(content=CHUNK, metadata={"score": self.score - i * 0.01, "hits": []})
+            for i in range(self.chunks)
+        ]
+        return SimpleNamespace(items=items, metadata={})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--simple-share", type=float, default=0.5)
+    parser.add_argument("--fast-ms", type=float, default=150)
+    parser.add_argument("--strong-ms", type=float, default=600)
+    parser.add_argument("--fast-miss-rate", type=float, default=0.1)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    def reply(body):
+        if body["model"] == "gpt-4o-mini" and random.random() < args.fast_miss_rate:
+            return "The context does not mention this."
+        return f"Answer from {body['model']}."
+
+    _server, url = start_fake_server(
+        args.strong_ms, 0, 0, model_base_ms={"gpt-4o-mini": args.fast_ms, "gpt-4o": args.strong_ms}, reply=reply
+    )
+    scheduler = OpenAIScheduler("bench", requests_per_minute=0, tokens_per_minute=0, max_concurrency=64)
+    endpoint = LLMEndpoint("primary", "gpt-4o", OpenAI(api_key="sk-fake", base_url=url, max_retries=0), scheduler)
+    gateway = LLMGateway([endpoint], hedging=False)
+
+    random.seed(7)
+    workload = []
+    for _ in range(args.questions):
+        if random.random() < args.simple_share:
+            workload.append((random.choice(SIMPLE), FakeRetriever(chunks=2, score=0.92)))
+        else:
+            workload.append((random.choice(COMPLEX), FakeRetriever(chunks=8, score=0.8)))
+
+    print(f"{args.questions} questions, {args.simple_share * 100:.0f}% simple; fast {args.fast_ms:.0f} ms, "
+          f"strong {args.strong_ms:.0f} ms, {args.fast_miss_rate * 100:.0f}% fast misses")
+    print(f"{'router':<10}{'p50 ms':>9}{'mean ms':>9}{'p95 ms':>9}{'fast':>6}{'strong':>8}{'escal.':>8}{'cost $':>9}")
+    for enabled in (False, True):
+        router = ModelRouter(fast_model="gpt-4o-mini", strong_model="gpt-4o", enabled=enabled)
+        cost = {"total": 0.0}
+
+        def answer(question_retriever):
+            question, retriever = question_retriever
+            handler = ReferenceLLMHandler(retriever=retriever, gateway=gateway, router=router)
+            generate = handler._generate_completion
+
+            def priced(messages, use_history=False, model=None):
+                tokens = sum(estimate_tokens(message["content"]) for message in messages)
+                cost["total"] += tokens * PRICES[model or "gpt-4o"] / 1e6
+                return generate(messages, use_history, model)
+
+            handler._generate_completion = priced
+            start = time.perf_counter()
+            handler.query(question)
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            latencies = sorted(pool.map(answer, workload))
+        stats = router.stats()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        print(f"{'on' if enabled else 'off':<10}{statistics.median(latencies) * 1000:>9.0f}"
+              f"{statistics.mean(latencies) * 1000:>9.0f}{p95:>9.0f}{stats['tiers']['fast']['requests']:>6}"
+              f"{stats['tiers']['strong']['requests']:>8}{stats['escalations']:>8}{cost['total']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Measure cached chunk expansion against the per-query Cypher walk.
+
+A synthetic graph stands in for Neo4j: each chunk has a set of
+relationships, and a graph walk costs `--rtt-ms` per query plus
+`--walk-ms` per seed chunk. Seed chunks are drawn with Zipf-like
+popularity, so a few chunks (guidelines, landmark trials) are seeds of
+most queries. "cypher" walks every seed on every query, as
+CHUNK_RETRIEVAL_QUERY does; "cached" walks only cache misses via
+`UNWIND $ids`. Reports the neighborhood hit rate, the chunk walks sent
+to the database, mean expansion latency and whether the combined records
+match a reference implementation of the Cypher aggregation.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_neighborhood_cache --queries 2000 --chunks 20000
+"""
+import argparse
+import random
+import time
+
+from app.rag.hits import CYPHER_JOIN_SEPARATOR
+from app.rag.neighborhood_cache import (
+    MAX_CHUNK_CHARS, MAX_CHUNKS, MAX_RELATIONSHIPS, NeighborhoodCache, expand_chunks
+)
+
+
+class FakeGraphDriver:
+    """Answers NEIGHBORHOOD_QUERY from an in-memory graph with simulated latency."""
+
+    def __init__(self, graph, rtt_ms, walk_ms):
+        self.graph = graph
+        self.rtt_ms = rtt_ms
+        self.walk_ms = walk_ms
+        self.walks = 0
+
+    def execute_query(self, query, parameters=None, **kwargs):
+        ids = parameters["ids"]
+        self.walks += len(ids)
+        time.sleep((self.rtt_ms + self.walk_ms * len(ids)) / 1000)
+        records = [
+            {"id": chunk_id, "text": text, "source": source, "rels": [list(rel) for rel in rels[:parameters["max_rels"]]]}
+            for chunk_id in ids
+            for text, source, rels in [self.graph[chunk_id]]
+        ]
+        return records, None, None
+
+
+def cypher_reference(graph, ids):
+    """The CHUNK_RETRIEVAL_QUERY aggregation over the seed chunks."""
+    chunks, rels = [], []
+    for chunk_id in ids:
+        text, source, chunk_rels = graph[chunk_id]
+        if not chunk_rels:
+            continue
+        if chunk_id not in [c[0] for c in chunks]:
+            chunks.append((chunk_id, text, source))
+        for rel in chunk_rels:
+            if rel not in rels:
+                rels.append(rel)
+    if not chunks:
+        return []
+    chunks, rels = chunks[:MAX_CHUNKS], rels[:MAX_RELATIONSHIPS]
+    return [{
+        "truncated_chunk_texts": CYPHER_JOIN_SEPARATOR.join(text[:MAX_CHUNK_CHARS] for _id, text, _source in chunks),
+        "chunk_sources": CYPHER_JOIN_SEPARATOR.join(source for _id, _text, source in chunks),
+        "truncated_relationship_texts": CYPHER_JOIN_SEPARATOR.join(text for _rel_id, text in rels),
+        "chunk_ids": [chunk_id for chunk_id, _text, _source in chunks],
+    }]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--walk-ms", type=float, default=4.0, help="2-hop walk cost per seed chunk")
+    parser.add_argument("--max-entries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    entities = [f"Entity{i}" for i in range(args.chunks // 2)]
+    graph = {}
+    for i in range(args.chunks):
+        rels = []
+        # Neighboring chunks share relationships, as chunks of one document do
+        for j in range(rng.randint(0, 30)):
+            rel_id = f"r{(i // 4) * 50 + rng.randint(0, 60)}"
+            rels.append((rel_id, f"{rng.choice(entities)} - TREATS() -> {rng.choice(entities)}"))
+        rels = list(dict((rel_id, (rel_id, text)) for rel_id, text in rels).values())
+        graph[f"c{i}"] = (f"chunk {i} " + "text " * rng.randint(50, 400), f"/docs/doc{i // 4}.pdf", rels)
+    # Relationship texts are properties of the relationship, so one id has one text
+    rel_texts = {}
+    for chunk_id, (text, source, rels) in graph.items():
+        graph[chunk_id] = (text, source, [(rel_id, rel_texts.setdefault(rel_id, rel_text)) for rel_id, rel_text in rels])
+
+    weights = [1.0 / rank for rank in range(1, args.chunks + 1)]
+    chunk_ids = list(graph)
+    seeds = [list(dict.fromkeys(rng.choices(chunk_ids, weights=weights, k=args.top_k))) for _ in range(args.queries)]
+
+    # Cypher walk: every seed on every query
+    driver = FakeGraphDriver(graph, args.rtt_ms, args.walk_ms)
+    start = time.perf_counter()
+    for ids in seeds:
+        driver.execute_query(None, {"ids": ids, "max_rels": MAX_RELATIONSHIPS})
+    cypher_ms = (time.perf_counter() - start) * 1000 / args.queries
+    cypher_walks = driver.walks
+
+    driver = FakeGraphDriver(graph, args.rtt_ms, args.walk_ms)
+    cache = NeighborhoodCache(max_entries=args.max_entries, version_source=lambda: "v1")
+    mismatches = 0
+    latency_total = 0.0
+    for ids in seeds:
+        start = time.perf_counter()
+        records = expand_chunks(driver, ids, cache=cache)
+        latency_total += time.perf_counter() - start
+        mismatches += [dict(record) for record in records] != cypher_reference(graph, ids)
+    stats = cache.stats()
+
+    print(f"queries={args.queries} chunks={args.chunks} top_k={args.top_k} cache max_entries={args.max_entries}")
+    print(f"cypher: {cypher_ms:.2f} ms/query, {cypher_walks} chunk walks")
+    print(f"cached: {latency_total * 1000 / args.queries:.2f} ms/query, {driver.walks} chunk walks, "
+          f"hit rate {stats['hit_rate']:.1%}, {stats['size']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB")
+    print(f"records matching the Cypher aggregation: {args.queries - mismatches}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Compare query-time graph expansion with precomputed neighborhood summaries.
+
+A synthetic entity graph (with hub entities, as medical graphs have for
+common drugs and conditions) stands in for Neo4j. Query-time expansion
+costs `--rtt-ms` plus `--path-us` per path enumerated by the two-hop walk
+of CHUNK_RETRIEVAL_QUERY; a precomputed read costs `--rtt-ms` plus
+`--read-us` per seed chunk. Both are modeled, not measured, since the
+graph is in memory. Reports mean expansion latency for each, whether the
+precomputed records (built by `expand_precomputed`) match the query-time
+aggregation, and, after a batch of graph updates, how many chunks the
+incremental job recomputes and whether the result matches a full rebuild.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_neighborhood_summaries --chunks 5000 --entities 20000
+"""
+import argparse
+import itertools
+import random
+
+from app.rag.hits import CYPHER_JOIN_SEPARATOR
+from app.rag.neighborhood_cache import MAX_CHUNK_CHARS, MAX_CHUNKS, MAX_RELATIONSHIPS
+from app.rag.neighborhood_summaries import expand_precomputed
+
+
+class Graph:
+    def __init__(self, rng, n_chunks, n_entities, n_rels):
+        self.names = [f"Entity{i}" for i in range(n_entities)]
+        self.updated_at = [0] * n_entities
+        self.rels = {}  # id -> (start, type, end)
+        self.adjacency = [[] for _ in range(n_entities)]
+        hub_weights = [1.0 / (i + 1) ** 0.8 for i in range(n_entities)]
+        for _ in range(n_rels):
+            start, end = rng.choices(range(n_entities), weights=hub_weights, k=2)
+            self.add_rel(start, rng.choice(["TREATS", "CAUSES", "ASSOCIATED_WITH", "STUDIED_IN"]), end)
+        self.chunks = {
+            f"c{i}": (f"chunk {i} " + "text " * rng.randint(50, 300), f"/docs/doc{i // 5}.pdf",
+                      rng.sample(range(n_entities), rng.randint(1, 4)))
+            for i in range(n_chunks)
+        }
+
+    def add_rel(self, start, rel_type, end, now=0):
+        rel_id = f"r{len(self.rels)}"
+        self.rels[rel_id] = (start, rel_type, end)
+        self.adjacency[start].append(rel_id)
+        if end != start:
+            self.adjacency[end].append(rel_id)
+        self.updated_at[start] = self.updated_at[end] = now
+
+    def rel_text(self, rel_id):
+        start, rel_type, end = self.rels[rel_id]
+        return f"{self.names[start]} - {rel_type}() -> {self.names[end]}"
+
+    def walk(self, chunk_id):
+        """Yield the relationship list of every 1-2 hop path from the chunk's entities."""
+        for entity in self.chunks[chunk_id][2]:
+            for r1 in self.adjacency[entity]:
+                yield [r1]
+                for r2 in self.adjacency[self.far_node(r1, entity)]:
+                    if r2 != r1:
+                        yield [r1, r2]
+
+    def path_count(self, chunk_id):
+        count = 0
+        for entity in self.chunks[chunk_id][2]:
+            for r1 in self.adjacency[entity]:
+                far = self.adjacency[self.far_node(r1, entity)]
+                count += 1 + len(far) - far.count(r1)
+        return count
+
+    def far_node(self, rel_id, node):
+        start, _type, end = self.rels[rel_id]
+        return end if start == node else start
+
+    def nodes_within_two_hops(self, entity):
+        seen, frontier = {entity}, [entity]
+        for _ in range(2):
+            nxt = []
+            for node in frontier:
+                for rel_id in self.adjacency[node]:
+                    start, _type, end = self.rels[rel_id]
+                    for other in (start, end):
+                        if other not in seen:
+                            seen.add(other)
+                            nxt.append(other)
+            frontier = nxt
+        return seen
+
+
+def distinct_rels(paths, limit):
+    """Distinct relationships in path order, stopping at `limit`."""
+    rels = {}
+    for path in paths:
+        for rel_id in path:
+            rels.setdefault(rel_id)
+            if len(rels) == limit:
+                return list(rels)
+    return list(rels)
+
+
+def query_time_record(graph, ids):
+    """CHUNK_RETRIEVAL_QUERY over the seed chunks: one walk for all seeds."""
+    paths = sum(graph.path_count(chunk_id) for chunk_id in ids)
+    chunks = [chunk_id for chunk_id in dict.fromkeys(ids) if graph.path_count(chunk_id)][:MAX_CHUNKS]
+    if not chunks:
+        return [], paths
+    rels = distinct_rels(itertools.chain.from_iterable(graph.walk(chunk_id) for chunk_id in ids), MAX_RELATIONSHIPS)
+    return [{
+        "truncated_chunk_texts": CYPHER_JOIN_SEPARATOR.join(graph.chunks[c][0][:MAX_CHUNK_CHARS] for c in chunks),
+        "chunk_sources": CYPHER_JOIN_SEPARATOR.join(graph.chunks[c][1] for c in chunks),
+        "truncated_relationship_texts": CYPHER_JOIN_SEPARATOR.join(graph.rel_text(r) for r in rels),
+        "chunk_ids": chunks,
+    }], paths
+
+
+def summarize(graph, chunk_id, now):
+    rels = distinct_rels(graph.walk(chunk_id), MAX_RELATIONSHIPS)
+    return {"rel_ids": rels, "rel_texts": [graph.rel_text(r) for r in rels], "at": now}
+
+
+class SummaryDriver:
+    """Answers PRECOMPUTED_QUERY from the stored summaries."""
+
+    def __init__(self, graph, summaries):
+        self.graph = graph
+        self.summaries = summaries
+
+    def execute_query(self, query, parameters=None, **kwargs):
+        records = []
+        for chunk_id in parameters["ids"]:
+            text, source, _entities = self.graph.chunks[chunk_id]
+            summary = self.summaries[chunk_id]
+            records.append({"id": chunk_id, "text": text, "source": source,
+                            "rel_ids": summary["rel_ids"], "rel_texts": summary["rel_texts"]})
+        return records, None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--rels", type=int, default=40000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--updates", type=int, default=20, help="graph updates before the incremental run")
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--path-us", type=float, default=2.0)
+    parser.add_argument("--read-us", type=float, default=20.0)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    graph = Graph(rng, args.chunks, args.entities, args.rels)
+    summaries = {chunk_id: summarize(graph, chunk_id, now=1) for chunk_id in graph.chunks}
+    driver = SummaryDriver(graph, summaries)
+
+    chunk_ids = list(graph.chunks)
+    query_ms = precomputed_ms = 0.0
+    total_paths = max_paths = mismatches = 0
+    for _ in range(args.queries):
+        ids = rng.sample(chunk_ids, args.top_k)
+        expected, paths = query_time_record(graph, ids)
+        total_paths += paths
+        max_paths = max(max_paths, paths)
+        query_ms += args.rtt_ms + paths * args.path_us / 1000
+        precomputed_ms += args.rtt_ms + len(ids) * args.read_us / 1000
+        mismatches += [dict(record) for record in expand_precomputed(driver, ids)] != expected
+
+    print(f"chunks={args.chunks} entities={args.entities} rels={args.rels} queries={args.queries} top_k={args.top_k}")
+    print(f"query-time walk: {query_ms / args.queries:.2f} ms/query (modeled), "
+          f"{total_paths / args.queries:.0f} paths/query, max {max_paths}")
+    print(f"precomputed:     {precomputed_ms / args.queries:.2f} ms/query (modeled)")
+    print(f"records matching the query-time aggregation: {args.queries - mismatches}/{args.queries}")
+
+    # Ingestion: new relationships stamp both end nodes, renames stamp the entity
+    for i in range(args.updates):
+        if i % 2:
+            entity = rng.randrange(args.entities)
+            graph.names[entity] += "'"
+            graph.updated_at[entity] = 2
+        else:
+            graph.add_rel(rng.randrange(args.entities), "TREATS", rng.randrange(args.entities), now=2)
+    # Chunks with a stamped node within two hops of one of their entities
+    # (all summaries are from the same run, so one cutoff applies)
+    stamped = [node for node, updated_at in enumerate(graph.updated_at) if updated_at > 1]
+    affected = set()
+    for node in stamped:
+        affected |= graph.nodes_within_two_hops(node)
+    stale = [chunk_id for chunk_id, (_text, _source, entities) in graph.chunks.items()
+             if affected.intersection(entities)]
+    for chunk_id in stale:
+        summaries[chunk_id] = summarize(graph, chunk_id, now=3)
+    full = {chunk_id: summarize(graph, chunk_id, now=3) for chunk_id in graph.chunks}
+    wrong = sum(
+        (summaries[c]["rel_ids"], summaries[c]["rel_texts"]) != (full[c]["rel_ids"], full[c]["rel_texts"])
+        for c in graph.chunks
+    )
+    print(f"incremental run after {args.updates} updates: {len(stale)}/{args.chunks} chunks recomputed "
+          f"({len(stale) / args.chunks:.1%}), {wrong} summaries differing from a full rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Simulate a burst of chat requests against a rate-limited OpenAI upstream.
+
+The fake upstream allows `--upstream-rpm` requests per minute (token
+bucket, starting exhausted) and answers anything beyond that with a 429
+and retry-after, the way the API does. The same burst of interactive and batch requests is run
+with the scheduler's rate limit disabled (retries only) and set to the
+upstream limit. Both runs report upstream 429s, failures and per-lane
+latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_openai_scheduler --interactive 20 --batch 60
+"""
+import argparse
+import collections
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import openai
+
+from app.rag.scheduler import LLMUnavailableError, OpenAIScheduler, TokenBucket, priority_lane
+
+
+class FakeUpstream:
+    """Token-bucket RPM limiter that raises openai.RateLimitError when exceeded."""
+
+    def __init__(self, rpm: int, latency: float):
+        self.bucket = TokenBucket(rpm)
+        # Start with an exhausted budget, like an account already at its limit
+        self.bucket.tokens = 0
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def __call__(self):
+        with self.lock:
+            wait = self.bucket.wait_time(1)
+            if wait > 0:
+                self.rejected += 1
+                # Only the attributes the openai error and the scheduler read
+                response = SimpleNamespace(
+                    status_code=429,
+                    headers={"retry-after-ms": str(int(wait * 1000) + 1)},
+                    request=None
+                )
+                raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+            self.bucket.consume(1)
+        time.sleep(self.latency)
+        return "ok"
+
+
+def run_burst(scheduler, upstream, interactive: int, batch: int):
+    latencies = {"interactive": [], "batch": []}
+    failures = collections.Counter()
+
+    def call(lane):
+        t0 = time.perf_counter()
+        with priority_lane(lane):
+            try:
+                scheduler.run(upstream, estimated_tokens=1)
+            except LLMUnavailableError:
+                failures[lane] += 1
+                return
+        latencies[lane].append(time.perf_counter() - t0)
+
+    # Batch work is queued first; interactive requests arrive just after it
+    lanes = ["batch"] * batch + ["interactive"] * interactive
+    with ThreadPoolExecutor(max_workers=len(lanes)) as pool:
+        for lane in lanes:
+            pool.submit(call, lane)
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=60)
+    parser.add_argument("--upstream-rpm", type=int, default=1200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.interactive} interactive + {args.batch} batch requests, upstream {args.upstream_rpm} RPM")
+    print(f"{'scheduler':<14}{'429s':>6}{'failed':>8}{'int p50 s':>11}{'batch p50 s':>13}{'total s':>9}")
+    for label, rpm in (("retries only", 0), ("rate limited", args.upstream_rpm)):
+        upstream = FakeUpstream(args.upstream_rpm, args.latency)
+        scheduler = OpenAIScheduler(
+            label, requests_per_minute=rpm, tokens_per_minute=0, max_concurrency=args.concurrency,
+            max_retries=6, queue_timeout=120, backoff_base=0.2, backoff_max=2.0
+        )
+        if rpm:
+            # Mirror the upstream's exhausted window in the local bucket
+            scheduler._requests.tokens = 0
+        t0 = time.perf_counter()
+        latencies, failures = run_burst(scheduler, upstream, args.interactive, args.batch)
+        total = time.perf_counter() - t0
+        p50 = {lane: statistics.median(values) if values else float("nan") for lane, values in latencies.items()}
+        print(f"{label:<14}{upstream.rejected:>6}{sum(failures.values()):>8}"
+              f"{p50['interactive']:>11.2f}{p50['batch']:>13.2f}{total:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Estimate provider prompt-cache hits for the old and new RAG prompt layouts.
+
+Simulates an OpenAI-style prefix cache: prompts are cached in 128-token
+blocks once the shared prefix reaches 1024 tokens, and a request reuses the
+longest cached prefix. The workload draws questions about a few topics;
+each retrieval returns 5 chunks of its topic in random rank order, so
+repeated and related questions retrieve overlapping chunk sets.
+
+Old layout: instructions, question, then context in retrieval order.
+New layout (app.rag.prompts): instructions as system message, context
+sorted by chunk id, question last. Reports the share of prompt tokens
+served from cache and an estimated prefill time (`--ms-per-1k` per
+uncached 1k tokens).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_prompt_cache --requests 500
+"""
+import argparse
+import hashlib
+import random
+from types import SimpleNamespace
+
+from app.rag.hits import RetrievalHit
+from app.rag.prompts import build_rag_messages, context_blocks, join_context
+
+OLD_TEMPLATE = '''Answer the Question using the following Context. Only respond with information mentioned in the Context. Do not inject any speculative information not mentioned.
+
+# Question:
+{query_text}
+
+# Context:
+{context}
+
+# Answer:
+'''
+
+BLOCK_CHARS = 128 * 4  # ~128 tokens
+MIN_PREFIX_CHARS = 1024 * 4
+
+
+class PrefixCache:
+    def __init__(self):
+        self.blocks = set()
+
+    def lookup_and_store(self, prompt: str) -> int:
+        """Return the cached prefix length in characters and cache this prompt's blocks."""
+        cached = 0
+        hashes = []
+        for end in range(BLOCK_CHARS, len(prompt) + 1, BLOCK_CHARS):
+            hashes.append(hashlib.sha1(prompt[:end].encode()).hexdigest())
+        for i, digest in enumerate(hashes):
+            if digest not in self.blocks:
+                break
+            cached = (i + 1) * BLOCK_CHARS
+        self.blocks.update(hashes)
+        return cached if cached >= MIN_PREFIX_CHARS else 0
+
+
+def make_chunk(topic: int, index: int):
+    text = f"Topic {topic} passage {index}. " + " ".join(f"finding-{topic}-{index}-{w}" for w in range(180))
+    hit = RetrievalHit(source_path=f"/papers/topic{topic}.pdf", text=text, chunk_id=f"4:chunk:{topic * 100 + index}")
+    return SimpleNamespace(content=str({"text": text, "source2": hit.source_path}), metadata={"hits": [hit]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--chunks-per-topic", type=int, default=7)
+    parser.add_argument("--ms-per-1k", type=float, default=40.0, help="prefill ms per 1k uncached prompt tokens")
+    args = parser.parse_args()
+
+    random.seed(11)
+    chunks = {t: [make_chunk(t, i) for i in range(args.chunks_per_topic)] for t in range(args.topics)}
+    questions = {t: [f"What does the literature say about topic {t}, aspect {q}?" for q in range(5)] for t in range(args.topics)}
+    workload = []
+    for _ in range(args.requests):
+        topic = random.randrange(args.topics)
+        workload.append((random.choice(questions[topic]), random.sample(chunks[topic], 5)))
+
+    print(f"{args.requests} requests over {args.topics} topics, 5 of {args.chunks_per_topic} chunks per retrieval")
+    print(f"{'layout':<8}{'cached tokens':>15}{'est. prefill ms/req':>21}")
+    for layout in ("old", "new"):
+        cache = PrefixCache()
+        prompt_chars = cached_chars = 0
+        for question, items in workload:
+            retrieval = SimpleNamespace(items=items)
+            if layout == "old":
+                context = "".join(str(item.content) + "\n\n" for item in items)
+                prompt = OLD_TEMPLATE.format(query_text=question, context=context)
+            else:
+                messages = build_rag_messages(question, join_context(context_blocks(retrieval)))
+                prompt = "".join(f"<{m['role']}>{m['content']}" for m in messages)
+            prompt_chars += len(prompt)
+            cached_chars += cache.lookup_and_store(prompt)
+        uncached_tokens = (prompt_chars - cached_chars) / 4
+        print(f"{layout:<8}{cached_chars / prompt_chars * 100:>14.1f}%"
+              f"{uncached_tokens / 1000 * args.ms_per_1k / args.requests:>21.1f}")
+
+
+if __name__ == "__main__":
+    main()
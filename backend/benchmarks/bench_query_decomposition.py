@@ -0,0 +1,113 @@
+"""
+Measure retrieval latency of decomposed compound questions.
+
+Runs DecomposingRetriever (rules mode, entity linker over a small drug and
+condition vocabulary) over a fixed question set with a stand-in embedder
+that sleeps `--embed-ms` per request and a stand-in retriever that sleeps
+`--retrieval-ms` per search. Compares, per compound question, a single
+retrieval with the decomposed one (one batched embedding, concurrent
+searches) and with embedding and searching each sub-query one after the
+other. Also reports how many distinct chunks each variant brings to the
+single generation, from synthetic per-topic result lists.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_query_decomposition --embed-ms 150 --retrieval-ms 40
+"""
+import argparse
+import time
+import zlib
+
+from neo4j_graphrag.types import RetrieverResult, RetrieverResultItem
+
+from app.rag.decomposition import DecomposingRetriever, QueryDecomposer
+from app.rag.entity_linker import EntityLinker
+from app.rag.hits import RetrievalHit
+
+ENTITIES = ["dupilumab", "budesonide", "omalizumab", "mepolizumab", "fluticasone", "eosinophilic esophagitis",
+            "asthma", "atopic dermatitis", "proton pump inhibitors", "TSLP", "IL-13", "IL-5"]
+
+QUESTIONS = [
+    "compare dupilumab and budesonide efficacy and side effects",
+    "dupilumab vs omalizumab in asthma",
+    "How do mepolizumab, omalizumab and dupilumab differ in dosing?",
+    "What is the role of IL-13 and IL-5 in eosinophilic esophagitis?",
+    "What is eosinophilic esophagitis? How are proton pump inhibitors used for it?",
+    "fluticasone versus budesonide for eosinophilic esophagitis",
+    "What is dupilumab?",
+    "What does TSLP do in atopic dermatitis?",
+]
+
+
+class StandInEmbedder:
+    def __init__(self, delay):
+        self.delay = delay
+        self.requests = 0
+
+    def embed_batch(self, texts):
+        self.requests += 1
+        time.sleep(self.delay)
+        return [[float(zlib.crc32(text.encode()))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_batch([text])[0]
+
+
+class StandInRetriever:
+    """Returns top_k chunk ids that depend on the words of the query."""
+
+    def __init__(self, embedder, delay):
+        self.embedder = embedder
+        self.delay = delay
+
+    def search(self, query_text, query_vector=None, top_k=5):
+        if query_vector is None:
+            self.embedder.embed_query(query_text)
+        time.sleep(self.delay)
+        words = sorted(set(query_text.lower().replace("?", "").split()))
+        ids = [f"{words[i % len(words)]}-{i}" for i in range(top_k)]
+        return RetrieverResult(items=[
+            RetrieverResultItem(content=chunk_id, metadata={"score": 0.8, "hits": [
+                RetrievalHit(source_path=f"/docs/{chunk_id}.pdf", text=chunk_id, chunk_id=chunk_id)
+            ]})
+            for chunk_id in ids
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embed-ms", type=float, default=150.0)
+    parser.add_argument("--retrieval-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    linker = EntityLinker(lambda: [(f"e{i}", name, None) for i, name in enumerate(ENTITIES)],
+                          version_source=lambda: None)
+    decomposer = QueryDecomposer(mode="rules", entity_linker=linker)
+    embedder = StandInEmbedder(args.embed_ms / 1000)
+    retriever = StandInRetriever(embedder, args.retrieval_ms / 1000)
+    decomposing = DecomposingRetriever(retriever, embedder, decomposer, sub_query_top_k=3)
+
+    print(f"embedding {args.embed_ms:.0f} ms/request, retrieval {args.retrieval_ms:.0f} ms/search")
+    print(f"{'question':<72} {'subq':>4} {'single':>8} {'decomp':>8} {'serial':>8} {'chunks':>9}")
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        single = retriever.search(query_text=question)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        merged = decomposing.search(query_text=question)
+        decomposed_ms = (time.perf_counter() - start) * 1000
+        sub_queries = (merged.metadata or {}).get("sub_queries", [])
+
+        start = time.perf_counter()
+        retriever.search(query_text=question)
+        for sub_query in sub_queries:
+            retriever.search(query_text=sub_query, top_k=3)
+        serial_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{question[:72]:<72} {len(sub_queries):>4} {single_ms:>6.0f}ms {decomposed_ms:>6.0f}ms "
+              f"{serial_ms:>6.0f}ms {len(single.items):>4}->{len(merged.items):<4}")
+    print(decomposer.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark /ui-rag/query response construction and serialization per request.
+
+Legacy path: RagResponse.dict() -> format_for_ui -> enhance_with_metadata ->
+.dict() -> FastAPI response_model validation -> jsonable_encoder -> json.
+Fast path: build_ui_payload on the trusted RagResponse -> one orjson dump.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_ui_response --sources 5 --chars 1000
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.rag.hits import RetrievalHit
+from app.rag.rag_assistant import build_rag_response
+from app.rag.ui_formatter import build_ui_payload, enhance_with_metadata, format_for_ui
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+QUERY = "What treatment options exist for eosinophilic esophagitis?"
+PASSAGE = (
+    "Dupilumab therapy reduced esophageal eosinophil counts and improved dysphagia "
+    "in adults and adolescents with eosinophilic esophagitis. "
+)
+
+
+def make_response(count: int, chars: int):
+    text = (PASSAGE * (chars // len(PASSAGE) + 1))[:chars]
+    hits = [RetrievalHit(source_path=f"/papers/Clinical trial {i}.pdf", text=text) for i in range(count)]
+    response = build_rag_response("Dupilumab is an approved treatment.", hits)
+    # Passages in this benchmark are full-length rather than extract_snippet-truncated
+    for source in response.sources:
+        source.snippets = [text]
+    return response
+
+
+_dict_adapter = TypeAdapter(Dict[str, Any])
+
+
+def legacy_path(result) -> bytes:
+    ui_response = format_for_ui(result.dict())
+    ui_response.SOURCES_PANEL.items = enhance_with_metadata(ui_response.SOURCES_PANEL.items, QUERY)
+    response_dict = ui_response.dict()
+    validated = _dict_adapter.validate_python(response_dict)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(result) -> bytes:
+    payload = build_ui_payload(result, QUERY)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode()
+
+
+def _per_request_us(fn, iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--chars", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    result = make_response(args.sources, args.chars)
+    assert json.loads(legacy_path(result)) == json.loads(fast_path(result)), "paths disagree"
+
+    legacy_us = _per_request_us(lambda: legacy_path(result), args.iterations)
+    fast_us = _per_request_us(lambda: fast_path(result), args.iterations)
+    print(f"{args.sources} sources x {args.chars}-char passages, {args.iterations} iterations"
+          f" (encoder: {'orjson' if orjson else 'json'})")
+    print(f"{'path':<10}{'us/request':>12}{'bytes':>10}")
+    print(f"{'legacy':<10}{legacy_us:>12.1f}{len(legacy_path(result)):>10}")
+    print(f"{'fast':<10}{fast_us:>12.1f}{len(fast_path(result)):>10}")
+
+
+if __name__ == "__main__":
+    main()
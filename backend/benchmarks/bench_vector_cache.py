@@ -0,0 +1,99 @@
+"""
+Measure the vector result cache on paraphrased queries.
+
+A synthetic corpus of unit embeddings stands in for the `text_embeddings`
+index (exact top-k by dot product, plus `--index-ms` per round-trip).
+Queries are drawn from a set of intents; each query is its intent's
+embedding plus noise, so phrasings of one intent have cosine ~0.93-0.99
+with each other. Reports hit rate, index round-trips saved, top-k overlap
+of cached answers with the exact top-k, LSH recall (hits found vs. a
+brute-force scan of cached queries above the threshold) and mean latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_vector_cache --queries 2000 --intents 300
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.rag.vector_cache import VectorResultCache
+
+
+def unit(v):
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--intents", type=int, default=300)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.2, help="paraphrase noise (relative norm)")
+    parser.add_argument("--min-cosine", type=float, default=0.95)
+    parser.add_argument("--lsh-bits", type=int, default=12)
+    parser.add_argument("--index-ms", type=float, default=15.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    intents = unit(rng.standard_normal((args.intents, args.dim)).astype(np.float32))
+    # Chunks cluster around intents with varying relevance, so each intent
+    # has a clear top-k
+    owners = rng.integers(0, args.intents, args.chunks)
+    relevance = rng.uniform(0.2, 2.0, (args.chunks, 1)).astype(np.float32)
+    corpus = unit(intents[owners] * relevance + unit(rng.standard_normal((args.chunks, args.dim)).astype(np.float32)))
+    # Zipf-like popularity: a few intents get most traffic
+    popularity = 1.0 / np.arange(1, args.intents + 1)
+    popularity /= popularity.sum()
+
+    def exact_top_k(query):
+        scores = corpus @ query
+        ids = np.argpartition(-scores, args.top_k)[:args.top_k]
+        return [(int(i), float(scores[i])) for i in ids[np.argsort(-scores[ids])]]
+
+    cache = VectorResultCache(max_entries=4096, min_cosine=args.min_cosine, lsh_bits=args.lsh_bits,
+                              version_source=lambda: "v1")
+    cached_queries = []
+    overlap_total = 0.0
+    missed_possible = 0
+    latency_total = 0.0
+    for _ in range(args.queries):
+        intent = rng.choice(args.intents, p=popularity)
+        noise = unit(rng.standard_normal(args.dim).astype(np.float32)) * args.noise
+        query = unit(intents[intent] + noise)
+        # Could a brute-force scan of cached queries have served this one?
+        possible = bool(cached_queries) and float(np.max(np.stack(cached_queries) @ query)) >= args.min_cosine
+
+        exact = exact_top_k(query)
+
+        start = time.perf_counter()
+        hits = cache.get(query)
+        hit = hits is not None
+        if not hit:
+            # Index round-trip (the exact top-k above is computed off the clock)
+            time.sleep(args.index_ms / 1000)
+            hits = exact
+            cache.put(query, hits)
+        latency_total += time.perf_counter() - start
+
+        if hit:
+            overlap_total += len({i for i, _ in exact} & {i for i, _ in hits}) / args.top_k
+        else:
+            cached_queries.append(query)
+            missed_possible += possible
+
+    stats = cache.stats()
+    lsh_recall = stats["hits"] / (stats["hits"] + missed_possible) if stats["hits"] + missed_possible else 1.0
+    print(f"{args.queries} queries over {args.intents} intents, {args.chunks} chunks, dim {args.dim}, "
+          f"threshold {args.min_cosine}, {args.lsh_bits} LSH bits")
+    print(f"hit rate          {stats['hit_rate'] * 100:.1f}% ({stats['hits']} index round-trips saved)")
+    print(f"avg hit cosine    {stats['avg_hit_cosine']}")
+    print(f"top-k overlap     {overlap_total / max(1, stats['hits']) * 100:.1f}% of cached results match exact top-{args.top_k}")
+    print(f"LSH recall        {lsh_recall * 100:.1f}% of hits available above threshold were found")
+    print(f"mean latency      {latency_total / args.queries * 1000:.2f} ms (index round-trip {args.index_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { conversationApi, Conversation } from '../utils/api';
+import { conversationApi, ConversationSummary } from '../utils/api';
 
 interface ConversationSidebarProps {
   currentConversationId: number | null;
@@ -16,7 +16,7 @@ const ConversationSidebar: React.FC<ConversationSidebarProps> = ({
   onSuggestedQuestionClick,
   suggestedQuestions = []
 }) => {
-  const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [conversations, setConversations] = useState<ConversationSummary[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
 
@@ -147,7 +147,7 @@ const ConversationSidebar: React.FC<ConversationSidebarProps> = ({
                       <span className="text-xs text-gray-500">
                         {formatDate(conversation.updated_at)}
                         {' • '}
-                        {conversation.messages.length} message{conversation.messages.length !== 1 ? 's' : ''}
+                        {conversation.message_count} message{conversation.message_count !== 1 ? 's' : ''}
                       </span>
                     </div>
                   </button>
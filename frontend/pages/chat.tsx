@@ -202,6 +202,7 @@ export default function Chat() {
                   <option value="hybrid">Hybrid (Default)</option>
                   <option value="vector_cypher">Vector Cypher</option>
                   <option value="vector">Vector</option>
+                  <option value="fusion">Hybrid Fusion</option>
                 </select>
               </div>
             </div>
@@ -135,6 +135,15 @@ export interface Conversation {
   messages: Message[];
 }
 
+export interface ConversationSummary {
+  id: number;
+  title: string | null;
+  created_at: string;
+  updated_at: string;
+  message_count: number;
+  last_message: string | null;
+}
+
 export interface QueryResult {
   answer: string;
   sources: Source[];